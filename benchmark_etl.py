@@ -0,0 +1,638 @@
+"""benchmark_etl.py
+
+Banco de pruebas de rendimiento para las funciones sync_* y las consultas de los casos 1-10.
+Corre contra instancias LOCALES de PostgreSQL, MongoDB, Redis y Neo4j (las mismas variables
+de .env que usa pokerstars_app.py) y, por defecto, contra un Data API de Astra en memoria.
+
+Acciones:
+1. Carga .env y comprueba que todos los destinos apunten a localhost (salvo --permitir-remoto).
+2. Para cada escala de --escalas:
+   - Vacía PostgreSQL (TRUNCATE ... RESTART IDENTITY) y los modelos de lectura.
+   - Siembra datos con generar_datos.py --escala N y arma los rankings diarios de Redis.
+   - Cronometra cada etapa del ETL por separado: cada sync_* con copia completa,
+     sync_todo completo y sync_todo incremental sin cambios.
+   - Ejecuta cada consulta de los casos 1-10 --repeticiones veces con parámetros
+     tomados de los datos sembrados.
+3. Escribe los resultados en JSON (--salida): filas/s por etapa, p50/p99 por consulta
+   y pico de RSS de cada medición.
+
+Detalles:
+- Los destinos que no respondan se omiten; sus etapas y consultas no aparecen en el JSON
+  y quedan listados en 'omitidos'.
+- El pico de RSS se reinicia antes de cada medición escribiendo en /proc/self/clear_refs
+  (Linux). Si el kernel no lo permite es el máximo acumulado del proceso desde que arrancó.
+- Las consultas se llaman sin el ETL bajo demanda de los casos (consulta_casoN): se mide
+  sólo la lectura del modelo ya sincronizado.
+- Cada etapa del ETL incluye el desglose de METRICAS por destino (tiempo de extracción,
+  transformación y carga, lotes y reintentos; bytes estimados sólo con ETL_METRICAS_BYTES=1).
+- Los casos 1, 2 y 9 se miden además a través de la caché de resultados (serie ':cache').
+- El caso 8 se mide dos veces: con la clave borrada antes de cada llamada (va a PostgreSQL)
+  y con la caché ya cargada.
+
+Advertencias:
+- Destructivo: borra los datos de PostgreSQL, las colecciones de MongoDB del ETL, los
+  nodos Usuario/Mesa de Neo4j y las claves de Redis de los casos 7-8.
+
+Uso rápido:
+python benchmark_etl.py --escalas 0.001,0.01 --salida bench.json
+python benchmark_etl.py --escalas 0.01 --astra-latencia-ms 20   # simula la ida y vuelta al Data API
+
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from astrapy.exceptions import CollectionInsertManyException
+from dotenv import load_dotenv
+
+import pokerstars_app as app
+
+
+HOSTS_LOCALES = {'localhost', '127.0.0.1', '::1'}
+
+# Tablas que vacía el benchmark antes de sembrar cada escala (CASCADE arrastra el resto)
+TABLAS_POSTGRES = ['usuario', 'promocion', 'torneo', 'mesa', 'etl_outbox', 'usuario_resumen', 'etl_frescura']
+
+COLECCIONES_MONGO = ['usuarios', 'manos', 'transacciones', 'sync_estado']
+
+
+# ====================================
+#   ASTRA DATA API EN MEMORIA
+# ====================================
+
+class ColeccionEnMemoria:
+    """Lo justo del Collection de astrapy que usa pokerstars_app.py.
+
+    Cada método público cuenta como una petición HTTP y espera `latencia`
+    segundos, así el paralelismo de _bulk_upsert_astra se nota igual que contra
+    el servicio real. Los find por igualdad usan un índice que se arma la primera
+    vez que se consulta un juego de campos y se descarta en cada escritura.
+    """
+
+    def __init__(self, nombre, latencia=0.0):
+        self.name = nombre
+        self._latencia = latencia
+        self._docs = {}
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def _peticion(self):
+        if self._latencia:
+            time.sleep(self._latencia)
+
+    @staticmethod
+    def _coincide(doc, filtro):
+        for campo, valor in filtro.items():
+            if isinstance(valor, dict):
+                if doc.get(campo) not in valor.get('$in', ()):
+                    return False
+            elif doc.get(campo) != valor:
+                return False
+        return True
+
+    def _buscar(self, filtro):
+        filtro = filtro or {}
+        if '_id' in filtro and not isinstance(filtro['_id'], dict):
+            doc = self._docs.get(filtro['_id'])
+            return [doc] if doc is not None and self._coincide(doc, filtro) else []
+        if filtro and not any(isinstance(v, dict) for v in filtro.values()):
+            campos = tuple(sorted(filtro))
+            indice = self._indices.get(campos)
+            if indice is None:
+                indice = {}
+                for doc in self._docs.values():
+                    indice.setdefault(tuple(doc.get(c) for c in campos), []).append(doc)
+                self._indices[campos] = indice
+            return list(indice.get(tuple(filtro[c] for c in campos), []))
+        return [doc for doc in self._docs.values() if self._coincide(doc, filtro)]
+
+    def _escribir(self, doc):
+        self._docs[doc['_id']] = doc
+        self._indices.clear()
+
+    def insert_many(self, documents, ordered=False, chunk_size=None, concurrency=None):
+        self._peticion()
+        insertados = []
+        with self._lock:
+            for doc in documents:
+                if doc['_id'] in self._docs:
+                    continue
+                self._escribir(dict(doc))
+                insertados.append(doc['_id'])
+        if len(insertados) < len(documents):
+            # Igual que el Data API: los choques de _id no frenan al resto del lote
+            raise CollectionInsertManyException(inserted_ids=insertados, exceptions=[])
+        return SimpleNamespace(inserted_ids=insertados)
+
+    def replace_one(self, filter, replacement, upsert=False):
+        self._peticion()
+        with self._lock:
+            actuales = self._buscar(filter)
+            if not actuales:
+                if not upsert:
+                    return SimpleNamespace(update_info={'n': 0, 'nModified': 0})
+                nuevo = {'_id': filter.get('_id'), **replacement}
+                self._escribir(nuevo)
+                return SimpleNamespace(update_info={'n': 1, 'nModified': 0, 'upserted': nuevo['_id']})
+            actual = actuales[0]
+            nuevo = {**replacement, '_id': actual['_id']}
+            cambiado = nuevo != actual
+            if cambiado:
+                self._escribir(nuevo)
+            return SimpleNamespace(update_info={'n': 1, 'nModified': int(cambiado)})
+
+    def update_one(self, filter, update, upsert=False):
+        self._peticion()
+        with self._lock:
+            actuales = self._buscar(filter)
+            if not actuales and not upsert:
+                return SimpleNamespace(update_info={'n': 0, 'nModified': 0})
+            base = dict(actuales[0]) if actuales else {k: v for k, v in filter.items() if not isinstance(v, dict)}
+            base.update(update.get('$set', {}))
+            self._escribir(base)
+            return SimpleNamespace(update_info={'n': 1, 'nModified': int(bool(actuales))})
+
+    def find_one(self, filter=None, **kwargs):
+        self._peticion()
+        with self._lock:
+            encontrados = self._buscar(filter)
+        return dict(encontrados[0]) if encontrados else None
+
+    def find(self, filter=None, **kwargs):
+        self._peticion()
+        with self._lock:
+            return [dict(doc) for doc in self._buscar(filter)]
+
+    def delete_many(self, filter):
+        self._peticion()
+        with self._lock:
+            borrados = self._buscar(filter)
+            for doc in borrados:
+                del self._docs[doc['_id']]
+            self._indices.clear()
+        return SimpleNamespace(deleted_count=len(borrados))
+
+    def estimated_document_count(self):
+        return len(self._docs)
+
+
+class AstraEnMemoria:
+    """Sustituto del Database de astrapy: colecciones creadas bajo demanda"""
+
+    def __init__(self, latencia=0.0):
+        self._latencia = latencia
+        self._colecciones = {}
+
+    def create_collection(self, nombre, **kwargs):
+        if nombre in self._colecciones:
+            raise ValueError(f"La colección '{nombre}' ya existe")
+        return self.get_collection(nombre)
+
+    def get_collection(self, nombre, **kwargs):
+        if nombre not in self._colecciones:
+            self._colecciones[nombre] = ColeccionEnMemoria(nombre, self._latencia)
+        return self._colecciones[nombre]
+
+    def list_collection_names(self):
+        return list(self._colecciones)
+
+
+# ====================================
+#   MEDICIÓN
+# ====================================
+
+def _reiniciar_pico_rss():
+    """Pone VmHWM = VmRSS para que el próximo pico sea sólo de la medición actual"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico // 1024 if sys.platform == 'darwin' else pico
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def medir_etapa(escala, nombre, fn, filas, verboso=False):
+    salida = io.StringIO()
+    app.METRICAS.reiniciar()
+    _reiniciar_pico_rss()
+    inicio = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verboso else salida):
+            ok = fn() is not False
+    except Exception as e:
+        ok = False
+        salida.write(f"{type(e).__name__}: {e}")
+    segundos = time.perf_counter() - inicio
+
+    resultado = {
+        'escala': escala,
+        'tipo': 'etl',
+        'nombre': nombre,
+        'ok': ok,
+        'filas': filas,
+        'segundos': round(segundos, 4),
+        'filas_por_segundo': round(filas / segundos, 1) if filas and segundos > 0 else None,
+        'rss_pico_kb': pico_rss_kb(),
+        # Desglose por destino y etapa (extracción, transformación, carga) del registro de métricas
+        'destinos': app.METRICAS.a_dict()['destinos'],
+    }
+    if not ok:
+        resultado['salida'] = salida.getvalue()[-2000:]
+    print(f"   ⏱️  {nombre}: {segundos:.2f}s" + (f" ({resultado['filas_por_segundo']:,.0f} filas/s)" if resultado['filas_por_segundo'] else "")
+          + ("" if ok else " ❌"))
+    return resultado
+
+
+def medir_consulta(escala, nombre, fn, parametros, repeticiones, antes=None):
+    """Llama a fn(*parametros[i]) `repeticiones` veces; `antes` corre fuera del cronómetro"""
+    parametros = parametros or [()]
+    tiempos = []
+    filas = 0
+    error = None
+    _reiniciar_pico_rss()
+    for i in range(repeticiones):
+        args = parametros[i % len(parametros)]
+        if antes is not None:
+            antes(*args)
+        inicio = time.perf_counter()
+        try:
+            respuesta = fn(*args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        tiempos.append(time.perf_counter() - inicio)
+        filas += len(respuesta) if isinstance(respuesta, (list, tuple)) else 1
+
+    tiempos.sort()
+    resultado = {
+        'escala': escala,
+        'tipo': 'consulta',
+        'nombre': nombre,
+        'ok': error is None,
+        'repeticiones': len(tiempos),
+        'filas_promedio': round(filas / len(tiempos), 1) if tiempos else None,
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 3) if tiempos else None,
+        'p99_ms': round(percentil(tiempos, 99) * 1000, 3) if tiempos else None,
+        'media_ms': round(sum(tiempos) / len(tiempos) * 1000, 3) if tiempos else None,
+        'rss_pico_kb': pico_rss_kb(),
+    }
+    if error:
+        resultado['salida'] = error
+    print(f"   ⏱️  {nombre}: p50 {resultado['p50_ms']} ms, p99 {resultado['p99_ms']} ms" + ("" if resultado['ok'] else f" ❌ {error}"))
+    return resultado
+
+
+# ====================================
+#   PREPARACIÓN DE DATOS
+# ====================================
+
+def _es_local(url_o_host):
+    if not url_o_host:
+        return False
+    host = urlparse(url_o_host).hostname if '://' in url_o_host else url_o_host
+    return host in HOSTS_LOCALES
+
+
+def comprobar_destinos_locales(args):
+    remotos = []
+    if not _es_local(os.getenv("DATABASE_PUBLIC_URL")):
+        remotos.append("DATABASE_PUBLIC_URL")
+    for variable, usar in (("MONGO_URI", not args.sin_mongo), ("REDIS_HOST", not args.sin_redis),
+                           ("NEO4J_URI", not args.sin_neo4j)):
+        if usar and not _es_local(os.getenv(variable)):
+            remotos.append(variable)
+    if args.astra == 'real':
+        remotos.append("ASTRA_DB_API_ENDPOINT")
+    return remotos
+
+
+def vaciar_destinos(pg_con, mongo_db, redis_con, neo4j_driver):
+    with app._usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("TRUNCATE " + ", ".join(TABLAS_POSTGRES) + " RESTART IDENTITY CASCADE")
+        cur.close()
+        conn.commit()
+    if mongo_db is not None:
+        for nombre in COLECCIONES_MONGO:
+            mongo_db[nombre].delete_many({})
+    if redis_con is not None:
+        claves = list(redis_con.scan_iter("user_balance:*"))
+        if claves:
+            redis_con.delete(*claves)
+        for patron in ("ranking_activos*", "cache:*", "cache_version:*"):
+            claves = list(redis_con.scan_iter(patron))
+            if claves:
+                redis_con.delete(*claves)
+    if neo4j_driver is not None:
+        with neo4j_driver.session() as session:
+            session.run("MATCH (n) WHERE n:Usuario OR n:Mesa DETACH DELETE n").consume()
+    # Los modelos recién vaciados no deben contar como frescos
+    app._estado_modelos.clear()
+
+
+def sembrar(escala, args):
+    """Corre generar_datos.py en un proceso aparte; devuelve el pico de RSS de sus procesos"""
+    comando = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "generar_datos.py"),
+               "--escala", str(escala), "--semilla", str(args.semilla), "--hasta", args.hasta.isoformat()]
+    if args.workers:
+        comando += ["--workers", str(args.workers)]
+    # sys.stdout y no None: con --salida - el hijo también escribe en stderr
+    salida = sys.stdout if args.verboso else subprocess.DEVNULL
+    subprocess.run(comando, check=True, stdout=salida)
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def contar_filas(pg_con):
+    with app._usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT (SELECT count(*) FROM usuario),
+                   (SELECT count(*) FROM mesa),
+                   (SELECT count(*) FROM usuario_mesa),
+                   (SELECT count(*) FROM mano),
+                   (SELECT count(*) FROM transaccion),
+                   (SELECT count(*) FROM usuario_mano)
+        """)
+        fila = cur.fetchone()
+        cur.close()
+        conn.rollback()
+    return dict(zip(['usuario', 'mesa', 'usuario_mesa', 'mano', 'transaccion', 'usuario_mano'], fila))
+
+
+def cargar_ranking(pg_con, redis_con, hasta):
+    """Rankings diarios de los días retenidos, como si cada mano sembrada hubiera pasado por ingestar_manos"""
+    desde = hasta - datetime.timedelta(days=app.RANKING_RETENCION_DIAS)
+    filas = app._stream_query(pg_con, """
+        SELECT m.fecha_hora::date, um.id_usuario, count(*)
+        FROM usuario_mano um JOIN mano m ON m.id_mano = um.id_mano
+        WHERE m.fecha_hora > %s
+        GROUP BY 1, 2
+    """, (desde,))
+    for lote in app._lotes(filas, 10_000):
+        app.registrar_actividad(redis_con, lote)
+
+
+def muestrear_parametros(pg_con, cantidad, semilla):
+    """Parámetros reales para los casos 4, 5, 6 y 8, tomados al azar (reproducible) de los datos"""
+    with app._usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT setseed(%s)", (((semilla % 1000) / 1000.0),))
+        cur.execute("SELECT id_usuario FROM usuario ORDER BY random() LIMIT %s", (cantidad,))
+        usuarios = [fila[0] for fila in cur.fetchall()]
+        cur.execute("SELECT id_mesa, fecha_hora FROM mano ORDER BY random() LIMIT %s", (cantidad,))
+        mesas_fechas = [(id_mesa, app._fecha_astra(fecha_hora)[0]) for id_mesa, fecha_hora in cur.fetchall()]
+        cur.execute("SELECT id_usuario, fecha_hora FROM transaccion ORDER BY random() LIMIT %s", (cantidad,))
+        usuarios_fechas = [(id_usuario, app._fecha_astra(fecha_hora)[0]) for id_usuario, fecha_hora in cur.fetchall()]
+        cur.close()
+        conn.rollback()
+    return usuarios, mesas_fechas, usuarios_fechas
+
+
+# ====================================
+#   ETAPAS Y CONSULTAS
+# ====================================
+
+def medir_etl(escala, pg_con, mongo_db, astra_db, neo4j_driver, filas, verboso):
+    etapas = []
+    if mongo_db is not None:
+        etapas += [
+            ('mongo:usuarios', lambda: app.sync_all_usuarios_to_mongo(pg_con, mongo_db), filas['usuario']),
+            ('mongo:manos', lambda: app.sync_manos_to_mongo(pg_con, mongo_db, incremental=False), filas['mano']),
+            ('mongo:transacciones', lambda: app.sync_transacciones_to_mongo(pg_con, mongo_db, incremental=False), filas['transaccion']),
+        ]
+    if astra_db is not None:
+        etapas += [
+            ('astra:manos', lambda: app.sync_manos_to_cassandra(pg_con, astra_db, incremental=False), filas['mano']),
+            ('astra:transacciones', lambda: app.sync_transacciones_to_cassandra(pg_con, astra_db, incremental=False), filas['transaccion']),
+        ]
+    if neo4j_driver is not None:
+        etapas.append(('neo4j:usuarios_mesas', lambda: app.sync_usuarios_mesas_to_neo4j(pg_con, neo4j_driver),
+                       filas['usuario'] + filas['mesa'] + filas['usuario_mesa']))
+
+    # sync_todo lee cada tabla una sola vez: las filas son las extraídas de PostgreSQL
+    extraidas = filas['usuario'] * (mongo_db is not None or neo4j_driver is not None)
+    extraidas += (filas['mano'] + filas['transaccion']) * (mongo_db is not None or astra_db is not None)
+    extraidas += (filas['mesa'] + filas['usuario_mesa']) * (neo4j_driver is not None)
+    etapas += [
+        ('sync_todo:completo', lambda: app.sync_todo(pg_con, mongo_db, astra_db, neo4j_driver, incremental=False), extraidas),
+        # Sin cambios en las fuentes: mide el costo fijo de watermarks y extracción vacía
+        ('sync_todo:incremental', lambda: app.sync_todo(pg_con, mongo_db, astra_db, neo4j_driver, incremental=True), 0),
+    ]
+    return [medir_etapa(escala, nombre, fn, n, verboso) for nombre, fn, n in etapas]
+
+
+def medir_consultas(escala, pg_con, mongo_db, astra_db, redis_con, neo4j_driver, args):
+    usuarios, mesas_fechas, usuarios_fechas = muestrear_parametros(pg_con, args.muestras, args.semilla)
+    rng = random.Random(args.semilla)
+    hasta = datetime.datetime.combine(args.hasta, datetime.time(23, 59, 59))
+    repeticiones = args.repeticiones
+
+    consultas = []
+    if mongo_db is not None:
+        meses = [(f.month, f.year) for f in (hasta - datetime.timedelta(days=30 * i) for i in range(12))]
+        consultas += [
+            ('caso1', lambda desde: app.consulta_caso1(mongo_db, desde), [(hasta - datetime.timedelta(days=7),)], repeticiones, None),
+            ('caso2', lambda: app.consulta_caso2(mongo_db), None, repeticiones, None),
+            ('caso3', lambda mes, anio: app.consulta_caso3(mongo_db, mes, anio), rng.sample(meses, len(meses)), repeticiones, None),
+            ('caso4', lambda id_usuario: app.consulta_caso4(mongo_db, id_usuario), [(u,) for u in usuarios], repeticiones, None),
+        ]
+    if astra_db is not None:
+        consultas += [
+            ('caso5', lambda id_mesa, fecha: app.consulta_caso5(astra_db, id_mesa, fecha), mesas_fechas, repeticiones, None),
+            ('caso6', lambda id_usuario, fecha: app.consulta_caso6(astra_db, id_usuario, fecha), usuarios_fechas, repeticiones, None),
+        ]
+    if redis_con is not None:
+        borrar_clave = lambda id_usuario: redis_con.delete(f"user_balance:{id_usuario}")
+        consultas += [
+            ('caso7:1d', lambda: app.consulta_caso7(redis_con, dias=1, hoy=args.hasta), None, repeticiones, None),
+            ('caso7:7d', lambda: app.consulta_caso7(redis_con, dias=7, hoy=args.hasta), None, repeticiones, None),
+            ('caso7:30d', lambda: app.consulta_caso7(redis_con, dias=30, hoy=args.hasta), None, repeticiones, None),
+            ('caso8:miss', lambda id_usuario: app.consulta_caso8(redis_con, pg_con, id_usuario), [(u,) for u in usuarios], repeticiones, borrar_clave),
+            # Mismos usuarios que la serie anterior: todas las claves quedaron cargadas
+            ('caso8:hit', lambda id_usuario: app.consulta_caso8(redis_con, pg_con, id_usuario), [(u,) for u in usuarios],
+             min(repeticiones, len(usuarios)) or repeticiones, None),
+        ]
+    if redis_con is not None:
+        # Refrescos repetidos de un tablero: la primera llamada calcula, el resto sale de la caché de resultados
+        desde = hasta - datetime.timedelta(days=7)
+        cacheadas = []
+        if mongo_db is not None:
+            cacheadas += [
+                ('caso1', [desde], lambda: app.consulta_caso1(mongo_db, desde)),
+                ('caso2', [], lambda: app.consulta_caso2(mongo_db)),
+            ]
+        if neo4j_driver is not None:
+            cacheadas.append(('caso9', [], lambda: app.consulta_caso9(neo4j_driver)))
+        consultas += [
+            (f"{caso}:cache", lambda caso=caso, params=params, calcular=calcular: app._consultar(caso, params, calcular),
+             None, repeticiones, None)
+            for caso, params, calcular in cacheadas
+        ]
+    if neo4j_driver is not None:
+        # Recorren todo el grafo: pocas repeticiones alcanzan
+        consultas += [
+            ('caso9', lambda: app.consulta_caso9(neo4j_driver), None, args.repeticiones_grafo, None),
+            ('caso10', lambda: app.consulta_caso10(neo4j_driver), None, args.repeticiones_grafo, None),
+        ]
+    return [medir_consulta(escala, nombre, fn, params, n, antes) for nombre, fn, params, n, antes in consultas]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el ETL y los casos 1-10 contra destinos locales a varias escalas.")
+    parser.add_argument("--escalas", type=lambda s: [float(x) for x in s.split(",") if x],
+                        default=[0.001, 0.01], help="Escalas de generar_datos.py separadas por coma")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Llamadas por consulta (casos 1-8)")
+    parser.add_argument("--repeticiones-grafo", type=int, default=10, help="Llamadas por consulta de Neo4j (casos 9-10)")
+    parser.add_argument("--muestras", type=int, default=500, help="Parámetros distintos que se toman de los datos")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de generar_datos.py")
+    # Fija la ventana de fechas: dos corridas con la misma --hasta siembran lo mismo
+    parser.add_argument("--hasta", type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument("--astra", choices=["memoria", "real"], default="memoria")
+    parser.add_argument("--astra-latencia-ms", type=float, default=0.0,
+                        help="Espera por petición del Astra en memoria")
+    parser.add_argument("--sin-mongo", action="store_true")
+    parser.add_argument("--sin-redis", action="store_true")
+    parser.add_argument("--sin-neo4j", action="store_true")
+    parser.add_argument("--permitir-remoto", action="store_true",
+                        help="No exigir localhost (el benchmark BORRA los datos de los destinos)")
+    parser.add_argument("--salida", default="benchmark_resultados.json", help="Archivo JSON ('-' para stdout)")
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de cada sync_* y de generar_datos.py")
+    return parser.parse_args(argv)
+
+
+def ejecutar(args):
+    """Siembra, mide cada escala de `args.escalas` y devuelve el informe"""
+    remotos = comprobar_destinos_locales(args)
+    if remotos and not args.permitir_remoto:
+        print(f"❌ Destinos no locales: {', '.join(remotos)}. El benchmark borra datos; usar --permitir-remoto para forzar.")
+        sys.exit(1)
+
+    pg_con = app.PoolPostgres()
+    if not pg_con.disponible():
+        print("❌ PostgreSQL no disponible.")
+        sys.exit(1)
+    mongo_db = None if args.sin_mongo else app.get_mongo_client()
+    redis_con = None if args.sin_redis else app.get_redis()
+    neo4j_driver = None if args.sin_neo4j else app.get_neo4j_driver()
+    if redis_con is not None:
+        # Como en el menú: el ETL sube las versiones de la caché de resultados al escribir
+        app.activar_cache_resultados(redis_con)
+
+    omitidos = [nombre for nombre, destino in (('mongo', mongo_db), ('redis', redis_con), ('neo4j', neo4j_driver))
+                if destino is None]
+    with app._usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass('public.mano')")
+        existe = cur.fetchone()[0] is not None
+        cur.close()
+        conn.rollback()
+    if not existe:
+        app.crear_tablas_postgres(pg_con)
+    app.migrar_esquema_postgres(pg_con)
+    if mongo_db is not None:
+        app.asegurar_indices_mongo(mongo_db)
+
+    resultados = []
+    try:
+        for escala in args.escalas:
+            print(f"\n➡️  Escala {escala}")
+            vaciar_destinos(pg_con, mongo_db, redis_con, neo4j_driver)
+            if args.astra == 'real':
+                astra_db = app.get_cassandra_session()
+                if astra_db is None and 'astra' not in omitidos:
+                    omitidos.append('astra')
+            else:
+                astra_db = AstraEnMemoria(args.astra_latencia_ms / 1000)
+
+            inicio = time.perf_counter()
+            rss_hijos = sembrar(escala, args)
+            segundos = time.perf_counter() - inicio
+            filas = contar_filas(pg_con)
+            generadas = sum(filas.values())
+            resultados.append({
+                'escala': escala, 'tipo': 'siembra', 'nombre': 'generar_datos', 'ok': True,
+                'filas': generadas, 'segundos': round(segundos, 4),
+                'filas_por_segundo': round(generadas / segundos, 1) if segundos > 0 else None,
+                'rss_pico_kb': rss_hijos, 'tablas': filas,
+            })
+            print(f"   🌱 {generadas:,} filas sembradas en {segundos:.1f}s")
+            if redis_con is not None:
+                cargar_ranking(pg_con, redis_con, args.hasta)
+
+            resultados += medir_etl(escala, pg_con, mongo_db, astra_db, neo4j_driver, filas, args.verboso)
+            resultados += medir_consultas(escala, pg_con, mongo_db, astra_db, redis_con, neo4j_driver, args)
+    finally:
+        pg_con.cerrar()
+        if neo4j_driver is not None:
+            neo4j_driver.close()
+
+    return {
+        'generado_en': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {
+            'escalas': args.escalas, 'semilla': args.semilla, 'hasta': args.hasta.isoformat(),
+            'repeticiones': args.repeticiones, 'repeticiones_grafo': args.repeticiones_grafo,
+            'astra': args.astra, 'astra_latencia_ms': args.astra_latencia_ms,
+            'pg_pool_max': app.PG_POOL_MAX, 'mongo_batch_size': app.MONGO_BATCH_SIZE,
+            'astra_batch_size': app.ASTRA_BATCH_SIZE, 'astra_workers': app.ASTRA_WORKERS,
+            'neo4j_batch_size': app.NEO4J_BATCH_SIZE,
+        },
+        'omitidos': omitidos,
+        'resultados': resultados,
+    }
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    # Con --salida - por stdout sólo sale el JSON; el progreso va a stderr
+    with contextlib.redirect_stdout(sys.stderr) if args.salida == '-' else contextlib.nullcontext():
+        informe = ejecutar(args)
+    texto = json.dumps(informe, indent=2, ensure_ascii=False, default=str)
+    if args.salida == '-':
+        print(texto)
+    else:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + "\n")
+        print(f"\n✅ Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,815 @@
+"""etl_async.py
+
+Modo asyncio del ETL y de las consultas de los casos 1-10. Usa los mismos modelos de lectura,
+consultas SQL, documentos y watermarks que pokerstars_app.py, pero con los clientes asíncronos
+de cada backend: psycopg 3 (AsyncConnection), motor, redis.asyncio, AsyncGraphDatabase de neo4j
+y AsyncDatabase de astrapy.
+
+Acciones:
+1. Carga .env y conecta a la vez los backends que necesita el comando, cada uno con su
+   timeout (TIMEOUTS_CONEXION de pokerstars_app.py).
+2. sync: extrae cada tabla de PostgreSQL una sola vez con un cursor de servidor y reparte
+   los lotes por colas acotadas (asyncio.Queue) entre los destinos Mongo, Astra y Neo4j.
+   - Cada destino tiene como mucho ETL_ASYNC_EN_VUELO escrituras en vuelo; cuando se llenan,
+     deja de leer su cola, la cola se llena y la extracción espera (contrapresión).
+   - Las idas y vueltas a Atlas/Astra se superponen en vez de pagarse una detrás de otra.
+   - Los watermarks, las métricas (METRICAS), las versiones de la caché de resultados y la
+     frescura de los modelos (etl_frescura) se actualizan igual que en sync_todo.
+3. casos: ejecuta a la vez las consultas de los casos pedidos e imprime filas y tiempos
+   (o el resultado completo en JSON con --json).
+
+Detalles:
+- Requiere además psycopg[binary] y motor (ver requirements.txt).
+- Las conexiones a PostgreSQL se reutilizan entre extracciones (PostgresAsync): con una
+  base remota el handshake TLS se paga una vez por conexión y no una por tabla.
+- Neo4j escribe de a un lote por destino (ETL_ASYNC_EN_VUELO_NEO4J): los MERGE sobre los
+  mismos nodos desde transacciones paralelas se bloquean entre sí.
+- Las consultas no pasan por la caché de resultados ni por el ETL bajo demanda: leen el
+  modelo ya sincronizado.
+
+Uso rápido:
+python etl_async.py sync
+python etl_async.py sync --completo --destinos mongo,astra --metricas
+python etl_async.py casos --casos 1,2,5,9 --fecha 2025-09-10 --json
+
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import pokerstars_app as app
+
+
+# Drivers asíncronos que no usa pokerstars_app.py (neo4j, astrapy y pymongo salen de ahí)
+psycopg = app.DriverDiferido('psycopg')
+motor_asyncio = app.DriverDiferido('motor.motor_asyncio')
+redis_asyncio = app.DriverDiferido('redis.asyncio')
+
+# Escrituras (lotes) en vuelo por destino y conexiones de extracción abiertas a la vez
+ETL_ASYNC_EN_VUELO = int(os.getenv("ETL_ASYNC_EN_VUELO", "8"))
+ETL_ASYNC_EN_VUELO_NEO4J = int(os.getenv("ETL_ASYNC_EN_VUELO_NEO4J", "1"))
+ETL_ASYNC_CONEXIONES_PG = int(os.getenv("ETL_ASYNC_CONEXIONES_PG", str(app.PG_POOL_MAX)))
+
+BACKENDS_CASOS = {
+    'caso1': ('mongo',), 'caso2': ('mongo',), 'caso3': ('mongo',), 'caso4': ('mongo',),
+    'caso5': ('astra',), 'caso6': ('astra',),
+    'caso7': ('redis',), 'caso8': ('redis', 'postgres'),
+    'caso9': ('neo4j',), 'caso10': ('neo4j',),
+}
+
+_FIN_FLUJO = object()
+_ERROR_FLUJO = object()
+
+
+# ====================================
+#   CONEXIONES ASÍNCRONAS
+# ====================================
+
+class PostgresAsync:
+    """Pool de conexiones psycopg 3 a DATABASE_PUBLIC_URL, como mucho `maximo` abiertas a la vez.
+
+    Como app.PoolPostgres: cada operación toma prestada una conexión con
+    `conexion()` y la devuelve al salir (con rollback si quedó algo sin
+    confirmar). Las conexiones caídas se descartan y se reemplazan por una nueva.
+    """
+
+    def __init__(self, url, maximo=ETL_ASYNC_CONEXIONES_PG):
+        self.url = url
+        self._cupos = asyncio.Semaphore(maximo)
+        self._libres = []
+
+    async def _tomar(self):
+        while self._libres:
+            conn = self._libres.pop()
+            if not conn.closed:
+                return conn
+        return await psycopg.AsyncConnection.connect(
+            self.url, connect_timeout=max(2, int(app.TIMEOUTS_CONEXION['postgres'] + 0.5)))
+
+    async def _devolver(self, conn, rota):
+        if rota or conn.closed:
+            await self._descartar(conn)
+            return
+        try:
+            # Nunca devolver una transacción abierta: lo no confirmado se descarta
+            await conn.rollback()
+            self._libres.append(conn)
+        except psycopg.Error:
+            await self._descartar(conn)
+
+    @staticmethod
+    async def _descartar(conn):
+        try:
+            await conn.close()
+        except psycopg.Error:
+            pass
+
+    @contextlib.asynccontextmanager
+    async def conexion(self):
+        async with self._cupos:
+            conn = await self._tomar()
+            rota = False
+            try:
+                yield conn
+            except (psycopg.OperationalError, psycopg.InterfaceError):
+                # Se perdió la conexión: no vuelve al pool
+                rota = True
+                raise
+            finally:
+                await self._devolver(conn, rota)
+
+    async def cerrar(self):
+        while self._libres:
+            await self._descartar(self._libres.pop())
+
+
+async def _conectar_postgres():
+    url = os.getenv("DATABASE_PUBLIC_URL")
+    if not url:
+        raise ValueError("No se encontró DATABASE_PUBLIC_URL en .env")
+    pg = PostgresAsync(url)
+    async with pg.conexion() as conn:
+        await conn.execute("SELECT 1")
+    return pg
+
+
+async def _conectar_mongo():
+    timeout_ms = int(app.TIMEOUTS_CONEXION['mongo'] * 1000)
+    client = motor_asyncio.AsyncIOMotorClient(os.getenv("MONGO_URI"), serverSelectionTimeoutMS=timeout_ms,
+                                              connectTimeoutMS=timeout_ms)
+    await client.admin.command('ping')
+    return client['pokerstars']
+
+
+async def _conectar_redis():
+    r = redis_asyncio.Redis(
+        host=os.getenv("REDIS_HOST"),
+        port=int(os.getenv("REDIS_PORT")),
+        password=os.getenv("REDIS_PASSWORD"),
+        decode_responses=True,
+        socket_connect_timeout=app.TIMEOUTS_CONEXION['redis']
+    )
+    await r.ping()
+    return r
+
+
+async def _conectar_neo4j():
+    driver = app.neo4j.AsyncGraphDatabase.driver(
+        os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+        connection_timeout=app.TIMEOUTS_CONEXION['neo4j'])
+    await driver.verify_connectivity()
+    return driver
+
+
+async def _conectar_astra():
+    api_endpoint = os.getenv("ASTRA_DB_API_ENDPOINT")
+    token = os.getenv("ASTRA_DB_TOKEN")
+    if not api_endpoint or not token:
+        raise ValueError("Faltan credenciales de Astra DB en .env")
+    db = app.astrapy.DataAPIClient(token).get_async_database(api_endpoint)
+    await db.list_collection_names(timeout_ms=int(app.TIMEOUTS_CONEXION['astra'] * 1000))
+    return db
+
+
+class ClientesAsync:
+    """Handles asíncronos por backend (None si no se pidió o no respondió)"""
+
+    CONECTORES = {
+        'postgres': _conectar_postgres,
+        'mongo': _conectar_mongo,
+        'redis': _conectar_redis,
+        'neo4j': _conectar_neo4j,
+        'astra': _conectar_astra,
+    }
+
+    def __init__(self):
+        self.postgres = self.mongo = self.redis = self.neo4j = self.astra = None
+
+    async def conectar(self, backends):
+        """Conecta `backends` a la vez; tarda lo que el más lento, no la suma"""
+        async def _uno(nombre):
+            try:
+                handle = await asyncio.wait_for(self.CONECTORES[nombre](), app.TIMEOUTS_CONEXION[nombre])
+            except Exception as e:
+                print(f"❌ ERROR {nombre}: {e or type(e).__name__}")
+                return False
+            setattr(self, nombre, handle)
+            return True
+
+        inicio = time.perf_counter()
+        estado = dict(zip(backends, await asyncio.gather(*(_uno(nombre) for nombre in backends))))
+        print(f"⏱️  Conexiones en {time.perf_counter() - inicio:.2f}s: "
+              + ", ".join(f"{nombre} {'✔️' if ok else '❌'}" for nombre, ok in estado.items()))
+        return estado
+
+    async def cerrar(self):
+        if self.postgres is not None:
+            await self.postgres.cerrar()
+        if self.mongo is not None:
+            self.mongo.client.close()
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self.neo4j is not None:
+            await self.neo4j.close()
+
+
+# ====================================
+#   ETL ASÍNCRONO
+# ====================================
+
+async def _leer_marca(coleccion_estado, clave, incremental=True, version=1):
+    if not incremental:
+        return app.WATERMARK_INICIAL
+    return app._marca_desde_estado(await coleccion_estado.find_one({'_id': clave}), version)
+
+
+def _guardar_marca(coleccion_estado, clave, version=1):
+    async def guardar(marca):
+        await coleccion_estado.update_one({'_id': clave}, app._cambios_watermark(marca, version), upsert=True)
+    return guardar
+
+
+async def _escribir_mongo(coleccion, clave, lote, destino):
+    app.METRICAS.observar('lote_filas', len(lote), destino=destino)
+    result = await coleccion.bulk_write(
+        [app.pymongo.UpdateOne({clave: doc[clave]}, {'$set': doc}, upsert=True) for doc in lote], ordered=False)
+    return result.upserted_count, result.modified_count
+
+
+async def _escribir_astra(coleccion, lote, destino):
+    """Como _upsert_lote_astra, pero los reemplazos de los _id que chocaron viajan a la vez"""
+    app.METRICAS.observar('lote_filas', len(lote), destino=destino)
+    try:
+        await coleccion.insert_many(lote, ordered=False, chunk_size=len(lote), concurrency=1)
+        return len(lote), 0
+    except app.astrapy_exceptions.CollectionInsertManyException as e:
+        insertados = set(e.inserted_ids)
+
+    chocados = [doc for doc in lote if doc["_id"] not in insertados]
+    if chocados:
+        app.METRICAS.sumar('reintentos_total', len(chocados), destino=destino, motivo='colision_id')
+    resultados = await asyncio.gather(
+        *(coleccion.replace_one({"_id": doc["_id"]}, doc, upsert=True) for doc in chocados))
+    nuevos = len(insertados) + sum(1 for r in resultados if r.update_info.get("upserted") is not None)
+    actualizados = sum(1 for r in resultados
+                       if r.update_info.get("upserted") is None and r.update_info.get("nModified"))
+    return nuevos, actualizados
+
+
+async def _escribir_neo4j(driver, cypher, lote, destino):
+    intentos = [0]
+
+    async def _tx(tx):
+        # execute_write vuelve a llamar a esta función en cada reintento por error transitorio
+        intentos[0] += 1
+        resultado = await tx.run(cypher, rows=lote)
+        await resultado.consume()
+
+    app.METRICAS.observar('lote_filas', len(lote), destino=destino)
+    async with driver.session() as session:
+        await session.execute_write(_tx)
+    if intentos[0] > 1:
+        app.METRICAS.sumar('reintentos_total', intentos[0] - 1, destino=destino, motivo='transitorio')
+    return len(lote), 0
+
+
+async def _lotes_de_cola(cola, medicion, estado):
+    """Entrega los lotes de filas que llegan por `cola`; la espera cuenta como extracción"""
+    while True:
+        inicio = time.perf_counter()
+        filas = await cola.get()
+        medicion['extraccion'] += time.perf_counter() - inicio
+        if filas is _FIN_FLUJO or filas is _ERROR_FLUJO:
+            estado['cerrada'] = True
+            if filas is _ERROR_FLUJO:
+                raise RuntimeError("La extracción desde PostgreSQL se interrumpió")
+            return
+        yield filas
+
+
+async def _cargar_async(cola, destino, doc_fn, escribir, tamano_lote, en_vuelo,
+                        marca=None, guardar_marca=None, dependencias=(), redis_con=None):
+    """Tarea de un destino: transforma las filas de `cola` y las escribe con `escribir(lote)`.
+
+    Hay como mucho `en_vuelo` lotes escribiéndose a la vez; mientras tanto la
+    cola no se lee y la extracción se frena sola. Devuelve (insertados, actualizados, leidas).
+    """
+    estado = {'cerrada': False}
+    medicion = app._nueva_medicion()
+    insertados = actualizados = 0
+    pendientes = set()
+
+    def _recoger(terminadas):
+        nonlocal insertados, actualizados
+        for tarea in terminadas:
+            nuevos, cambiados = tarea.result()
+            insertados += nuevos
+            actualizados += cambiados
+
+    try:
+        for dependencia in dependencias:
+            await dependencia  # Propaga el error si la dependencia falló
+        inicio = time.perf_counter()
+        try:
+            docs = []
+            async for filas in _lotes_de_cola(cola, medicion, estado):
+                for row, doc in app._transformar_midiendo(filas, doc_fn, medicion):
+                    if marca is not None:
+                        marca = app._avanzar_watermark(marca, row[-1])
+                    docs.append(doc)
+                while len(docs) >= tamano_lote:
+                    pendientes.add(asyncio.create_task(escribir(docs[:tamano_lote])))
+                    docs = docs[tamano_lote:]
+                    if len(pendientes) >= en_vuelo:
+                        terminadas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                        _recoger(terminadas)
+            if docs:
+                pendientes.add(asyncio.create_task(escribir(docs)))
+            if pendientes:
+                terminadas, pendientes = await asyncio.wait(pendientes)
+                _recoger(terminadas)
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+            app._registrar_medicion(destino, medicion, time.perf_counter() - inicio)
+    finally:
+        # Si el destino falló a medias, seguir vaciando la cola para no bloquear la extracción
+        while not estado['cerrada']:
+            filas = await cola.get()
+            estado['cerrada'] = filas is _FIN_FLUJO or filas is _ERROR_FLUJO
+
+    if (insertados or actualizados) and redis_con is not None:
+        modelo = app._modelo_de_destino(destino)
+        try:
+            await redis_con.incr(app.CacheResultados._clave_version(modelo))
+        except Exception as e:
+            print(f"⚠️ No se pudo invalidar la caché de resultados de {modelo}: {e}")
+    leidas = medicion['filas']
+    if marca is not None and leidas:
+        await guardar_marca(marca)
+    return insertados, actualizados, leidas
+
+
+async def _extraer(pg, tabla, sql, params, colas, esperar=()):
+    """Lee `sql` con un cursor de servidor y pone cada lote en todas las `colas`.
+
+    Antes de tomar una conexión espera a las tareas de `esperar`: una extracción
+    cuyos destinos todavía no pueden cargar no ocupa un cupo de PostgreSQL.
+    """
+    if esperar:
+        await asyncio.wait(esperar)
+    try:
+        async with pg.conexion() as conn:
+            async with conn.cursor(name=f"etl_async_{tabla}") as cur:
+                await cur.execute(sql, params)
+                while True:
+                    filas = await cur.fetchmany(app.PG_FETCH_SIZE)
+                    if not filas:
+                        break
+                    for cola in colas:
+                        await cola.put(filas)
+            # Cierra la transacción de sólo lectura del cursor con nombre
+            await conn.rollback()
+    except Exception as e:
+        print(f"❌ Error extrayendo '{tabla}' de PostgreSQL: {e}")
+        for cola in colas:
+            await cola.put(_ERROR_FLUJO)
+        return
+    for cola in colas:
+        await cola.put(_FIN_FLUJO)
+
+
+async def _preparar_destinos(clientes, mongo, astra, neo4j_driver):
+    """Índices de Mongo, colecciones de Astra y constraints de Neo4j (todo idempotente)"""
+    async def _mongo():
+        for nombre_coleccion, indices in app.INDICES_MONGO.items():
+            await clientes.mongo[nombre_coleccion].create_indexes(
+                [app.pymongo.IndexModel(claves, **opciones) for claves, opciones in indices])
+
+    async def _astra():
+        existentes = await clientes.astra.list_collection_names()
+        for nombre in ("manos_por_fecha_mesa", "transacciones_por_usuario_fecha", "sync_estado"):
+            if nombre not in existentes:
+                await clientes.astra.create_collection(nombre)
+
+    async def _neo4j():
+        async with clientes.neo4j.session() as session:
+            await session.run("CREATE CONSTRAINT usuario_id IF NOT EXISTS FOR (u:Usuario) REQUIRE u.id_usuario IS UNIQUE")
+            await session.run("CREATE CONSTRAINT mesa_id IF NOT EXISTS FOR (m:Mesa) REQUIRE m.id_mesa IS UNIQUE")
+
+    preparaciones = [fn() for activo, fn in ((mongo, _mongo), (astra, _astra), (neo4j_driver, _neo4j)) if activo]
+    for error in await asyncio.gather(*preparaciones, return_exceptions=True):
+        if isinstance(error, Exception):
+            print(f"⚠️ No se pudo preparar un destino: {error}")
+
+
+async def _version_fuentes(pg, tablas):
+    async with pg.conexion() as conn:
+        cur = await conn.execute(app._consulta_version_fuentes(tablas))
+        return await cur.fetchone()
+
+
+async def _registrar_frescura(pg, versiones):
+    """Como app._registrar_frescura: en este proceso y en etl_frescura"""
+    ahora = time.monotonic()
+    for modelo, version in versiones.items():
+        app._estado_modelos[modelo] = {'version': version, 'comprobado': ahora}
+    if not versiones:
+        return
+    try:
+        async with pg.conexion() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany("""
+                    INSERT INTO etl_frescura (modelo, version) VALUES (%s, %s)
+                    ON CONFLICT (modelo) DO UPDATE SET version = EXCLUDED.version, sincronizado_en = NOW()
+                """, [(modelo, json.dumps(list(version))) for modelo, version in sorted(versiones.items())])
+            await conn.commit()
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar la frescura de {', '.join(versiones)}: {e}")
+
+
+async def _inicio_purga_outbox(pg):
+    try:
+        async with pg.conexion() as conn:
+            cur = await conn.execute(app.SQL_INICIO_PURGA_OUTBOX)
+            return await cur.fetchone()
+    except Exception as e:
+        print(f"⚠️ No se pudo preparar la purga de la outbox: {e}")
+        return None
+
+
+async def _purgar_outbox(pg, purga):
+    """Como app._purgar_outbox: una transacción corta después de que todos los destinos terminaron bien"""
+    try:
+        async with pg.conexion() as conn:
+            cur = await conn.execute(app.SQL_PURGA_OUTBOX, purga)
+            eventos = cur.rowcount
+            await conn.commit()
+        if eventos:
+            print(f"🧹 Outbox: {eventos} eventos ya cubiertos por la sincronización completa.")
+    except Exception as e:
+        print(f"⚠️ No se pudo purgar la outbox: {e}")
+
+
+async def _podar_outbox(pg, dias=app.OUTBOX_RETENCION_DIAS):
+    """Como app.podar_outbox"""
+    if dias <= 0:
+        return
+    try:
+        async with pg.conexion() as conn:
+            cur = await conn.execute(app.SQL_PODA_OUTBOX, (dias,))
+            eventos = cur.rowcount
+            await conn.commit()
+        if eventos:
+            print(f"🧹 Outbox: {eventos} eventos con más de {dias} días descartados.")
+    except Exception as e:
+        print(f"⚠️ No se pudo podar la outbox: {e}")
+
+
+async def sync_todo_async(clientes, incremental=True, destinos=('mongo', 'astra', 'neo4j')):
+    """Versión asyncio de sync_todo: una extracción por tabla, todos los destinos a la vez.
+
+    Devuelve True si todos los destinos terminaron bien.
+    """
+    print("🔄 Sincronizando todos los destinos (asyncio, una extracción por tabla)...")
+    inicio = time.perf_counter()
+    mongo_db = clientes.mongo if 'mongo' in destinos else None
+    astra_db = clientes.astra if 'astra' in destinos else None
+    neo4j_driver = clientes.neo4j if 'neo4j' in destinos else None
+    await _preparar_destinos(clientes, mongo_db is not None, astra_db is not None, neo4j_driver is not None)
+
+    def _mongo(coleccion, clave, destino):
+        return dict(escribir=functools.partial(_escribir_mongo, mongo_db[coleccion], clave, destino=destino),
+                    tamano_lote=app.MONGO_BATCH_SIZE, en_vuelo=ETL_ASYNC_EN_VUELO)
+
+    def _astra(coleccion, destino):
+        return dict(escribir=functools.partial(_escribir_astra, astra_db.get_collection(coleccion), destino=destino),
+                    tamano_lote=app.ASTRA_BATCH_SIZE, en_vuelo=ETL_ASYNC_EN_VUELO)
+
+    def _neo4j(cypher, destino):
+        return dict(escribir=functools.partial(_escribir_neo4j, neo4j_driver, cypher, destino=destino),
+                    tamano_lote=app.NEO4J_BATCH_SIZE, en_vuelo=ETL_ASYNC_EN_VUELO_NEO4J)
+
+    # Flujos: (tabla, consulta, [(tarea, doc_fn, opciones de carga, watermark, tareas de las que depende)]);
+    # el watermark es (colección de estado, clave, versión) o None
+    flujos = []
+    usuarios = []
+    if mongo_db is not None:
+        usuarios.append(('mongo:usuarios', app._doc_usuario_mongo,
+                         _mongo('usuarios', 'id_usuario', 'mongo:usuarios'), None, []))
+    if neo4j_driver is not None:
+        usuarios.append(('neo4j:usuarios', lambda row: {'id_usuario': row[0], 'nombre': row[1]},
+                         _neo4j(app.CYPHER_USUARIOS, 'neo4j:usuarios'), None, []))
+    if usuarios:
+        # SQL_USUARIOS también trae id_usuario y nombre, que es todo lo que necesita Neo4j
+        flujos.append(('usuario', app.SQL_USUARIOS if mongo_db is not None else "SELECT id_usuario, nombre FROM usuario",
+                       usuarios))
+    if neo4j_driver is not None:
+        flujos.append(('mesa', "SELECT id_mesa, modalidad, tipo FROM mesa", [
+            ('neo4j:mesas', lambda row: {'id_mesa': row[0], 'modalidad': row[1], 'tipo': row[2]},
+             _neo4j(app.CYPHER_MESAS, 'neo4j:mesas'), None, []),
+        ]))
+    for tabla, sql, consumidores in (
+        ('mano', app.SQL_MANOS, [
+            (mongo_db, 'mongo:manos', app._doc_mano_mongo, lambda: _mongo('manos', 'id_mano', 'mongo:manos'),
+             lambda: (mongo_db.sync_estado, 'manos', app.MANOS_DOC_VERSION)),
+            (astra_db, 'astra:manos', app._doc_mano_astra, lambda: _astra("manos_por_fecha_mesa", 'astra:manos'),
+             lambda: (astra_db.get_collection("sync_estado"), "manos_por_fecha_mesa", 1)),
+        ]),
+        ('transaccion', app.SQL_TRANSACCIONES, [
+            (mongo_db, 'mongo:transacciones', app._doc_transaccion_mongo,
+             lambda: _mongo('transacciones', 'id_transaccion', 'mongo:transacciones'),
+             lambda: (mongo_db.sync_estado, 'transacciones', 1)),
+            (astra_db, 'astra:transacciones', app._doc_transaccion_astra,
+             lambda: _astra("transacciones_por_usuario_fecha", 'astra:transacciones'),
+             lambda: (astra_db.get_collection("sync_estado"), "transacciones_por_usuario_fecha", 1)),
+        ]),
+    ):
+        activos = [(tarea, doc_fn, opciones(), estado(), [])
+                   for destino, tarea, doc_fn, opciones, estado in consumidores if destino is not None]
+        if activos:
+            flujos.append((tabla, sql, activos))
+    if neo4j_driver is not None:
+        # Sus aristas esperan a que existan los nodos de usuarios y mesas
+        flujos.append(('usuario_mesa', "SELECT id_usuario, id_mesa FROM usuario_mesa", [
+            ('neo4j:relaciones', lambda row: {'id_usuario': row[0], 'id_mesa': row[1]},
+             _neo4j(app.CYPHER_JUGO_EN, 'neo4j:relaciones'), None, ['neo4j:usuarios', 'neo4j:mesas']),
+        ]))
+
+    # La versión de las fuentes se lee ANTES de extraer: si algo cambia mientras tanto,
+    # el próximo chequeo de frescura lo verá
+    modelos = app._modelos_de_destinos(mongo_db is not None, astra_db is not None, neo4j_driver is not None)
+    versiones = {}
+    for modelo, version in zip(modelos, await asyncio.gather(
+            *(_version_fuentes(clientes.postgres, app.FUENTES_MODELOS[modelo]) for modelo in modelos),
+            return_exceptions=True)):
+        if isinstance(version, Exception):
+            print(f"⚠️ No se pudo leer la versión de las fuentes de {modelo}: {version}")
+        else:
+            versiones[modelo] = version
+
+    # Una copia completa a los tres destinos cubre la outbox (ver app.SQL_INICIO_PURGA_OUTBOX)
+    purga = None
+    if not incremental and mongo_db is not None and astra_db is not None and neo4j_driver is not None:
+        purga = await _inicio_purga_outbox(clientes.postgres)
+
+    # Todos los watermarks se leen a la vez; se extrae desde el más atrasado de cada tabla
+    con_marca = [(tarea, watermark) for *_, consumidores in flujos
+                 for tarea, _doc_fn, _opciones, watermark, _deps in consumidores if watermark is not None]
+    marcas = dict(zip(
+        [tarea for tarea, _watermark in con_marca],
+        await asyncio.gather(*(_leer_marca(coleccion, clave, incremental, version)
+                               for _tarea, (coleccion, clave, version) in con_marca))))
+
+    tareas = {}
+    extracciones = []
+    for tabla, sql, consumidores in flujos:
+        colas = []
+        marcas_flujo = []
+        esperar = []
+        for tarea, doc_fn, opciones, watermark, dependencias in consumidores:
+            cola = asyncio.Queue(maxsize=app.ORQUESTADOR_COLA_LOTES)
+            colas.append(cola)
+            marca = guardar = None
+            if watermark is not None:
+                coleccion, clave, version = watermark
+                marca = marcas[tarea]
+                marcas_flujo.append(marca)
+                guardar = _guardar_marca(coleccion, clave, version)
+            esperar += [tareas[d] for d in dependencias]
+            tareas[tarea] = asyncio.create_task(_cargar_async(
+                cola, tarea, doc_fn, marca=marca, guardar_marca=guardar,
+                dependencias=[tareas[d] for d in dependencias], redis_con=clientes.redis, **opciones))
+        params = app._params_watermark(app._marca_minima(marcas_flujo)) if marcas_flujo else None
+        extracciones.append(asyncio.create_task(_extraer(clientes.postgres, tabla, sql, params, colas, esperar)))
+
+    await asyncio.wait([*tareas.values(), *extracciones])
+
+    fallidas = set()
+    for tarea, futuro in tareas.items():
+        try:
+            insertados, actualizados, leidas = futuro.result()
+        except Exception as e:
+            fallidas.add(tarea)
+            print(f"❌ {tarea}: {e}")
+            continue
+        if tarea.startswith('neo4j:'):
+            print(f"✅ {tarea}: {insertados} filas")
+        else:
+            print(f"✅ {tarea}: {insertados} nuevos, {actualizados} actualizados, {leidas} leídos")
+    await _registrar_frescura(clientes.postgres, {modelo: version for modelo, version in versiones.items()
+                                                  if not fallidas.intersection(app.TAREAS_MODELOS[modelo])})
+    if purga is not None and not fallidas:
+        await _purgar_outbox(clientes.postgres, purga)
+    if not fallidas:
+        await _podar_outbox(clientes.postgres)
+
+    segundos = time.perf_counter() - inicio
+    app.METRICAS.observar('sync_segundos', segundos, sync='sync_todo_async',
+                          resultado='error' if fallidas else 'ok')
+    print(f"⏱️  Sincronización completa en {segundos:.2f}s")
+    return not fallidas
+
+
+# ====================================
+#   CONSULTAS DE LOS CASOS
+# ====================================
+
+async def consulta_caso1_async(db, desde):
+    return await db.manos.aggregate(app._pipeline_caso1(desde)).to_list(None)
+
+
+async def consulta_caso2_async(db, limite=10):
+    return await db.usuarios.find().sort("balance_total", -1).limit(limite).to_list(None)
+
+
+async def consulta_caso3_async(db, mes, anio):
+    return await db.manos.find(app._filtro_caso3(mes, anio)).to_list(None)
+
+
+async def consulta_caso4_async(db, id_usuario):
+    return await db.transacciones.find(app._filtro_caso4(id_usuario)).to_list(None)
+
+
+async def consulta_caso5_async(astra_db, id_mesa, fecha_str):
+    collection = astra_db.get_collection("manos_por_fecha_mesa")
+    return [doc async for doc in collection.find({"id_mesa": id_mesa, "fecha": fecha_str})]
+
+
+async def consulta_caso6_async(astra_db, id_usuario, fecha_str):
+    collection = astra_db.get_collection("transacciones_por_usuario_fecha")
+    return [doc async for doc in collection.find({"id_usuario": id_usuario, "fecha": fecha_str})]
+
+
+async def consulta_caso7_async(r, top=5, dias=7, hoy=None):
+    clave, dias_ventana = app._claves_ventana(dias, hoy)
+    if dias_ventana and not await r.exists(clave):
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(clave, dias_ventana)
+            pipe.expire(clave, app.RANKING_VENTANA_TTL)
+            await pipe.execute()
+    return await r.zrevrange(clave, 0, top - 1, withscores=True)
+
+
+async def consulta_caso8_async(r, pg, id_usuario):
+    """Devuelve (balance, origen) como consulta_caso8; guarda en caché con el mismo script CAS"""
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.get(app._clave_balance(id_usuario))
+        pipe.get(app._clave_generacion_balance(id_usuario))
+        valor, generacion = await pipe.execute()
+    if valor is not None:
+        return float(valor), 'cache'
+
+    async with pg.conexion() as conn:
+        cur = await conn.execute("SELECT saldo_real FROM usuario WHERE id_usuario = %s", (id_usuario,))
+        fila = await cur.fetchone()
+    if fila is None:
+        return None, None
+    balance = float(fila[0])
+    guardar = r.register_script(app.LUA_GUARDAR_BALANCE)
+    await guardar(keys=[app._clave_balance(id_usuario), app._clave_generacion_balance(id_usuario)],
+                  args=[generacion or '', balance, app.BALANCE_TTL])
+    return balance, 'postgres'
+
+
+async def _leer_grafo(driver, cypher):
+    async with driver.session() as session:
+        resultado = await session.run(cypher)
+        return await resultado.data()
+
+
+async def consulta_caso9_async(driver):
+    return await _leer_grafo(driver, app.CYPHER_CASO9)
+
+
+async def consulta_caso10_async(driver):
+    return await _leer_grafo(driver, app.CYPHER_CASO10)
+
+
+def _consultas(clientes, args):
+    """Corrutinas de cada caso con los parámetros de la línea de comandos"""
+    desde = (datetime.datetime.now() - datetime.timedelta(days=args.desde_dias)).replace(second=0, microsecond=0)
+    fecha = args.fecha or datetime.date.today().isoformat()
+    return {
+        'caso1': lambda: consulta_caso1_async(clientes.mongo, desde),
+        'caso2': lambda: consulta_caso2_async(clientes.mongo),
+        'caso3': lambda: consulta_caso3_async(clientes.mongo, args.mes, args.anio),
+        'caso4': lambda: consulta_caso4_async(clientes.mongo, args.id_usuario),
+        'caso5': lambda: consulta_caso5_async(clientes.astra, args.id_mesa, fecha),
+        'caso6': lambda: consulta_caso6_async(clientes.astra, args.id_usuario, fecha),
+        'caso7': lambda: consulta_caso7_async(clientes.redis, dias=args.dias),
+        'caso8': lambda: consulta_caso8_async(clientes.redis, clientes.postgres, args.id_usuario),
+        'caso9': lambda: consulta_caso9_async(clientes.neo4j),
+        'caso10': lambda: consulta_caso10_async(clientes.neo4j),
+    }
+
+
+async def consultar_casos(clientes, casos, args):
+    """Ejecuta los `casos` a la vez. Devuelve {caso: {'filas', 'segundos', 'resultado'} o {'error'}}"""
+    consultas = _consultas(clientes, args)
+
+    async def _uno(caso):
+        faltantes = [b for b in BACKENDS_CASOS[caso] if getattr(clientes, b) is None]
+        if faltantes:
+            return {'error': f"{', '.join(faltantes)} no disponible"}
+        inicio = time.perf_counter()
+        try:
+            resultado = await consultas[caso]()
+        except Exception as e:
+            return {'error': str(e)}
+        return {'filas': len(resultado) if isinstance(resultado, list) else 1,
+                'segundos': round(time.perf_counter() - inicio, 4), 'resultado': resultado}
+
+    return dict(zip(casos, await asyncio.gather(*(_uno(caso) for caso in casos))))
+
+
+# ====================================
+#   LÍNEA DE COMANDOS
+# ====================================
+
+def _lista(texto, validos):
+    valores = [v.strip() for v in texto.split(',') if v.strip()]
+    invalidos = [v for v in valores if v not in validos]
+    if invalidos:
+        raise argparse.ArgumentTypeError(f"valores no válidos: {', '.join(invalidos)}")
+    return valores
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ETL y casos 1-10 con asyncio")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    sync = comandos.add_parser('sync', help="Sincroniza los modelos de lectura desde PostgreSQL")
+    sync.add_argument('--completo', action='store_true', help="Ignorar los watermarks (copia completa)")
+    sync.add_argument('--destinos', default='mongo,astra,neo4j',
+                      type=lambda t: _lista(t, ('mongo', 'astra', 'neo4j')),
+                      help="Destinos separados por coma (por defecto todos)")
+    sync.add_argument('--metricas', action='store_true', help="Imprimir METRICAS en JSON al terminar")
+
+    casos = comandos.add_parser('casos', help="Ejecuta a la vez las consultas de los casos")
+    casos.add_argument('--casos', default=','.join(c[4:] for c in BACKENDS_CASOS),
+                       type=lambda t: [f"caso{c}" for c in _lista(t, [c[4:] for c in BACKENDS_CASOS])],
+                       help="Números de caso separados por coma (por defecto 1-10)")
+    casos.add_argument('--desde-dias', type=int, default=7, help="caso1: últimos N días")
+    casos.add_argument('--mes', type=int, default=9, help="caso3")
+    casos.add_argument('--anio', type=int, default=datetime.date.today().year, help="caso3")
+    casos.add_argument('--id-usuario', type=int, default=1, help="casos 4, 6 y 8")
+    casos.add_argument('--id-mesa', type=int, default=1, help="caso5")
+    casos.add_argument('--fecha', help="casos 5 y 6, YYYY-MM-DD (por defecto hoy)")
+    casos.add_argument('--dias', type=int, default=7, help="caso7: ventana del ranking")
+    casos.add_argument('--json', action='store_true', help="Imprimir los resultados completos en JSON")
+    return parser.parse_args(argv)
+
+
+async def ejecutar(args):
+    clientes = ClientesAsync()
+    if args.comando == 'sync':
+        # Redis es opcional: sólo sube las versiones de la caché de resultados
+        estado = await clientes.conectar(['postgres', *args.destinos, 'redis'])
+        if not estado['postgres']:
+            return False
+        try:
+            ok = await sync_todo_async(clientes, incremental=not args.completo,
+                                       destinos=[d for d in args.destinos if estado[d]])
+        finally:
+            await clientes.cerrar()
+        if args.metricas:
+            print(json.dumps(app.METRICAS.a_dict(), indent=2, ensure_ascii=False))
+        return ok and all(estado[d] for d in args.destinos)
+
+    backends = list(dict.fromkeys(b for caso in args.casos for b in BACKENDS_CASOS[caso]))
+    await clientes.conectar(backends)
+    try:
+        resultados = await consultar_casos(clientes, args.casos, args)
+    finally:
+        await clientes.cerrar()
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False, default=str))
+    else:
+        for caso, r in resultados.items():
+            if 'error' in r:
+                print(f"❌ {caso}: {r['error']}")
+            else:
+                print(f"✅ {caso}: {r['filas']} filas ({r['segundos'] * 1000:.1f} ms)")
+    return not any('error' in r for r in resultados.values())
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    if sys.platform == 'win32':
+        # psycopg 3 no funciona con el ProactorEventLoop por defecto de Windows
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(0 if asyncio.run(ejecutar(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
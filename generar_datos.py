@@ -0,0 +1,510 @@
+"""generar_datos.py
+
+Generador de datos sintéticos de alto volumen para la base PostgreSQL indicada por
+DATABASE_PUBLIC_URL en .env. Sirve para dimensionar hardware y probar los caminos de
+sincronización (ETL completo, CDC, casos de uso) con volúmenes realistas.
+
+Acciones:
+1. Carga .env y crea el esquema si todavía no existe (crear_tablas_postgres).
+2. Genera datos referencialmente consistentes para TODAS las tablas del esquema:
+   usuario, promocion, usuario_promocion, metodo_pago, transaccion, torneo, mesa,
+   usuario_mesa, usuario_torneo, mano, usuario_mano y jugada.
+3. Carga cada tabla con COPY FROM STDIN. Las tablas grandes se parten en bloques de
+   --lote filas que cargan varios procesos en paralelo, cada uno con su conexión.
+4. Recalcula usuario_resumen y hace ANALYZE.
+
+Detalles:
+- Antes de cargar se reserva en cada secuencia SERIAL el rango de ids a generar
+  (reservar_ids): se puede correr sobre una base con datos y con la aplicación
+  escribiendo, que sigue numerando después del rango (agrega, no borra).
+- Cada bloque usa su propio RNG derivado de --semilla, así el resultado es el mismo
+  con cualquier cantidad de --workers. Con la misma --hasta la salida es reproducible.
+- Salvo con --con-triggers, las sesiones del generador corren con
+  session_replication_role = replica: sus filas no disparan triggers (outbox CDC,
+  usuario_resumen ni los chequeos de FK) pero las de las demás
+  sesiones sí, y si el proceso muere no queda nada apagado. Hace falta un rol con
+  permiso para cambiar ese parámetro (superusuario en la mayoría de los hostings).
+- Las filas generadas no pasan por la outbox: sincronizar los destinos con la opción
+  'e' del menú.
+
+Uso rápido:
+python generar_datos.py --escala 1                # 100 mil usuarios, 1 millón de manos
+python generar_datos.py --escala 10 --workers 8   # 10 millones de manos
+
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+import psycopg2
+from dotenv import load_dotenv
+
+from pokerstars_app import crear_tablas_postgres, recalcular_resumen_usuarios
+
+
+# Volúmenes con --escala 1 (cada uno se puede pisar con su propia opción)
+BASE = {
+    'usuarios': 100_000,
+    'promociones': 50,
+    'torneos': 500,
+    'mesas': 5_000,
+    'transacciones': 1_000_000,
+    'manos': 1_000_000,
+}
+
+PAISES = ['Argentina', 'Brasil', 'Chile', 'España', 'México', 'Uruguay', 'Colombia', 'Perú']
+PESOS_PAISES = [30, 20, 10, 15, 12, 5, 5, 3]
+MODALIDADES = ['Texas Holdem', 'Omaha', 'Seven Card Stud']
+PESOS_MODALIDADES = [70, 25, 5]
+TIPOS_MESA = ['Cash Game', 'Sit & Go', 'Torneo']
+PESOS_TIPOS_MESA = [60, 25, 15]
+CIEGAS = ['1/2', '5/10', '10/20', '25/50', '100/200']
+MEDIOS_PAGO = ['paypal', 'tarjeta', 'transferencia', 'criptomoneda']
+PESOS_MEDIOS_PAGO = [40, 35, 15, 10]
+ESTADOS_TRANSACCION = ['completada', 'pendiente', 'rechazada']
+PESOS_ESTADOS_TRANSACCION = [90, 7, 3]
+RONDAS = ['preflop', 'flop', 'turn', 'river']
+ACCIONES = ['check', 'call', 'bet', 'raise', 'fold', 'all-in']
+
+# Columna id de las tablas que tienen SERIAL
+IDS_SERIAL = {
+    'usuario': 'id_usuario',
+    'promocion': 'id_promocion',
+    'metodo_pago': 'id_metodo',
+    'transaccion': 'id_transaccion',
+    'torneo': 'id_torneo',
+    'mesa': 'id_mesa',
+    'mano': 'id_mano',
+    'jugada': 'id_jugada',
+}
+
+
+def connect():
+    db_url = os.getenv("DATABASE_PUBLIC_URL")
+    if not db_url:
+        raise RuntimeError("DATABASE_PUBLIC_URL no definido en .env")
+    return psycopg2.connect(db_url)
+
+
+# ====================================
+#   COPY
+# ====================================
+
+def _linea(valores):
+    """Fila en formato texto de COPY (los valores generados no tienen tabs ni saltos de línea)"""
+    return "\t".join("\\N" if v is None else str(v) for v in valores) + "\n"
+
+
+class FlujoCopy:
+    """Objeto tipo archivo que va armando las líneas de COPY a medida que Postgres las lee.
+
+    Así nunca se arma el texto de un bloque entero en memoria.
+    """
+
+    def __init__(self, filas):
+        self._filas = iter(filas)
+        self._pendiente = ""
+        self.filas = 0
+
+    def read(self, tamano=-1):
+        partes = [self._pendiente]
+        largo = len(self._pendiente)
+        while tamano < 0 or largo < tamano:
+            fila = next(self._filas, None)
+            if fila is None:
+                break
+            self.filas += 1
+            linea = _linea(fila)
+            partes.append(linea)
+            largo += len(linea)
+        datos = "".join(partes)
+        if tamano < 0:
+            self._pendiente = ""
+            return datos
+        self._pendiente = datos[tamano:]
+        return datos[:tamano]
+
+
+def copiar(cur, tabla, columnas, filas):
+    """COPY FROM STDIN de `filas` (cualquier iterable de tuplas). Devuelve cuántas se cargaron"""
+    flujo = FlujoCopy(filas)
+    cur.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN", flujo)
+    return flujo.filas
+
+
+# ====================================
+#   PLAN DE GENERACIÓN
+# ====================================
+
+def rng_bloque(semilla, tabla, bloque):
+    """RNG propio de cada bloque: el resultado no depende del orden ni de los workers"""
+    return random.Random(f"{semilla}:{tabla}:{bloque}")
+
+
+def usuario_sesgado(rng, plan):
+    """Índice de usuario (0..n-1) con cola larga: pocos usuarios concentran mucha actividad"""
+    return min(int(plan['usuarios'] * rng.random() ** plan['sesgo']), plan['usuarios'] - 1)
+
+
+def fecha_aleatoria(rng, plan):
+    segundos = rng.uniform(0, plan['dias'] * 86400)
+    return (plan['hasta'] - datetime.timedelta(seconds=segundos)).replace(microsecond=0)
+
+
+def bote_aleatorio(rng, plan):
+    # Lognormal con media --bote-media: muchos botes chicos y algunos enormes
+    mu = math.log(plan['bote_media']) - plan['bote_sigma'] ** 2 / 2
+    return round(min(rng.lognormvariate(mu, plan['bote_sigma']), 1e9), 2)
+
+
+def bloques(total, lote):
+    return [(i, inicio, min(inicio + lote, total)) for i, inicio in enumerate(range(0, total, lote))]
+
+
+# ====================================
+#   WORKERS (un proceso por CPU, una conexión por proceso)
+# ====================================
+
+_conn = None
+_plan = None
+
+
+def _iniciar_worker(plan):
+    global _conn, _plan
+    load_dotenv()
+    _plan = plan
+    _conn = connect()
+    # Datos sintéticos: perder el último commit ante una caída no importa y cada commit es más barato
+    _conn.cursor().execute("SET synchronous_commit = off")
+    if not plan['con_triggers']:
+        modo_replica(_conn)
+
+
+def _bloque_usuarios(args):
+    """usuario + sus métodos de pago + sus promociones, para los usuarios [inicio, fin)"""
+    bloque, inicio, fin = args
+    plan = _plan
+    rng = rng_bloque(plan['semilla'], 'usuario', bloque)
+    u0, m0, k = plan['base']['usuario'], plan['base']['metodo_pago'], plan['metodos_por_usuario']
+    usuarios, metodos, promos = [], [], []
+    for i in range(inicio, fin):
+        id_usuario = u0 + i + 1
+        fecha_registro = fecha_aleatoria(rng, plan)
+        usuarios.append((id_usuario, f"Jugador {id_usuario}", rng.choices(PAISES, PESOS_PAISES)[0],
+                         rng.random() < 0.6, f"jugador{id_usuario}@pokerstars.test", fecha_registro,
+                         round(rng.uniform(0, 5000), 2), round(rng.uniform(0, 100000), 2)))
+        for j in range(k):
+            tipo = rng.choices(MEDIOS_PAGO, PESOS_MEDIOS_PAGO)[0]
+            metodos.append((m0 + i * k + j + 1, id_usuario, tipo, f"enc_{tipo}_{id_usuario}_{j}",
+                            'activo' if rng.random() < 0.95 else 'inactivo'))
+        if plan['promociones'] and rng.random() < 0.3:
+            for id_promocion in rng.sample(range(plan['promociones']), min(2, plan['promociones'])):
+                promos.append((id_usuario, plan['base']['promocion'] + id_promocion + 1))
+
+    cur = _conn.cursor()
+    n = copiar(cur, 'usuario', ['id_usuario', 'nombre', 'pais', 'verificacion_kyc', 'email',
+                                'fecha_registro', 'saldo_real', 'saldo_fichas'], usuarios)
+    copiar(cur, 'metodo_pago', ['id_metodo', 'id_usuario', 'tipo', 'datos_encriptados', 'estado'], metodos)
+    copiar(cur, 'usuario_promocion', ['id_usuario', 'id_promocion'], promos)
+    _conn.commit()
+    cur.close()
+    return 'usuario', n
+
+
+def _filas_transacciones(rng, plan, inicio, fin):
+    u0, m0, t0, k = plan['base']['usuario'], plan['base']['metodo_pago'], plan['base']['transaccion'], plan['metodos_por_usuario']
+    for i in range(inicio, fin):
+        indice = usuario_sesgado(rng, plan)
+        tipo = 'deposito' if rng.random() < plan['proporcion_depositos'] else 'retiro'
+        monto = round(min(rng.lognormvariate(math.log(50), 1.2), 50000), 2) + 1
+        yield (t0 + i + 1, u0 + indice + 1, m0 + indice * k + rng.randrange(k) + 1,
+               fecha_aleatoria(rng, plan), monto,
+               rng.choices(ESTADOS_TRANSACCION, PESOS_ESTADOS_TRANSACCION)[0],
+               rng.random() < 0.98, tipo)
+
+
+def _bloque_transacciones(args):
+    bloque, inicio, fin = args
+    rng = rng_bloque(_plan['semilla'], 'transaccion', bloque)
+    cur = _conn.cursor()
+    n = copiar(cur, 'transaccion', ['id_transaccion', 'id_usuario', 'id_metodo', 'fecha', 'monto',
+                                    'estado', 'cumplimiento_aml', 'tipo'],
+               _filas_transacciones(rng, _plan, inicio, fin))
+    _conn.commit()
+    cur.close()
+    return 'transaccion', n
+
+
+def _bloque_manos(args):
+    """mano + usuario_mano + jugada para las manos [inicio, fin), en una transacción"""
+    bloque, inicio, fin = args
+    plan = _plan
+    rng = rng_bloque(plan['semilla'], 'mano', bloque)
+    a0, j0, mesas, jpm = plan['base']['mano'], plan['base']['jugada'], plan['mesas_info'], plan['jugadas_por_mano']
+    manos, participantes, jugadas = [], [], []
+    for i in range(inicio, fin):
+        id_mano = a0 + i + 1
+        id_mesa, modalidad, sentados = mesas[rng.randrange(len(mesas))]
+        jugadores = rng.sample(sentados, rng.randint(2, len(sentados)))
+        bote = bote_aleatorio(rng, plan)
+        ganador = rng.choice(jugadores)
+        manos.append((id_mano, id_mesa, round(bote * 0.05, 2), bote, fecha_aleatoria(rng, plan), ganador, modalidad))
+        participantes.extend((id_usuario, id_mano) for id_usuario in jugadores)
+        for j in range(jpm):
+            jugadas.append((j0 + i * jpm + j + 1, id_mano, rng.choice(jugadores),
+                            round(rng.uniform(0, bote / 2), 2), RONDAS[min(j, len(RONDAS) - 1)],
+                            rng.choice(ACCIONES)))
+
+    cur = _conn.cursor()
+    n = copiar(cur, 'mano', ['id_mano', 'id_mesa', 'rake', 'bote_total', 'fecha_hora', 'ganador_id', 'modalidad'], manos)
+    copiar(cur, 'usuario_mano', ['id_usuario', 'id_mano'], participantes)
+    copiar(cur, 'jugada', ['id_jugada', 'id_mano', 'id_usuario', 'monto_apostado', 'ronda', 'accion'], jugadas)
+    _conn.commit()
+    cur.close()
+    return 'mano', n
+
+
+# ====================================
+#   TABLAS CHICAS (proceso principal)
+# ====================================
+
+def generar_catalogos(conn, plan):
+    """promocion, torneo y mesa: no dependen de los usuarios"""
+    rng = rng_bloque(plan['semilla'], 'catalogos', 0)
+    p0, t0, s0 = plan['base']['promocion'], plan['base']['torneo'], plan['base']['mesa']
+    hoy = plan['hasta'].date()
+
+    promociones = []
+    for i in range(plan['promociones']):
+        inicio = hoy - datetime.timedelta(days=rng.randrange(plan['dias']))
+        promociones.append((p0 + i + 1, f"Promo {p0 + i + 1}", rng.choice(['activa', 'finalizada']),
+                            rng.choice([5, 10, 15, 20, 50]), inicio, inicio + datetime.timedelta(days=30)))
+
+    torneos = []
+    for i in range(plan['torneos']):
+        tipo = rng.choice(['Freeroll', 'Buy-in', 'Satélite'])
+        torneos.append((t0 + i + 1, f"Torneo {t0 + i + 1}", fecha_aleatoria(rng, plan), tipo,
+                        rng.choices(MODALIDADES, PESOS_MODALIDADES)[0], 'Reglas estándar',
+                        0 if tipo == 'Freeroll' else rng.choice([5, 10, 25, 100, 500]),
+                        rng.choice([90, 180, 1000, 5000])))
+
+    mesas = []
+    for i in range(plan['mesas']):
+        tipo = rng.choices(TIPOS_MESA, PESOS_TIPOS_MESA)[0]
+        id_torneo = t0 + rng.randrange(plan['torneos']) + 1 if tipo == 'Torneo' and plan['torneos'] else None
+        mesas.append((s0 + i + 1, rng.choices(MODALIDADES, PESOS_MODALIDADES)[0], tipo, 'Reglas estándar',
+                      rng.choice([6, 8, 9]), rng.choice(CIEGAS), id_torneo))
+
+    cur = conn.cursor()
+    copiar(cur, 'promocion', ['id_promocion', 'nombre_promocion', 'estado', 'descuento', 'fecha_inicio', 'fecha_fin'], promociones)
+    copiar(cur, 'torneo', ['id_torneo', 'nombre', 'hora_inicio', 'tipo', 'modalidad', 'reglas', 'buy_in', 'max_jugadores'], torneos)
+    copiar(cur, 'mesa', ['id_mesa', 'modalidad', 'tipo', 'reglas', 'max_jugadores', 'ciegas', 'id_torneo'], mesas)
+    conn.commit()
+    cur.close()
+    return mesas
+
+
+def generar_asientos(conn, plan, mesas):
+    """usuario_mesa y usuario_torneo. Devuelve [(id_mesa, modalidad, sentados)] para los workers de manos"""
+    rng = rng_bloque(plan['semilla'], 'asientos', 0)
+    u0, t0 = plan['base']['usuario'], plan['base']['torneo']
+    mesas_info, asientos = [], []
+    for id_mesa, modalidad, _tipo, _reglas, max_jugadores, _ciegas, _torneo in mesas:
+        cupo = min(max_jugadores, plan['usuarios'])
+        sentados = sorted({u0 + usuario_sesgado(rng, plan) + 1 for _ in range(cupo)})
+        while len(sentados) < min(2, plan['usuarios']):
+            sentados = sorted(set(sentados) | {u0 + rng.randrange(plan['usuarios']) + 1})
+        asientos.extend((id_usuario, id_mesa) for id_usuario in sentados)
+        if len(sentados) >= 2:
+            mesas_info.append((id_mesa, modalidad, sentados))
+
+    inscripciones = []
+    for i in range(plan['torneos']):
+        cupo = min(rng.choice([20, 50, 100]), plan['usuarios'])
+        inscripciones.extend((u0 + indice + 1, t0 + i + 1) for indice in rng.sample(range(plan['usuarios']), cupo))
+
+    cur = conn.cursor()
+    copiar(cur, 'usuario_mesa', ['id_usuario', 'id_mesa'], asientos)
+    copiar(cur, 'usuario_torneo', ['id_usuario', 'id_torneo'], inscripciones)
+    conn.commit()
+    cur.close()
+    return mesas_info
+
+
+# ====================================
+#   ORQUESTACIÓN
+# ====================================
+
+def ids_a_generar(plan):
+    """Cantidad de filas que se van a generar en cada tabla con SERIAL"""
+    return {
+        'usuario': plan['usuarios'],
+        'promocion': plan['promociones'],
+        'metodo_pago': plan['usuarios'] * plan['metodos_por_usuario'],
+        'transaccion': plan['transacciones'],
+        'torneo': plan['torneos'],
+        'mesa': plan['mesas'],
+        'mano': plan['manos'],
+        'jugada': plan['manos'] * plan['jugadas_por_mano'],
+    }
+
+
+def reservar_ids(conn, plan):
+    """Reserva en la secuencia de cada tabla con SERIAL los ids que se van a generar.
+
+    nextval toma el primer id libre y setval adelanta la secuencia hasta el final
+    del rango, así nunca retrocede y la aplicación sigue numerando después. Si otra
+    sesión toma un id entre esas dos llamadas, el COPY de ese bloque falla por PK
+    duplicada: no se pisan datos. Devuelve el id anterior al rango de cada tabla.
+    """
+    cur = conn.cursor()
+    base = {}
+    for tabla, cantidad in ids_a_generar(plan).items():
+        if cantidad <= 0:
+            base[tabla] = 0
+            continue
+        columna = IDS_SERIAL[tabla]
+        # Filas cargadas con ids explícitos pueden haber quedado por delante de la secuencia
+        cur.execute(f"""
+            SELECT GREATEST(nextval(pg_get_serial_sequence('{tabla}', '{columna}')),
+                            (SELECT COALESCE(MAX({columna}), 0) + 1 FROM {tabla}))
+        """)
+        base[tabla] = cur.fetchone()[0] - 1
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{tabla}', '{columna}'), %s)",
+                    (base[tabla] + cantidad,))
+    conn.commit()
+    cur.close()
+    return base
+
+
+def modo_replica(conn):
+    """Apaga los triggers sólo para esta sesión (session_replication_role = replica)"""
+    cur = conn.cursor()
+    cur.execute("SET session_replication_role = replica")
+    cur.close()
+    conn.commit()
+
+
+def _ejecutar(tarea):
+    funcion, args = tarea
+    return funcion(args)
+
+
+def ejecutar_en_paralelo(pool, tareas, totales):
+    """Reparte las tareas (funcion, bloque) entre los workers y muestra el avance por tabla"""
+    hechas = dict.fromkeys(totales, 0)
+    inicio = time.perf_counter()
+    for tabla, n in pool.imap_unordered(_ejecutar, tareas):
+        hechas[tabla] += n
+        segundos = max(time.perf_counter() - inicio, 1e-9)
+        avance = " | ".join(f"{t}: {hechas[t]:,}/{totales[t]:,}" for t in totales)
+        print(f"\r   {avance} ({sum(hechas.values()) / segundos:,.0f} filas/s)", end="", flush=True)
+    print()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos masivos en PostgreSQL con COPY.")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplica todos los volúmenes base (1 = 1 millón de manos)")
+    for nombre, valor in BASE.items():
+        parser.add_argument(f"--{nombre}", type=int, default=None, help=f"Cantidad de {nombre} (base {valor:,} por escala)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--lote", type=int, default=50_000, help="Filas por bloque de COPY (y por commit)")
+    parser.add_argument("--dias", type=int, default=365, help="Las fechas caen en los últimos N días")
+    parser.add_argument("--hasta", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="Fecha final del rango (YYYY-MM-DD); fijarla para que la salida sea reproducible")
+    parser.add_argument("--sesgo", type=float, default=2.0,
+                        help="Concentración de actividad en pocos usuarios (1 = uniforme)")
+    parser.add_argument("--bote-media", type=float, default=300.0)
+    parser.add_argument("--bote-sigma", type=float, default=1.0)
+    parser.add_argument("--proporcion-depositos", type=float, default=0.7)
+    parser.add_argument("--metodos-por-usuario", type=int, default=2)
+    parser.add_argument("--jugadas-por-mano", type=int, default=2)
+    parser.add_argument("--con-triggers", action="store_true",
+                        help="No apagar los triggers (mucho más lento, pero llena la outbox CDC)")
+    return parser.parse_args(argv)
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+
+    plan = {nombre: getattr(args, nombre) if getattr(args, nombre) is not None else int(valor * args.escala)
+            for nombre, valor in BASE.items()}
+    plan['usuarios'] = max(plan['usuarios'], 2)
+    plan['mesas'] = max(plan['mesas'], 1)
+    plan.update(
+        semilla=args.semilla,
+        dias=max(args.dias, 1),
+        hasta=datetime.datetime.combine(args.hasta, datetime.time(23, 59, 59)),
+        sesgo=max(args.sesgo, 1.0),
+        bote_media=args.bote_media,
+        bote_sigma=args.bote_sigma,
+        proporcion_depositos=args.proporcion_depositos,
+        metodos_por_usuario=max(args.metodos_por_usuario, 1),
+        jugadas_por_mano=max(args.jugadas_por_mano, 0),
+        con_triggers=args.con_triggers,
+    )
+
+    try:
+        conn = connect()
+    except Exception as e:
+        print(f"❌ No se pudo conectar: {e}")
+        sys.exit(1)
+
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('public.mano')")
+    existe = cur.fetchone()[0] is not None
+    cur.close()
+    conn.commit()
+    if not existe:
+        crear_tablas_postgres(conn)
+
+    if not plan['con_triggers']:
+        try:
+            modo_replica(conn)
+        except psycopg2.Error as e:
+            print(f"❌ No se pudo apagar los triggers de la sesión ({e.pgerror or e}).")
+            print("   Hace falta permiso para session_replication_role; si no, usar --con-triggers.")
+            conn.close()
+            sys.exit(1)
+
+    plan['base'] = reservar_ids(conn, plan)
+    print("➡️  Generando: " + ", ".join(f"{plan[n]:,} {n}" for n in BASE) + f" (semilla {plan['semilla']}, {args.workers} workers)")
+    inicio = time.perf_counter()
+
+    print("   catálogos (promocion, torneo, mesa)...")
+    mesas = generar_catalogos(conn, plan)
+
+    with Pool(args.workers, initializer=_iniciar_worker, initargs=(plan,)) as pool:
+        ejecutar_en_paralelo(pool, [(_bloque_usuarios, b) for b in bloques(plan['usuarios'], args.lote)],
+                             {'usuario': plan['usuarios']})
+
+    print("   asientos (usuario_mesa, usuario_torneo)...")
+    plan['mesas_info'] = generar_asientos(conn, plan, mesas)
+
+    # Transacciones y manos sólo dependen de lo anterior: sus bloques se intercalan en el mismo pool
+    tareas = [(_bloque_transacciones, b) for b in bloques(plan['transacciones'], args.lote)]
+    tareas += [(_bloque_manos, b) for b in bloques(plan['manos'], args.lote)]
+    with Pool(args.workers, initializer=_iniciar_worker, initargs=(plan,)) as pool:
+        ejecutar_en_paralelo(pool, tareas, {'transaccion': plan['transacciones'], 'mano': plan['manos']})
+
+    print("   usuario_resumen y ANALYZE...")
+    if not plan['con_triggers']:
+        recalcular_resumen_usuarios(conn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("ANALYZE")
+    cur.close()
+    conn.close()
+
+    print(f"✅ Datos generados en {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
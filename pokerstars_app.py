@@ -1,33 +1,289 @@
 import os
-import psycopg2
-from pymongo import MongoClient
-import redis
-from neo4j import GraphDatabase
-from astrapy import DataAPIClient
 from dotenv import load_dotenv
+import argparse
+import csv
 import datetime
+import functools
+import hashlib
+import importlib
+import itertools
+import json
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===================================
+#   CARGA DIFERIDA DE DRIVERS
+# ===================================
+
+# Segundos que tardó en importarse cada driver (sólo los que ya se usaron)
+TIEMPOS_DRIVERS = {}
+_lock_drivers = threading.Lock()
+
+class DriverDiferido:
+    """Módulo de un driver que se importa recién cuando se toca uno de sus atributos.
+
+    Importar los cinco drivers cuesta más que muchas ejecuciones cortas (un
+    sync por cron, un caso suelto), así que cada uno se carga la primera vez
+    que su backend se usa de verdad.
+    """
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+
+    def cargar(self):
+        if self._modulo is None:
+            with _lock_drivers:
+                if self._modulo is None:
+                    inicio = time.perf_counter()
+                    modulo = importlib.import_module(self._nombre)
+                    TIEMPOS_DRIVERS[self._nombre] = time.perf_counter() - inicio
+                    self._modulo = modulo
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self._modulo is not None else "sin cargar"
+        return f"<driver {self._nombre} ({estado})>"
+
+psycopg2 = DriverDiferido('psycopg2')
+psycopg2_extras = DriverDiferido('psycopg2.extras')
+pymongo = DriverDiferido('pymongo')
+redis = DriverDiferido('redis')
+neo4j = DriverDiferido('neo4j')
+astrapy = DriverDiferido('astrapy')
+astrapy_exceptions = DriverDiferido('astrapy.exceptions')
+DRIVERS = (psycopg2, psycopg2_extras, pymongo, redis, neo4j, astrapy, astrapy_exceptions)
+
+def cargar_drivers():
+    """Importa todos los drivers ya (lo que hacía antes el arranque)"""
+    for driver in DRIVERS:
+        driver.cargar()
+
+def _tiempos_importtime(codigo):
+    """Corre `codigo` en un intérprete nuevo con -X importtime.
+
+    Devuelve (segundos totales, {paquete de primer nivel: segundos}) con el
+    tiempo acumulado de pokerstars_app y de lo que el código importe después.
+    importtime lista cada módulo después de sus dependencias, así que los
+    imports directos de pokerstars_app aparecen antes de su propia línea.
+    """
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                            cwd=directorio, capture_output=True, text=True, check=True).stderr
+    total, hijos, por_paquete = 0.0, {}, {}
+    for linea in salida.splitlines():
+        partes = linea.split('|')
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue
+        nombre = partes[2].rstrip()
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        paquete = nombre.strip().split('.')[0]
+        segundos = int(partes[1]) / 1e6
+        if paquete == 'pokerstars_app':
+            total += segundos
+            por_paquete = dict(hijos)
+        elif profundidad == 1:
+            hijos[paquete] = hijos.get(paquete, 0) + segundos
+        elif profundidad == 0 and total:
+            total += segundos
+            por_paquete[paquete] = por_paquete.get(paquete, 0) + segundos
+    return total, por_paquete
+
+def medir_arranque(repeticiones=3):
+    """Resumen estilo -X importtime: arranque con carga diferida vs. con todos los drivers"""
+    print("\n--- Tiempo de arranque (import de pokerstars_app) ---")
+    casos = {
+        'diferido': "import pokerstars_app",
+        'todos los drivers': "import pokerstars_app; pokerstars_app.cargar_drivers()",
+    }
+    resultados = {}
+    for nombre, codigo in casos.items():
+        # Nos quedamos con la mejor corrida: la primera suele pagar caché de disco fría
+        resultados[nombre] = min((_tiempos_importtime(codigo) for _ in range(repeticiones)),
+                                 key=lambda r: r[0])
+    for nombre, (total, por_paquete) in resultados.items():
+        print(f"\n⏱️  {nombre}: {total * 1000:.1f} ms")
+        for paquete, segundos in sorted(por_paquete.items(), key=lambda x: -x[1])[:8]:
+            print(f"   {paquete:<20} {segundos * 1000:8.1f} ms")
+    ahorro = resultados['todos los drivers'][0] - resultados['diferido'][0]
+    print(f"\n✔️  La carga diferida ahorra {ahorro * 1000:.1f} ms por ejecución que no usa ningún backend.")
+    return resultados
 
 # ===================================
 #   CONEXIONES A LAS BASES DE DATOS
 # ===================================
 
-def get_postgres():
+# Segundos máximos para conectar a cada backend (<BACKEND>_CONEXION_TIMEOUT pisa el general)
+CONEXION_TIMEOUT = float(os.getenv("CONEXION_TIMEOUT", "10"))
+TIMEOUTS_CONEXION = {
+    backend: float(os.getenv(f"{backend.upper()}_CONEXION_TIMEOUT", CONEXION_TIMEOUT))
+    for backend in ('postgres', 'mongo', 'redis', 'neo4j', 'astra')
+}
+
+def get_postgres(avisar=True):
     try:
         db_url = os.getenv("DATABASE_PUBLIC_URL")
         if not db_url:
             raise ValueError("No se encontró DATABASE_PUBLIC_URL ni DATABASE_URL en .env")
-        conn = psycopg2.connect(db_url)
-        print("✔️  Conexión a PostgreSQL (Railway) exitosa.")
+        # libpq sólo acepta segundos enteros (y como mínimo 2)
+        conn = psycopg2.connect(db_url, connect_timeout=max(2, int(TIMEOUTS_CONEXION['postgres'] + 0.5)))
+        if avisar:
+            print("✔️  Conexión a PostgreSQL (Railway) exitosa.")
         return conn
     except Exception as e:
         print(f"❌ ERROR PostgreSQL: {e}")
         return None
 
+# Tamaño del pool de PostgreSQL y segundos de espera máxima por una conexión libre
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+# Una conexión ociosa más de estos segundos se verifica con SELECT 1 antes de prestarla
+PG_POOL_CHEQUEO = float(os.getenv("PG_POOL_CHEQUEO", "30"))
+
+class PoolPostgres:
+    """Pool de conexiones a PostgreSQL construido sobre get_postgres().
+
+    Cada operación toma prestada su propia conexión con `conexion()` y la
+    devuelve al salir, así varias escrituras y extracciones pueden correr a la
+    vez y un error sólo revierte la transacción de quien lo tuvo. Las
+    conexiones caídas se descartan y se reemplazan por una nueva.
+    """
+
+    def __init__(self, minimo=PG_POOL_MIN, maximo=PG_POOL_MAX):
+        self.maximo = maximo
+        self._libres = queue.LifoQueue()  # (conexión, momento en que se devolvió)
+        self._cupos = threading.BoundedSemaphore(maximo)
+        for i in range(minimo):
+            conn = get_postgres(avisar=i == 0)
+            if conn is None:
+                break
+            self._libres.put((conn, time.monotonic()))
+
+    def disponible(self):
+        """True si se puede obtener una conexión sana (chequeo de salud del pool)"""
+        try:
+            with self.conexion() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _sana(self, conn, devuelta_en):
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta_en < PG_POOL_CHEQUEO:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _tomar(self, timeout):
+        if not self._cupos.acquire(timeout=timeout):
+            raise TimeoutError(f"No hubo una conexión libre a PostgreSQL en {timeout:g}s")
+        try:
+            while True:
+                try:
+                    conn, devuelta_en = self._libres.get_nowait()
+                except queue.Empty:
+                    break
+                if self._sana(conn, devuelta_en):
+                    return conn
+                print("⚠️ Conexión a PostgreSQL caída; se reconecta.")
+                self._descartar(conn)
+            conn = get_postgres(avisar=False)
+            if conn is None:
+                raise psycopg2.OperationalError("No se pudo abrir una conexión a PostgreSQL")
+            return conn
+        except BaseException:
+            self._cupos.release()
+            raise
+
+    def _devolver(self, conn, rota):
+        try:
+            if rota or conn.closed:
+                self._descartar(conn)
+                return
+            # Nunca devolver una transacción abierta: lo no confirmado se descarta
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._libres.put((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._descartar(conn)
+        finally:
+            self._cupos.release()
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def conexion(self, timeout=PG_POOL_TIMEOUT):
+        """Presta una conexión del pool; al salir se devuelve (con rollback si quedó algo sin confirmar)"""
+        conn = self._tomar(timeout)
+        rota = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Se perdió la conexión: no vuelve al pool
+            rota = True
+            raise
+        finally:
+            self._devolver(conn, rota)
+
+    def cerrar(self):
+        while True:
+            try:
+                conn, _ = self._libres.get_nowait()
+            except queue.Empty:
+                return
+            self._descartar(conn)
+
+@contextmanager
+def _usar_conexion(pg_con):
+    """Entrega una conexión a partir de `pg_con`, que puede ser un PoolPostgres o una conexión suelta.
+
+    Con un pool la conexión se toma prestada y se devuelve al salir; con una
+    conexión suelta se usa tal cual. En ambos casos un error revierte la transacción.
+    """
+    if isinstance(pg_con, PoolPostgres):
+        with pg_con.conexion() as conn:
+            yield conn
+        return
+    try:
+        yield pg_con
+    except Exception:
+        if not pg_con.closed:
+            pg_con.rollback()
+        raise
+
 # MongoDB Atlas devuelve la base de datos 'pokerstars'
 def get_mongo_client():
     try:
         mongo_uri = os.getenv("MONGO_URI")
-        client = MongoClient(mongo_uri)
+        timeout_ms = int(TIMEOUTS_CONEXION['mongo'] * 1000)
+        client = pymongo.MongoClient(mongo_uri, serverSelectionTimeoutMS=timeout_ms, connectTimeoutMS=timeout_ms)
+        # MongoClient conecta en segundo plano: el ping confirma que el servidor responde
+        client.admin.command('ping')
         db = client['pokerstars'] # Selecciona tu base de datos
         print("✔️  Conexión a MongoDB (Atlas) exitosa.")
         return db
@@ -41,7 +297,8 @@ def get_redis():
             host=os.getenv("REDIS_HOST"),
             port=int(os.getenv("REDIS_PORT")),
             password=os.getenv("REDIS_PASSWORD"),
-            decode_responses=True # Para que devuelva strings
+            decode_responses=True, # Para que devuelva strings
+            socket_connect_timeout=TIMEOUTS_CONEXION['redis']
         )
         r.ping()
         print("✔️  Conexión a Redis (Cloud) exitosa.")
@@ -55,7 +312,7 @@ def get_neo4j_driver():
         uri = os.getenv("NEO4J_URI")
         user = os.getenv("NEO4J_USERNAME")
         password = os.getenv("NEO4J_PASSWORD")
-        driver = GraphDatabase.driver(uri, auth=(user, password))
+        driver = neo4j.GraphDatabase.driver(uri, auth=(user, password), connection_timeout=TIMEOUTS_CONEXION['neo4j'])
         driver.verify_connectivity()
         print("✔️  Conexión a Neo4j (Aura) exitosa.")
         return driver
@@ -73,11 +330,11 @@ def get_cassandra_session():
             raise ValueError("Faltan credenciales de Astra DB en .env")
         
         # Inicializar el cliente de Astra DB
-        client = DataAPIClient(token)
+        client = astrapy.DataAPIClient(token)
         db = client.get_database_by_api_endpoint(api_endpoint)
         
         # Verificar conectividad
-        db.list_collection_names()
+        db.list_collection_names(timeout_ms=int(TIMEOUTS_CONEXION['astra'] * 1000))
         
         print("✔️  Conexión a Cassandra (Astra) exitosa.")
         return db
@@ -86,6 +343,110 @@ def get_cassandra_session():
         print(f"❌ ERROR Cassandra: {e}")
         return None
 
+# Segundos que un backend caído se da por caído antes de volver a intentar conectarlo
+CONEXION_REINTENTO = float(os.getenv("CONEXION_REINTENTO", "30"))
+# Conectar todos los backends al arrancar (en paralelo) en vez de esperar al primer uso
+CONEXIONES_CALENTAR = os.getenv("CONEXIONES_CALENTAR", "1") == "1"
+
+class Conexiones:
+    """Handles de PostgreSQL, MongoDB, Redis, Neo4j y Astra, creados al primer uso.
+
+    Cada backend se conecta una sola vez aunque lo pidan varios hilos a la vez,
+    con su propio timeout (TIMEOUTS_CONEXION). Un backend caído devuelve None
+    y no se vuelve a intentar hasta pasados CONEXION_REINTENTO segundos, así una
+    sesión que sólo usa PostgreSQL no espera por Neo4j. Al conectar cada uno se
+    prepara como lo necesita la aplicación (migración, índices, caché).
+    """
+
+    BACKENDS = ('postgres', 'mongo', 'redis', 'neo4j', 'astra')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hilos = ThreadPoolExecutor(max_workers=len(self.BACKENDS), thread_name_prefix="conexion")
+        self._futuros = {}
+        self._fallos = {}
+
+    def _abrir(self, nombre):
+        try:
+            if nombre == 'postgres':
+                handle = PoolPostgres()
+                if not handle.disponible():
+                    handle.cerrar()
+                    handle = None
+                else:
+                    # Columnas/triggers que necesita el ETL incremental (no hace nada si ya existen)
+                    migrar_esquema_postgres(handle)
+            elif nombre == 'mongo':
+                handle = get_mongo_client()
+                if handle is not None:
+                    asegurar_indices_mongo(handle)
+            elif nombre == 'redis':
+                handle = get_redis()
+                if handle is not None:
+                    activar_cache_resultados(handle)
+            elif nombre == 'neo4j':
+                handle = get_neo4j_driver()
+            else:
+                handle = get_cassandra_session()
+        except Exception as e:
+            print(f"❌ ERROR {nombre}: {e}")
+            handle = None
+        if handle is None:
+            self._fallos[nombre] = time.monotonic()
+        return handle
+
+    def _futuro(self, nombre):
+        with self._lock:
+            futuro = self._futuros.get(nombre)
+            reintentar = (futuro is not None and futuro.done() and futuro.result() is None
+                          and time.monotonic() - self._fallos.get(nombre, 0) >= CONEXION_REINTENTO)
+            if futuro is None or reintentar:
+                futuro = self._hilos.submit(self._abrir, nombre)
+                self._futuros[nombre] = futuro
+            return futuro
+
+    def obtener(self, nombre):
+        """Handle de `nombre` (conectando si hace falta) o None si no está disponible"""
+        return self._futuro(nombre).result()
+
+    def calentar(self, nombres=BACKENDS, timeout=None):
+        """Conecta `nombres` en paralelo y espera como mucho `timeout` segundos.
+
+        Por defecto espera el mayor timeout de conexión de esos backends: el
+        arranque tarda lo que el más lento, no la suma. Los que no terminan a
+        tiempo siguen conectando en segundo plano. Devuelve {nombre: True/False/None},
+        con None para los que todavía están conectando.
+        """
+        futuros = {nombre: self._futuro(nombre) for nombre in nombres}
+        if timeout is None:
+            timeout = max(TIMEOUTS_CONEXION[nombre] for nombre in nombres)
+        wait(futuros.values(), timeout=timeout)
+        return {nombre: (futuro.result() is not None) if futuro.done() else None
+                for nombre, futuro in futuros.items()}
+
+    postgres = property(lambda self: self.obtener('postgres'))
+    mongo = property(lambda self: self.obtener('mongo'))
+    redis = property(lambda self: self.obtener('redis'))
+    neo4j = property(lambda self: self.obtener('neo4j'))
+    astra = property(lambda self: self.obtener('astra'))
+
+    def cerrar(self):
+        """Cierra los handles abiertos (Astra es HTTP y no necesita cierre)"""
+        for nombre, futuro in list(self._futuros.items()):
+            if not futuro.done() or futuro.result() is None:
+                continue
+            handle = futuro.result()
+            try:
+                if nombre == 'postgres':
+                    handle.cerrar()
+                elif nombre == 'mongo':
+                    handle.client.close()
+                elif nombre in ('redis', 'neo4j'):
+                    handle.close()
+            except Exception as e:
+                print(f"⚠️ Error al cerrar {nombre}: {e}")
+        self._hilos.shutdown(wait=False)
+
 def ask(text):
     return input(text + ": ").strip()
 
@@ -93,7 +454,7 @@ def ask(text):
 #    LÓGICA DE POSTGRESQL (Master DB)
 # ======================================
 
-def crear_tablas_postgres(conn):
+def crear_tablas_postgres(pg_con):
     SQL_SCHEMA = """
     CREATE TABLE usuario (
         id_usuario SERIAL PRIMARY KEY,
@@ -137,7 +498,8 @@ def crear_tablas_postgres(conn):
         monto NUMERIC(12,2) NOT NULL,
         estado VARCHAR(20),
         cumplimiento_aml BOOLEAN DEFAULT FALSE,
-        tipo VARCHAR(50)
+        tipo VARCHAR(50),
+        xid_escritura xid8 NOT NULL DEFAULT pg_current_xact_id()
     );
 
     CREATE TABLE torneo (
@@ -180,7 +542,8 @@ def crear_tablas_postgres(conn):
         bote_total NUMERIC(12,2),
         fecha_hora TIMESTAMP DEFAULT NOW(),
         ganador_id INT REFERENCES usuario(id_usuario),
-        modalidad VARCHAR(50)
+        modalidad VARCHAR(50),
+        xid_escritura xid8 NOT NULL DEFAULT pg_current_xact_id()
     );
 
     CREATE TABLE usuario_mano (
@@ -200,17 +563,421 @@ def crear_tablas_postgres(conn):
 """
 
     try:
-        cur = conn.cursor()
-        cur.execute(SQL_SCHEMA)
-        conn.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_SCHEMA)
+            conn.commit()
+            cur.close()
         print("===================================")
         print("✔️ Tablas de PostgreSQL creadas.")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear tablas: {e}")
-        conn.rollback()
+        return
+
+    migrar_esquema_postgres(pg_con)
+
+# Cálculo completo de usuario_resumen desde las tablas crudas: carga inicial en la
+# migración y recálculo después de una carga masiva con los triggers apagados
+SQL_CALCULAR_RESUMEN = """
+    INSERT INTO usuario_resumen (id_usuario, balance_neto, ganancias_mesas, manos_ganadas, manos_jugadas)
+    SELECT u.id_usuario,
+           COALESCE(t.balance_neto, 0), COALESCE(g.ganancias_mesas, 0),
+           COALESCE(g.manos_ganadas, 0), COALESCE(j.manos_jugadas, 0)
+    FROM usuario u
+    LEFT JOIN (
+        SELECT id_usuario,
+               SUM(CASE WHEN tipo = 'deposito' THEN monto WHEN tipo = 'retiro' THEN -monto ELSE 0 END) as balance_neto
+        FROM transaccion
+        WHERE estado = 'completada'
+        GROUP BY id_usuario
+    ) t ON t.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT ganador_id as id_usuario, COUNT(*) as manos_ganadas,
+               COALESCE(SUM(bote_total - rake), 0) as ganancias_mesas
+        FROM mano
+        WHERE ganador_id IS NOT NULL
+        GROUP BY ganador_id
+    ) g ON g.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT id_usuario, COUNT(*) as manos_jugadas
+        FROM usuario_mano
+        GROUP BY id_usuario
+    ) j ON j.id_usuario = u.id_usuario;
+"""
+
+def recalcular_resumen_usuarios(pg_con):
+    """Reconstruye usuario_resumen desde cero (p.ej. después de generar_datos.py)"""
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        # Sin escrituras concurrentes mientras se recalcula: los triggers no se perderían nada
+        cur.execute("LOCK TABLE transaccion, mano, usuario_mano IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("TRUNCATE usuario_resumen")
+        cur.execute(SQL_CALCULAR_RESUMEN)
+        conn.commit()
+        cur.close()
+
+# Versión del esquema que deja migrar_esquema_postgres: subirla cada vez que cambie
+# SQL_MIGRACION o INDICES_POSTGRES. La base la guarda en esquema_version.
+VERSION_ESQUEMA_PG = 8
+# Clave del advisory lock que serializa la migración entre procesos
+LOCK_MIGRACION_PG = 7340121
+
+# Índices de los predicados y joins calientes (se comprueban con verificar_indices_postgres).
+# usuario_mano ya tiene su PK (id_usuario, id_mano), que sirve para buscar por id_usuario.
+# Se crean con CREATE INDEX CONCURRENTLY, fuera de la transacción de la migración,
+# así las escrituras siguen mientras se construyen.
+INDICES_POSTGRES = {
+    'idx_mano_xid_escritura': "mano (xid_escritura)",
+    'idx_transaccion_xid_escritura': "transaccion (xid_escritura)",
+    'idx_mano_ganador': "mano (ganador_id) INCLUDE (bote_total, rake)",
+    'idx_mano_fecha_hora': "mano (fecha_hora)",
+    'idx_mano_id_mesa': "mano (id_mesa)",
+    'idx_transaccion_usuario_estado_tipo': "transaccion (id_usuario, estado, tipo) INCLUDE (monto)",
+    'idx_metodo_pago_id_usuario': "metodo_pago (id_usuario)",
+    'idx_usuario_mesa_id_mesa': "usuario_mesa (id_mesa)",
+    # Contador de cambios por tabla de VERSION_FUENTES
+    'idx_etl_outbox_tabla_evento': "etl_outbox (tabla, id_evento)",
+    # Retención de la outbox (ver podar_outbox): BRIN porque creado_en crece con la tabla
+    'idx_etl_outbox_creado_en': "etl_outbox USING brin (creado_en)",
+}
+
+def _version_esquema(cur):
+    """Versión registrada en esquema_version (0 si la tabla todavía no existe)"""
+    cur.execute("SELECT to_regclass('public.esquema_version')")
+    if cur.fetchone()[0] is None:
+        return 0
+    cur.execute("SELECT version FROM esquema_version")
+    fila = cur.fetchone()
+    return fila[0] if fila else 0
+
+def _crear_indices_postgres(conn):
+    """Construye con CONCURRENTLY los índices de INDICES_POSTGRES que falten.
+
+    Un CONCURRENTLY interrumpido deja el índice marcado como inválido: se
+    borra y se vuelve a construir. Necesita la conexión en autocommit.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname, i.indisvalid
+        FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = ANY(%s)
+    """, (list(INDICES_POSTGRES),))
+    existentes = dict(cur.fetchall())
+    for nombre, definicion in INDICES_POSTGRES.items():
+        if existentes.get(nombre):
+            continue
+        if nombre in existentes:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+        print(f"⏳ Creando índice {nombre}...")
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+    cur.close()
+
+def migrar_esquema_postgres(pg_con):
+    """Lleva un esquema ya existente a VERSION_ESQUEMA_PG.
+
+    Se puede ejecutar en cada arranque: si esquema_version ya está al día sólo
+    hace esa lectura, sin DDL ni locks sobre las tablas. Si no, aplica
+    SQL_MIGRACION en una transacción, construye los índices con CONCURRENTLY
+    y recién entonces registra la versión.
+    """
+    SQL_MIGRACION = """
+    CREATE TABLE IF NOT EXISTS esquema_version (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        version INT NOT NULL,
+        migrado_en TIMESTAMP DEFAULT NOW()
+    );
+
+    -- Versión de las fuentes en el último sync correcto de cada modelo de lectura
+    -- (ver _registrar_frescura): la comparten todos los procesos
+    CREATE TABLE IF NOT EXISTS etl_frescura (
+        modelo VARCHAR(40) PRIMARY KEY,
+        version TEXT NOT NULL,
+        sincronizado_en TIMESTAMP DEFAULT NOW()
+    );
+
+    -- Transacción que escribió la fila: es lo que compara el watermark del ETL
+    -- (ver _params_watermark). Con un default constante el ADD COLUMN no reescribe
+    -- la tabla; las filas previas quedan en 0 y las copia el primer sync completo.
+    ALTER TABLE mano ADD COLUMN IF NOT EXISTS xid_escritura xid8 NOT NULL DEFAULT '0';
+    ALTER TABLE mano ALTER COLUMN xid_escritura SET DEFAULT pg_current_xact_id();
+    ALTER TABLE transaccion ADD COLUMN IF NOT EXISTS xid_escritura xid8 NOT NULL DEFAULT '0';
+    ALTER TABLE transaccion ALTER COLUMN xid_escritura SET DEFAULT pg_current_xact_id();
+
+    CREATE OR REPLACE FUNCTION marcar_xid_escritura() RETURNS trigger AS $$
+    BEGIN
+        NEW.xid_escritura = pg_current_xact_id();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS mano_xid_escritura ON mano;
+    CREATE TRIGGER mano_xid_escritura BEFORE UPDATE ON mano
+        FOR EACH ROW EXECUTE FUNCTION marcar_xid_escritura();
+
+    DROP TRIGGER IF EXISTS transaccion_xid_escritura ON transaccion;
+    CREATE TRIGGER transaccion_xid_escritura BEFORE UPDATE ON transaccion
+        FOR EACH ROW EXECUTE FUNCTION marcar_xid_escritura();
+
+    -- Agregados por usuario mantenidos por triggers (los lee SQL_USUARIOS): leerlos
+    -- cuesta lo mismo con 10 mil que con 10 millones de manos
+    DO $$
+    BEGIN
+        IF to_regclass('public.usuario_resumen') IS NULL THEN
+            CREATE TABLE usuario_resumen (
+                id_usuario INT PRIMARY KEY REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+                balance_neto NUMERIC(14,2) NOT NULL DEFAULT 0,
+                ganancias_mesas NUMERIC(14,2) NOT NULL DEFAULT 0,
+                manos_ganadas INT NOT NULL DEFAULT 0,
+                manos_jugadas INT NOT NULL DEFAULT 0
+            );
+            -- Nadie escribe entre el cálculo inicial y la creación de los triggers (misma transacción)
+            LOCK TABLE transaccion, mano, usuario_mano IN SHARE ROW EXCLUSIVE MODE;
+""" + SQL_CALCULAR_RESUMEN + """
+        END IF;
+    END
+    $$;
+
+    -- Suma a usuario_resumen los aportes de toda una sentencia: un solo upsert por
+    -- usuario y en orden de id_usuario, así dos cargas que tocan los mismos
+    -- usuarios toman los locks en el mismo orden y no se trancan entre sí
+    CREATE OR REPLACE FUNCTION sumar_resumen_lote(p_usuarios INT[], p_balance NUMERIC[], p_ganancias NUMERIC[], p_ganadas INT[], p_jugadas INT[])
+    RETURNS void AS $$
+        INSERT INTO usuario_resumen AS r (id_usuario, balance_neto, ganancias_mesas, manos_ganadas, manos_jugadas)
+        SELECT id_usuario, sum(balance), sum(ganancias), sum(ganadas), sum(jugadas)
+        FROM unnest(p_usuarios, p_balance, p_ganancias, p_ganadas, p_jugadas) AS a(id_usuario, balance, ganancias, ganadas, jugadas)
+        WHERE id_usuario IS NOT NULL
+        GROUP BY id_usuario
+        HAVING sum(balance) <> 0 OR sum(ganancias) <> 0 OR sum(ganadas) <> 0 OR sum(jugadas) <> 0
+        ORDER BY id_usuario
+        ON CONFLICT (id_usuario) DO UPDATE SET
+            balance_neto = r.balance_neto + EXCLUDED.balance_neto,
+            ganancias_mesas = r.ganancias_mesas + EXCLUDED.ganancias_mesas,
+            manos_ganadas = r.manos_ganadas + EXCLUDED.manos_ganadas,
+            manos_jugadas = r.manos_jugadas + EXCLUDED.manos_jugadas;
+    $$ LANGUAGE sql;
+    DROP FUNCTION IF EXISTS sumar_resumen(INT, NUMERIC, NUMERIC, INT, INT);
+
+    CREATE OR REPLACE FUNCTION aporte_balance(estado VARCHAR, tipo VARCHAR, monto NUMERIC) RETURNS NUMERIC AS $$
+        SELECT CASE WHEN estado <> 'completada' THEN 0
+                    WHEN tipo = 'deposito' THEN monto
+                    WHEN tipo = 'retiro' THEN -monto
+                    ELSE 0 END;
+    $$ LANGUAGE sql IMMUTABLE;
+
+    -- Triggers por sentencia con tablas de transición: cada uno suma el aporte de las
+    -- filas nuevas y resta el de las viejas. Postgres no admite tablas de transición en
+    -- un trigger de varios eventos, por eso hay uno por evento y la función mira TG_OP.
+    CREATE OR REPLACE FUNCTION resumen_transaccion() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(balance), array_agg(0), array_agg(0), array_agg(0))
+            FROM (SELECT id_usuario, aporte_balance(estado, tipo, monto) AS balance FROM nuevas) a;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(balance), array_agg(0), array_agg(0), array_agg(0))
+            FROM (SELECT id_usuario, -aporte_balance(estado, tipo, monto) AS balance FROM viejas) a;
+        ELSE
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(balance), array_agg(0), array_agg(0), array_agg(0))
+            FROM (SELECT id_usuario, aporte_balance(estado, tipo, monto) AS balance FROM nuevas
+                  UNION ALL
+                  SELECT id_usuario, -aporte_balance(estado, tipo, monto) FROM viejas) a;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION resumen_mano() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM sumar_resumen_lote(array_agg(ganador_id), array_agg(0), array_agg(ganancias), array_agg(ganadas), array_agg(0))
+            FROM (SELECT ganador_id, COALESCE(bote_total - rake, 0) AS ganancias, 1 AS ganadas
+                  FROM nuevas WHERE ganador_id IS NOT NULL) a;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM sumar_resumen_lote(array_agg(ganador_id), array_agg(0), array_agg(ganancias), array_agg(ganadas), array_agg(0))
+            FROM (SELECT ganador_id, -COALESCE(bote_total - rake, 0) AS ganancias, -1 AS ganadas
+                  FROM viejas WHERE ganador_id IS NOT NULL) a;
+        ELSE
+            PERFORM sumar_resumen_lote(array_agg(ganador_id), array_agg(0), array_agg(ganancias), array_agg(ganadas), array_agg(0))
+            FROM (SELECT ganador_id, COALESCE(bote_total - rake, 0) AS ganancias, 1 AS ganadas
+                  FROM nuevas WHERE ganador_id IS NOT NULL
+                  UNION ALL
+                  SELECT ganador_id, -COALESCE(bote_total - rake, 0), -1
+                  FROM viejas WHERE ganador_id IS NOT NULL) a;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION resumen_usuario_mano() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(0), array_agg(0), array_agg(0), array_agg(1))
+            FROM nuevas;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(0), array_agg(0), array_agg(0), array_agg(-1))
+            FROM viejas;
+        ELSE
+            PERFORM sumar_resumen_lote(array_agg(id_usuario), array_agg(0), array_agg(0), array_agg(0), array_agg(jugadas))
+            FROM (SELECT id_usuario, 1 AS jugadas FROM nuevas
+                  UNION ALL
+                  SELECT id_usuario, -1 FROM viejas) a;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS transaccion_resumen ON transaccion;
+    DROP TRIGGER IF EXISTS transaccion_resumen_insert ON transaccion;
+    CREATE TRIGGER transaccion_resumen_insert AFTER INSERT ON transaccion
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_transaccion();
+    DROP TRIGGER IF EXISTS transaccion_resumen_update ON transaccion;
+    CREATE TRIGGER transaccion_resumen_update AFTER UPDATE ON transaccion
+        REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_transaccion();
+    DROP TRIGGER IF EXISTS transaccion_resumen_delete ON transaccion;
+    CREATE TRIGGER transaccion_resumen_delete AFTER DELETE ON transaccion
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_transaccion();
+
+    DROP TRIGGER IF EXISTS mano_resumen ON mano;
+    DROP TRIGGER IF EXISTS mano_resumen_insert ON mano;
+    CREATE TRIGGER mano_resumen_insert AFTER INSERT ON mano
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_mano();
+    DROP TRIGGER IF EXISTS mano_resumen_update ON mano;
+    CREATE TRIGGER mano_resumen_update AFTER UPDATE ON mano
+        REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_mano();
+    DROP TRIGGER IF EXISTS mano_resumen_delete ON mano;
+    CREATE TRIGGER mano_resumen_delete AFTER DELETE ON mano
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_mano();
+
+    DROP TRIGGER IF EXISTS usuario_mano_resumen ON usuario_mano;
+    DROP TRIGGER IF EXISTS usuario_mano_resumen_insert ON usuario_mano;
+    CREATE TRIGGER usuario_mano_resumen_insert AFTER INSERT ON usuario_mano
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_usuario_mano();
+    DROP TRIGGER IF EXISTS usuario_mano_resumen_update ON usuario_mano;
+    CREATE TRIGGER usuario_mano_resumen_update AFTER UPDATE ON usuario_mano
+        REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_usuario_mano();
+    DROP TRIGGER IF EXISTS usuario_mano_resumen_delete ON usuario_mano;
+    CREATE TRIGGER usuario_mano_resumen_delete AFTER DELETE ON usuario_mano
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION resumen_usuario_mano();
+
+    -- CDC: cada cambio deja un evento en etl_outbox y avisa por NOTIFY (ver consumir_outbox)
+    CREATE TABLE IF NOT EXISTS etl_outbox (
+        id_evento BIGSERIAL PRIMARY KEY,
+        tabla VARCHAR(30) NOT NULL,
+        operacion VARCHAR(10) NOT NULL,
+        clave JSONB NOT NULL,
+        creado_en TIMESTAMP DEFAULT NOW(),
+        xid_escritura xid8 NOT NULL DEFAULT pg_current_xact_id()
+    );
+    -- Transacción que dejó el evento (ver _purgar_outbox); como en mano, sin reescribir la tabla
+    ALTER TABLE etl_outbox ADD COLUMN IF NOT EXISTS xid_escritura xid8 NOT NULL DEFAULT '0';
+    ALTER TABLE etl_outbox ALTER COLUMN xid_escritura SET DEFAULT pg_current_xact_id();
+
+    -- Las columnas que forman la clave del evento llegan como argumentos del trigger
+    CREATE OR REPLACE FUNCTION clave_outbox(fila JSONB, columnas TEXT[]) RETURNS JSONB AS $$
+        SELECT jsonb_object_agg(c, fila -> c) FROM unnest(columnas) AS c;
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION registrar_cambio_outbox() RETURNS trigger AS $$
+    DECLARE
+        clave_nueva JSONB;
+        clave_vieja JSONB;
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            clave_nueva := clave_outbox(to_jsonb(NEW), TG_ARGV);
+            INSERT INTO etl_outbox (tabla, operacion, clave) VALUES (TG_TABLE_NAME, TG_OP, clave_nueva);
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            -- Un UPDATE que cambia la clave (p.ej. ganador_id) también afecta a la fila anterior
+            clave_vieja := clave_outbox(to_jsonb(OLD), TG_ARGV);
+            IF clave_vieja IS DISTINCT FROM clave_nueva THEN
+                INSERT INTO etl_outbox (tabla, operacion, clave) VALUES (TG_TABLE_NAME, TG_OP, clave_vieja);
+            END IF;
+        END IF;
+        -- Postgres junta los NOTIFY iguales de una transacción: un aviso por tabla y commit
+        PERFORM pg_notify('etl_outbox', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS usuario_outbox ON usuario;
+    CREATE TRIGGER usuario_outbox AFTER INSERT OR UPDATE OR DELETE ON usuario
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_usuario');
+
+    DROP TRIGGER IF EXISTS mesa_outbox ON mesa;
+    CREATE TRIGGER mesa_outbox AFTER INSERT OR UPDATE OR DELETE ON mesa
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_mesa');
+
+    DROP TRIGGER IF EXISTS transaccion_outbox ON transaccion;
+    CREATE TRIGGER transaccion_outbox AFTER INSERT OR UPDATE OR DELETE ON transaccion
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_transaccion', 'id_usuario');
+
+    DROP TRIGGER IF EXISTS mano_outbox ON mano;
+    CREATE TRIGGER mano_outbox AFTER INSERT OR UPDATE OR DELETE ON mano
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_mano', 'ganador_id');
+
+    DROP TRIGGER IF EXISTS usuario_mano_outbox ON usuario_mano;
+    CREATE TRIGGER usuario_mano_outbox AFTER INSERT OR UPDATE OR DELETE ON usuario_mano
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_usuario', 'id_mano');
+
+    DROP TRIGGER IF EXISTS usuario_mesa_outbox ON usuario_mesa;
+    CREATE TRIGGER usuario_mesa_outbox AFTER INSERT OR UPDATE OR DELETE ON usuario_mesa
+        FOR EACH ROW EXECUTE FUNCTION registrar_cambio_outbox('id_usuario', 'id_mesa');
+"""
+
+    try:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            # Base de datos recién creada: todavía no hay nada que migrar (opción 1 del menú)
+            cur.execute("SELECT to_regclass('public.mano')")
+            if cur.fetchone()[0] is None:
+                conn.rollback()
+                cur.close()
+                return False
+            # Caso de todos los arranques: el esquema ya está al día
+            if _version_esquema(cur) >= VERSION_ESQUEMA_PG:
+                conn.rollback()
+                cur.close()
+                return True
+            # Un solo proceso migra a la vez; los demás esperan y vuelven a mirar la versión
+            cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_MIGRACION_PG,))
+            conn.commit()
+            try:
+                if _version_esquema(cur) < VERSION_ESQUEMA_PG:
+                    print(f"⏳ Migrando el esquema de PostgreSQL a la versión {VERSION_ESQUEMA_PG}...")
+                    cur.execute(SQL_MIGRACION)
+                    conn.commit()
+                    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+                    conn.autocommit = True
+                    try:
+                        _crear_indices_postgres(conn)
+                    finally:
+                        conn.autocommit = False
+                    cur.execute("""
+                        INSERT INTO esquema_version (id, version) VALUES (TRUE, %s)
+                        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, migrado_en = NOW()
+                    """, (VERSION_ESQUEMA_PG,))
+                    conn.commit()
+                    print("✔️ Esquema de PostgreSQL migrado.")
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_MIGRACION_PG,))
+                    conn.commit()
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"⚠️ No se pudo migrar el esquema de PostgreSQL: {e}")
+        return False
 
 def crear_usuario(pg_con):
     print("===================================")
@@ -221,20 +988,20 @@ def crear_usuario(pg_con):
     query_pg = "INSERT INTO usuario (nombre, email, pais) VALUES (%s, %s, %s) RETURNING id_usuario, saldo_real;"
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query_pg, (nombre, email, pais))
-        id_usuario, saldo_real = cur.fetchone()
-        pg_con.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query_pg, (nombre, email, pais))
+            id_usuario, saldo_real = cur.fetchone()
+            conn.commit()
+            cur.close()
         print(f"✔️ Usuario {id_usuario} creado en PostgreSQL.")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear usuario: {e}")
         print("===================================")
-        pg_con.rollback()
 
-def crear_transaccion(pg_con):
+def crear_transaccion(pg_con, redis_con=None):
     print("========================================================")
     id_usuario = int(ask("ID Usuario"))
     id_metodo = int(ask("ID Método de pago")) # Asumimos que ya existe
@@ -247,22 +1014,30 @@ def crear_transaccion(pg_con):
     """
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query_pg, (id_usuario, id_metodo, monto, tipo))
-        id_transaccion = cur.fetchone()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query_pg, (id_usuario, id_metodo, monto, tipo))
+            id_transaccion = cur.fetchone()
         
-        # Actualizar saldo en Postgres
-        op = "+" if tipo == "deposito" else "-"
-        cur.execute(f"UPDATE usuario SET saldo_real = saldo_real {op} %s WHERE id_usuario = %s RETURNING saldo_real;", (monto, id_usuario))
-        pg_con.commit()
-        cur.close()
+            # Actualizar saldo en Postgres
+            op = "+" if tipo == "deposito" else "-"
+            cur.execute(f"UPDATE usuario SET saldo_real = saldo_real {op} %s WHERE id_usuario = %s RETURNING saldo_real;", (monto, id_usuario))
+            conn.commit()
+            cur.close()
         print(f"✔️  Transacción creada en PostgreSQL.")
-        print("========================================================")
         
     except Exception as e:
         print(f"❌ Error al crear transacción: {e}")
         print("========================================================")
-        pg_con.rollback()
+        return
+    
+    # Recién con el saldo confirmado se invalida la caché (caso 8)
+    if redis_con is not None:
+        try:
+            invalidar_balances(redis_con, [id_usuario])
+        except Exception as e:
+            print(f"⚠️ No se pudo invalidar el balance en caché de {id_usuario}: {e}")
+    print("========================================================")
 
 def registrar_jugador_en_mesa(pg_con):
     print("==================================================================")
@@ -272,17 +1047,17 @@ def registrar_jugador_en_mesa(pg_con):
     query_pg = "INSERT INTO usuario_mesa (id_usuario, id_mesa) VALUES (%s, %s);"
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query_pg, (id_usuario, id_mesa))
-        pg_con.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query_pg, (id_usuario, id_mesa))
+            conn.commit()
+            cur.close()
         print(f"✔️ Usuario {id_usuario} sentado en mesa {id_mesa} en PostgreSQL.")
         print("==================================================================")
 
     except Exception as e:
         print(f"❌ Error al sentar jugador: {e}")
         print("==================================================================")
-        pg_con.rollback()
 
 def crear_torneo(pg_con):
     """Crear un nuevo torneo"""
@@ -301,18 +1076,18 @@ def crear_torneo(pg_con):
     """
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query, (nombre, tipo, modalidad, buy_in, max_jugadores))
-        id_torneo = cur.fetchone()[0]
-        pg_con.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query, (nombre, tipo, modalidad, buy_in, max_jugadores))
+            id_torneo = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
         print(f"✔️ Torneo {id_torneo} '{nombre}' creado en PostgreSQL.")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear torneo: {e}")
         print("===================================")
-        pg_con.rollback()
 
 def crear_mesa(pg_con):
     """Crear una nueva mesa de poker"""
@@ -334,18 +1109,18 @@ def crear_mesa(pg_con):
     """
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query, (modalidad, tipo, max_jugadores, ciegas, id_torneo))
-        id_mesa = cur.fetchone()[0]
-        pg_con.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query, (modalidad, tipo, max_jugadores, ciegas, id_torneo))
+            id_mesa = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
         print(f"✔️ Mesa {id_mesa} ({modalidad} - {tipo}) creada en PostgreSQL.")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear mesa: {e}")
         print("===================================")
-        pg_con.rollback()
 
 def crear_metodo_pago(pg_con):
     """Crear un método de pago para un usuario"""
@@ -366,20 +1141,20 @@ def crear_metodo_pago(pg_con):
     """
     
     try:
-        cur = pg_con.cursor()
-        cur.execute(query, (id_usuario, tipo, datos_encriptados))
-        id_metodo = cur.fetchone()[0]
-        pg_con.commit()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(query, (id_usuario, tipo, datos_encriptados))
+            id_metodo = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
         print(f"✔️ Método de pago {id_metodo} ({tipo}) creado para usuario {id_usuario}.")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear método de pago: {e}")
         print("===================================")
-        pg_con.rollback()
 
-def crear_mano(pg_con):
+def crear_mano(pg_con, redis_con=None):
     """Crear una mano de poker con datos aleatorios"""
     import random
     
@@ -389,26 +1164,29 @@ def crear_mano(pg_con):
     
     # Verificar que la mesa existe y obtener su modalidad
     try:
-        cur = pg_con.cursor()
-        cur.execute("SELECT modalidad, tipo FROM mesa WHERE id_mesa = %s", (id_mesa,))
-        mesa_info = cur.fetchone()
-        
-        if not mesa_info:
-            print(f"❌ La mesa {id_mesa} no existe.")
+        # La conexión se devuelve al pool antes de las preguntas interactivas
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT modalidad, tipo FROM mesa WHERE id_mesa = %s", (id_mesa,))
+            mesa_info = cur.fetchone()
+            
+            if not mesa_info:
+                print(f"❌ La mesa {id_mesa} no existe.")
+                cur.close()
+                return
+            
+            modalidad, tipo_mesa = mesa_info
+            
+            # Obtener usuarios sentados en esta mesa
+            cur.execute("""
+                SELECT id_usuario FROM usuario_mesa WHERE id_mesa = %s
+            """, (id_mesa,))
+            usuarios_en_mesa = [row[0] for row in cur.fetchall()]
+            conn.commit()
             cur.close()
-            return
-        
-        modalidad, tipo_mesa = mesa_info
-        
-        # Obtener usuarios sentados en esta mesa
-        cur.execute("""
-            SELECT id_usuario FROM usuario_mesa WHERE id_mesa = %s
-        """, (id_mesa,))
-        usuarios_en_mesa = [row[0] for row in cur.fetchall()]
         
         if len(usuarios_en_mesa) < 2:
             print(f"⚠️ La mesa {id_mesa} tiene menos de 2 jugadores. Agrega jugadores primero.")
-            cur.close()
             return
         
         # Generar datos aleatorios
@@ -434,52 +1212,527 @@ def crear_mano(pg_con):
         else:
             fecha_hora = None  # Usará NOW()
         
-        query = """
-            INSERT INTO mano (id_mesa, rake, bote_total, fecha_hora, ganador_id, modalidad)
-            VALUES (%s, %s, %s, COALESCE(%s::timestamp, NOW()), %s, %s)
-            RETURNING id_mano, fecha_hora;
-        """
-        
-        cur.execute(query, (id_mesa, rake, bote_total, fecha_hora, ganador_id, modalidad))
-        id_mano, fecha_final = cur.fetchone()
-        
-        # Insertar relación usuario-mano para todos los participantes
-        for usuario in usuarios_en_mesa:
-            cur.execute("""
-                INSERT INTO usuario_mano (id_usuario, id_mano) VALUES (%s, %s)
-            """, (usuario, id_mano))
-        
-        pg_con.commit()
-        cur.close()
+        # Mano y participantes en una sola transacción (ver ingestar_manos)
+        fechas = {}
+        id_mano, = ingestar_manos(pg_con, [{
+            'id_mesa': id_mesa,
+            'rake': rake,
+            'bote_total': bote_total,
+            'fecha_hora': fecha_hora,
+            'ganador_id': ganador_id,
+            'modalidad': modalidad,
+            'participantes': usuarios_en_mesa,
+        }], redis_con=redis_con, fechas=fechas)
         
         print(f"✔️ Mano {id_mano} creada:")
         print(f"   Mesa: {id_mesa} ({modalidad})")
         print(f"   Bote: ${bote_total} | Rake: ${rake}")
         print(f"   Ganador: Usuario {ganador_id}")
-        print(f"   Fecha: {fecha_final}")
+        print(f"   Fecha: {fechas[id_mano]:%Y-%m-%d %H:%M:%S}")
         print(f"   Participantes: {len(usuarios_en_mesa)} jugadores")
         print("===================================")
         
     except Exception as e:
         print(f"❌ Error al crear mano: {e}")
         print("===================================")
-        pg_con.rollback()
+
+# Manos por lote de ingesta (una transacción y dos INSERT multi-fila por lote)
+INGESTA_LOTE = int(os.getenv("INGESTA_LOTE", "1000"))
+
+# La modalidad por defecto sale de la mesa; LEFT JOIN para que una mesa inexistente falle por FK
+SQL_INGESTA_MANOS = """
+    INSERT INTO mano (id_mano, id_mesa, rake, bote_total, fecha_hora, ganador_id, modalidad)
+    SELECT v.id_mano, v.id_mesa, v.rake, v.bote_total, COALESCE(v.fecha_hora, NOW()),
+           v.ganador_id, COALESCE(v.modalidad, ms.modalidad)
+    FROM (VALUES %s) AS v(id_mano, id_mesa, rake, bote_total, fecha_hora, ganador_id, modalidad)
+    LEFT JOIN mesa ms ON ms.id_mesa = v.id_mesa
+    RETURNING id_mano, fecha_hora
+"""
+_PLANTILLA_INGESTA_MANOS = "(%s::int, %s::int, %s::numeric, %s::numeric, %s::timestamp, %s::int, %s::varchar)"
+
+def ingestar_manos(pg_con, manos, batch_size=INGESTA_LOTE, redis_con=None, fechas=None):
+    """API de ingesta masiva: escribe `mano` y `usuario_mano` de muchas manos por lotes.
+
+    Cada mano es un dict con id_mesa, bote_total, ganador_id y participantes
+    (ids de usuario), y opcionalmente fecha_hora (NOW() por defecto), rake
+    (5% del bote por defecto) y modalidad (la de la mesa por defecto).
+    Los id_mano se reservan antes con nextval, así cada lote son dos INSERT
+    multi-fila sin importar cuántas manos ni participantes traiga. Si un lote
+    falla se revierte ese lote y se propaga el error. Con `redis_con`, después
+    de cada commit se suma una mano a cada participante en el ranking del día.
+    Devuelve los id_mano generados, en el mismo orden que `manos`; si se pasa
+    el dict `fechas`, además lo completa con la fecha_hora guardada de cada mano.
+    """
+    ids = []
+    for lote in _lotes(manos, batch_size):
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT nextval(pg_get_serial_sequence('mano', 'id_mano')) FROM generate_series(1, %s)
+            """, (len(lote),))
+            ids_lote = [row[0] for row in cur.fetchall()]
+            
+            filas_mano = [
+                (id_mano, mano['id_mesa'], mano.get('rake', round(mano['bote_total'] * 0.05, 2)),
+                 mano['bote_total'], mano.get('fecha_hora'), mano['ganador_id'], mano.get('modalidad'))
+                for id_mano, mano in zip(ids_lote, lote)
+            ]
+            # La fecha real (NOW() si no vino) decide el ranking diario de cada mano
+            fechas_lote = dict(psycopg2_extras.execute_values(cur, SQL_INGESTA_MANOS, filas_mano,
+                                              template=_PLANTILLA_INGESTA_MANOS, page_size=len(filas_mano), fetch=True))
+            
+            filas_participantes = [
+                (id_usuario, id_mano)
+                for id_mano, mano in zip(ids_lote, lote)
+                for id_usuario in mano['participantes']
+            ]
+            if filas_participantes:
+                psycopg2_extras.execute_values(cur, "INSERT INTO usuario_mano (id_usuario, id_mano) VALUES %s",
+                               filas_participantes, page_size=len(filas_participantes))
+            conn.commit()
+            cur.close()
+        ids.extend(ids_lote)
+        if fechas is not None:
+            fechas.update(fechas_lote)
+        
+        if redis_con is not None:
+            try:
+                registrar_actividad(redis_con, (
+                    (fechas_lote[id_mano].date(), id_usuario, 1)
+                    for id_mano, mano in zip(ids_lote, lote)
+                    for id_usuario in mano['participantes']
+                ))
+            except Exception as e:
+                print(f"⚠️ No se pudo actualizar el ranking de actividad en Redis: {e}")
+    return ids
+
+SQL_INGESTA_TRANSACCIONES = """
+    INSERT INTO transaccion (id_usuario, id_metodo, monto, tipo, estado)
+    VALUES %s
+    RETURNING id_transaccion
+"""
+
+SQL_INGESTA_SALDOS = """
+    UPDATE usuario u SET saldo_real = u.saldo_real + v.delta
+    FROM (VALUES %s) AS v(id_usuario, delta)
+    WHERE u.id_usuario = v.id_usuario
+"""
+
+def ingestar_transacciones(pg_con, transacciones, batch_size=INGESTA_LOTE, redis_con=None):
+    """API de ingesta masiva: crea transacciones completadas por lotes, como crear_transaccion.
+
+    Cada transacción es un dict con id_usuario, id_metodo, monto y tipo
+    ('deposito' suma al saldo_real, cualquier otro tipo resta). Cada lote es
+    un INSERT multi-fila más un único UPDATE con el saldo neto de cada usuario,
+    en la misma transacción. Con `redis_con`, después de cada commit se
+    invalidan los saldos en caché de esos usuarios. Devuelve los id_transaccion generados.
+    """
+    ids = []
+    for lote in _lotes(transacciones, batch_size):
+        deltas = {}
+        for t in lote:
+            signo = 1 if t['tipo'] == 'deposito' else -1
+            deltas[t['id_usuario']] = deltas.get(t['id_usuario'], 0) + signo * t['monto']
+        
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            filas = psycopg2_extras.execute_values(
+                cur, SQL_INGESTA_TRANSACCIONES,
+                [(t['id_usuario'], t['id_metodo'], t['monto'], t['tipo']) for t in lote],
+                template="(%s, %s, %s, %s, 'completada')", page_size=len(lote), fetch=True)
+            psycopg2_extras.execute_values(cur, SQL_INGESTA_SALDOS, list(deltas.items()),
+                                           template="(%s::int, %s::numeric)", page_size=len(deltas))
+            conn.commit()
+            cur.close()
+        ids.extend(row[0] for row in filas)
+        
+        if redis_con is not None:
+            try:
+                invalidar_balances(redis_con, deltas)
+            except Exception as e:
+                print(f"⚠️ No se pudo invalidar los balances en caché: {e}")
+    return ids
+
+# ====================================
+#    MÉTRICAS DEL ETL
+# ====================================
+
+# Endpoint local de métricas (0 = no levantarlo)
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "0"))
+# Medir bytes serializa filas y documentos a JSON, así que es opcional y por
+# muestreo: se mide una de cada METRICAS_BYTES_MUESTRA filas y se extrapola
+METRICAS_BYTES = os.getenv("ETL_METRICAS_BYTES", "0") == "1"
+METRICAS_BYTES_MUESTRA = max(int(os.getenv("ETL_METRICAS_BYTES_MUESTRA", "100")), 1)
+
+ETAPAS_ETL = ('extraccion', 'transformacion', 'carga')
+
+METRICAS_AYUDA = {
+    'filas_total': ('counter', "Filas extraídas de PostgreSQL y transformadas, por destino"),
+    'etapa_segundos_total': ('counter', "Segundos de pared por destino y etapa (extraccion, transformacion, carga)"),
+    'bytes_total': ('counter', "Bytes movidos por destino y etapa, estimados por el tamaño JSON de una muestra de filas y documentos"),
+    'reintentos_total': ('counter', "Peticiones repetidas contra un destino, por motivo"),
+    'lote_filas': ('summary', "Filas por lote enviado a cada destino"),
+    'sync_segundos': ('summary', "Duración de cada función de sincronización, por resultado"),
+    'cache_consultas_total': ('counter', "Lecturas de la caché de resultados por caso y resultado (hit, miss, error)"),
+}
+
+class RegistroMetricas:
+    """Contadores y resúmenes en memoria, seguros entre hilos.
+
+    Cada serie se identifica por nombre + etiquetas. `a_dict` la vuelca para
+    JSON (con una vista por destino que separa extracción, transformación y
+    carga) y `a_prometheus` en el formato de texto que lee Prometheus.
+    """
+
+    def __init__(self, prefijo="pokerstars_etl"):
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._resumenes = {}
+
+    def sumar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            cantidad, suma, maximo = self._resumenes.get(clave, (0, 0, valor))
+            self._resumenes[clave] = (cantidad + 1, suma + valor, max(maximo, valor))
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._resumenes.clear()
+
+    def _copia(self):
+        with self._lock:
+            return dict(self._contadores), dict(self._resumenes)
+
+    def a_dict(self):
+        contadores, resumenes = self._copia()
+        destinos = {}
+        
+        def _destino(etiquetas):
+            return destinos.setdefault(etiquetas['destino'], {
+                'filas': 0,
+                'segundos': dict.fromkeys(ETAPAS_ETL, 0.0),
+                'bytes': {},
+                'lotes': 0,
+                'filas_por_lote': None,
+                'reintentos': {},
+            })
+        
+        for (nombre, etiquetas), valor in contadores.items():
+            etiquetas = dict(etiquetas)
+            if 'destino' not in etiquetas:
+                continue
+            destino = _destino(etiquetas)
+            if nombre == 'filas_total':
+                destino['filas'] += valor
+            elif nombre == 'etapa_segundos_total':
+                destino['segundos'][etiquetas['etapa']] = round(valor, 4)
+            elif nombre == 'bytes_total':
+                destino['bytes'][etiquetas['etapa']] = valor
+            elif nombre == 'reintentos_total':
+                destino['reintentos'][etiquetas['motivo']] = valor
+        for (nombre, etiquetas), (cantidad, suma, _maximo) in resumenes.items():
+            if nombre == 'lote_filas':
+                destino = _destino(dict(etiquetas))
+                destino['lotes'] = cantidad
+                destino['filas_por_lote'] = round(suma / cantidad, 1)
+        for destino in destinos.values():
+            total = sum(destino['segundos'].values())
+            destino['filas_por_segundo'] = round(destino['filas'] / total, 1) if total else None
+        
+        return {
+            'destinos': destinos,
+            'contadores': [
+                {'nombre': nombre, 'etiquetas': dict(etiquetas), 'valor': valor}
+                for (nombre, etiquetas), valor in sorted(contadores.items())
+            ],
+            'resumenes': [
+                {'nombre': nombre, 'etiquetas': dict(etiquetas), 'cantidad': cantidad, 'suma': suma, 'maximo': maximo}
+                for (nombre, etiquetas), (cantidad, suma, maximo) in sorted(resumenes.items())
+            ],
+        }
+
+    def a_prometheus(self):
+        contadores, resumenes = self._copia()
+        lineas = []
+        
+        def _etiquetas(etiquetas):
+            if not etiquetas:
+                return ""
+            pares = []
+            for clave, valor in etiquetas:
+                valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                pares.append(f'{clave}="{valor}"')
+            return "{" + ",".join(pares) + "}"
+        
+        for nombre, (tipo, ayuda) in METRICAS_AYUDA.items():
+            completo = f"{self.prefijo}_{nombre}"
+            if tipo == 'counter':
+                series = sorted((e, v) for (n, e), v in contadores.items() if n == nombre)
+                if not series:
+                    continue
+                lineas += [f"# HELP {completo} {ayuda}", f"# TYPE {completo} counter"]
+                lineas += [f"{completo}{_etiquetas(e)} {v}" for e, v in series]
+            else:
+                series = sorted((e, v) for (n, e), v in resumenes.items() if n == nombre)
+                if not series:
+                    continue
+                lineas += [f"# HELP {completo} {ayuda}", f"# TYPE {completo} summary"]
+                for e, (cantidad, suma, _maximo) in series:
+                    lineas += [f"{completo}_count{_etiquetas(e)} {cantidad}", f"{completo}_sum{_etiquetas(e)} {suma}"]
+                lineas += [f"# HELP {completo}_max Máximo observado de {completo}", f"# TYPE {completo}_max gauge"]
+                lineas += [f"{completo}_max{_etiquetas(e)} {maximo}" for e, (_c, _s, maximo) in series]
+        return "\n".join(lineas) + "\n"
+
+METRICAS = RegistroMetricas()
+
+def _tamano_json(obj):
+    return len(json.dumps(obj, default=str))
+
+def _transformar_midiendo(filas, doc_fn, medicion):
+    """Entrega (fila, doc_fn(fila)) acumulando en `medicion` el tiempo de cada etapa.
+
+    El tiempo que se pasa esperando la próxima fila (cursor de PostgreSQL o
+    cola del orquestador) cuenta como extracción; el de `doc_fn`, como transformación.
+    """
+    filas = iter(filas)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            row = next(filas)
+        except StopIteration:
+            medicion['extraccion'] += time.perf_counter() - inicio
+            return
+        extraida = time.perf_counter()
+        doc = doc_fn(row)
+        medicion['extraccion'] += extraida - inicio
+        medicion['transformacion'] += time.perf_counter() - extraida
+        medicion['filas'] += 1
+        if METRICAS_BYTES and (medicion['filas'] - 1) % METRICAS_BYTES_MUESTRA == 0:
+            medicion['bytes_extraccion'] += _tamano_json(row) * METRICAS_BYTES_MUESTRA
+            medicion['bytes_carga'] += _tamano_json(doc) * METRICAS_BYTES_MUESTRA
+        yield row, doc
+
+def _nueva_medicion():
+    return {'filas': 0, 'extraccion': 0.0, 'transformacion': 0.0, 'bytes_extraccion': 0, 'bytes_carga': 0}
+
+def _registrar_medicion(destino, medicion, total):
+    """La carga es lo que queda del tiempo total al descontar extracción y transformación"""
+    METRICAS.sumar('filas_total', medicion['filas'], destino=destino)
+    METRICAS.sumar('etapa_segundos_total', medicion['extraccion'], destino=destino, etapa='extraccion')
+    METRICAS.sumar('etapa_segundos_total', medicion['transformacion'], destino=destino, etapa='transformacion')
+    METRICAS.sumar('etapa_segundos_total', max(total - medicion['extraccion'] - medicion['transformacion'], 0.0),
+                   destino=destino, etapa='carga')
+    if METRICAS_BYTES:
+        METRICAS.sumar('bytes_total', medicion['bytes_extraccion'], destino=destino, etapa='extraccion')
+        METRICAS.sumar('bytes_total', medicion['bytes_carga'], destino=destino, etapa='carga')
+
+def _instrumentar_sync(nombre):
+    """Decorador: registra la duración de una función sync_* y si terminó bien"""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = 'error'
+            try:
+                valor = fn(*args, **kwargs)
+                if valor is not False:
+                    resultado = 'ok'
+                return valor
+            finally:
+                METRICAS.observar('sync_segundos', time.perf_counter() - inicio, sync=nombre, resultado=resultado)
+        return envoltura
+    return decorador
+
+def servir_metricas(puerto=METRICAS_PUERTO, host=METRICAS_HOST):
+    """Expone METRICAS en /metrics (Prometheus) y /metrics.json desde un hilo en segundo plano"""
+    
+    class _Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ruta = self.path.split('?')[0]
+            if ruta == '/metrics':
+                cuerpo = METRICAS.a_prometheus().encode()
+                tipo = 'text/plain; version=0.0.4; charset=utf-8'
+            elif ruta == '/metrics.json':
+                cuerpo = json.dumps(METRICAS.a_dict(), ensure_ascii=False, default=str).encode()
+                tipo = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+        
+        def log_message(self, *args):
+            pass  # Cada scrape ensuciaría el menú
+    
+    try:
+        servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    except OSError as e:
+        print(f"⚠️ No se pudo levantar el endpoint de métricas en {host}:{puerto}: {e}")
+        return None
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"📈 Métricas del ETL en http://{host}:{servidor.server_port}/metrics")
+    return servidor
+
+def mostrar_metricas():
+    """Resumen por destino en pantalla y, opcionalmente, el volcado completo a un archivo JSON"""
+    datos = METRICAS.a_dict()
+    if not datos['destinos']:
+        print("ℹ️  Todavía no hay métricas: correr alguna sincronización primero.")
+    for destino, m in sorted(datos['destinos'].items()):
+        segundos = m['segundos']
+        print(f"📈 {destino}: {m['filas']} filas"
+              + (f" ({m['filas_por_segundo']:.0f} filas/s)" if m['filas_por_segundo'] else ""))
+        print(f"   extracción {segundos['extraccion']:.2f}s | transformación {segundos['transformacion']:.2f}s"
+              f" | carga {segundos['carga']:.2f}s")
+        if m['lotes']:
+            print(f"   {m['lotes']} lotes de {m['filas_por_lote']} filas en promedio")
+        if m['bytes']:
+            print("   bytes: " + ", ".join(f"{etapa} {valor}" for etapa, valor in sorted(m['bytes'].items())))
+        if m['reintentos']:
+            print("   reintentos: " + ", ".join(f"{motivo} {valor}" for motivo, valor in sorted(m['reintentos'].items())))
+    cache = {}
+    for c in datos['contadores']:
+        if c['nombre'] == 'cache_consultas_total':
+            cache.setdefault(c['etiquetas']['caso'], {})[c['etiquetas']['resultado']] = c['valor']
+    for caso, conteos in sorted(cache.items()):
+        total = sum(conteos.values())
+        print(f"🗃️  {caso}: {conteos.get('hit', 0)} hits / {conteos.get('miss', 0)} misses"
+              f" ({conteos.get('hit', 0) / total:.0%} de aciertos)")
+    for r in datos['resumenes']:
+        if r['nombre'] == 'sync_segundos':
+            e = r['etiquetas']
+            print(f"⏱️  {e['sync']} ({e['resultado']}): {r['cantidad']} corridas, {r['suma']:.2f}s en total, máx {r['maximo']:.2f}s")
+    
+    archivo = ask("Archivo JSON para guardar el volcado (vacío para omitir)")
+    if archivo:
+        with open(archivo, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False, default=str)
+        print(f"✅ Métricas guardadas en {archivo}")
 
 # ====================================
 #    ETL BAJO DEMANDA
 # ====================================
 
+# El watermark es el xmin del snapshot con el que se extrajo: toda transacción
+# con xid menor ya había terminado y sus filas entraron en esa lectura. Las que
+# seguían abiertas (aunque hayan reservado ids bajos o empezado hace horas)
+# tienen xid_escritura >= xmin y se leen en la siguiente. El upsert es
+# idempotente, por lo que releer filas ya copiadas no tiene efecto.
+WATERMARK_INICIAL = 0
+
+def _leer_watermark(coleccion_estado, clave, version=1):
+    """Devuelve el xmin guardado para `clave`.
+
+    Si el watermark se guardó con otra `version` del documento destino (o con
+    el formato anterior de id y fecha) se devuelve el inicial, forzando una
+    copia completa que rellene los campos nuevos.
+    """
+    return _marca_desde_estado(coleccion_estado.find_one({'_id': clave}), version)
+
+def _marca_desde_estado(estado, version=1):
+    """Watermark del documento de sync_estado `estado` (o el inicial si no sirve)"""
+    if not estado or estado.get('version', 1) != version or 'xmin' not in estado:
+        return WATERMARK_INICIAL
+    return int(estado['xmin'])
+
+def _cambios_watermark(xmin, version=1):
+    return {'$set': {
+        'xmin': xmin,
+        'version': version,
+        'sincronizado_en': datetime.datetime.now().isoformat()
+    }}
+
+def _guardar_watermark(coleccion_estado, clave, xmin, version=1):
+    coleccion_estado.update_one(
+        {'_id': clave},
+        _cambios_watermark(xmin, version),
+        upsert=True
+    )
+
+def _avanzar_watermark(marca, xmin_lectura):
+    return max(marca, int(xmin_lectura))
+
+# Filas que se traen del servidor en cada fetchmany de un cursor con nombre
+PG_FETCH_SIZE = int(os.getenv("PG_FETCH_SIZE", "5000"))
+_cursores_etl = itertools.count(1)
+
+def _stream_query(pg_con, query, params=None, batch_size=PG_FETCH_SIZE):
+    """Ejecuta `query` en un cursor de servidor (con nombre) y entrega las filas una a una.
+
+    Sólo hay `batch_size` filas en memoria a la vez, sin importar el tamaño de la tabla.
+    Con un PoolPostgres la conexión queda tomada hasta que se agota el generador.
+    """
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor(name=f"etl_{next(_cursores_etl)}")
+        try:
+            cur.execute(query, params)
+            while True:
+                filas = cur.fetchmany(batch_size)
+                if not filas:
+                    break
+                yield from filas
+        finally:
+            cur.close()
+        # Cierra la transacción de sólo lectura del cursor con nombre
+        conn.rollback()
+
+# Tamaño de cada lote de bulk_write (una ida y vuelta a Atlas por lote)
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "1000"))
+
+def _bulk_upsert_mongo(coleccion, docs, clave, batch_size=MONGO_BATCH_SIZE):
+    """Upsert por `clave` en lotes desordenados de bulk_write.
+
+    Devuelve (insertados, actualizados) con el mismo criterio que
+    update_one: upsert nuevo = insertado, documento cambiado = actualizado.
+    """
+    insertados = 0
+    actualizados = 0
+    lote = []
+    destino = f"mongo:{coleccion.name}"
+    
+    def _enviar(lote):
+        METRICAS.observar('lote_filas', len(lote), destino=destino)
+        result = coleccion.bulk_write(lote, ordered=False)
+        return result.upserted_count, result.modified_count
+    
+    for doc in docs:
+        lote.append(pymongo.UpdateOne({clave: doc[clave]}, {'$set': doc}, upsert=True))
+        if len(lote) >= batch_size:
+            nuevos, cambiados = _enviar(lote)
+            insertados += nuevos
+            actualizados += cambiados
+            lote = []
+    
+    if lote:
+        nuevos, cambiados = _enviar(lote)
+        insertados += nuevos
+        actualizados += cambiados
+    
+    return insertados, actualizados
+
 def sync_usuario_to_mongo(pg_con, mongo_db, id_usuario):
     """Sincroniza UN usuario específico a MongoDB"""
     try:
-        cur = pg_con.cursor()
-        cur.execute("""
-            SELECT id_usuario, nombre, email, pais, saldo_real, saldo_fichas
-            FROM usuario WHERE id_usuario = %s
-        """, (id_usuario,))
-        
-        row = cur.fetchone()
-        cur.close()
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_usuario, nombre, email, pais, saldo_real, saldo_fichas
+                FROM usuario WHERE id_usuario = %s
+            """, (id_usuario,))
+            
+            row = cur.fetchone()
+            cur.close()
         
         if row:
             usuario_doc = {
@@ -503,269 +1756,627 @@ def sync_usuario_to_mongo(pg_con, mongo_db, id_usuario):
         print(f"⚠️ Error sincronizando usuario {id_usuario}: {e}")
         return False
 
-def sync_all_usuarios_to_mongo(pg_con, mongo_db):
-    """Sincroniza TODOS los usuarios a MongoDB con balance_neto calculado"""
-    print("🔄 Sincronizando usuarios desde PostgreSQL a MongoDB...")
-    try:
-        cur = pg_con.cursor()
-        
-        # Obtener todos los usuarios
-        cur.execute("SELECT id_usuario, nombre, email, pais, saldo_real, saldo_fichas FROM usuario")
-        usuarios = cur.fetchall()
-        
-        insertados = 0
-        actualizados = 0
-        
-        for row in usuarios:
-            id_usuario = row[0]
-            
-            # Calcular balance_neto: suma de depósitos menos retiros
-            cur.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN tipo = 'deposito' THEN monto ELSE 0 END), 0) as depositos,
-                    COALESCE(SUM(CASE WHEN tipo = 'retiro' THEN monto ELSE 0 END), 0) as retiros
-                FROM transaccion
-                WHERE id_usuario = %s AND estado = 'completada'
-            """, (id_usuario,))
-            trans_result = cur.fetchone()
-            depositos = float(trans_result[0]) if trans_result[0] else 0.0
-            retiros = float(trans_result[1]) if trans_result[1] else 0.0
-            balance_neto = depositos - retiros
-            
-            # Calcular manos ganadas (suma de botes ganados menos rake)
-            cur.execute("""
-                SELECT 
-                    COUNT(*) as manos_ganadas,
-                    COALESCE(SUM(bote_total - rake), 0) as ganancias_manos
-                FROM mano
-                WHERE ganador_id = %s
-            """, (id_usuario,))
-            manos_result = cur.fetchone()
-            manos_ganadas = int(manos_result[0]) if manos_result[0] else 0
-            ganancias_manos = float(manos_result[1]) if manos_result[1] else 0.0
-            
-            # Calcular total de manos jugadas
-            cur.execute("""
-                SELECT COUNT(DISTINCT m.id_mano)
-                FROM mano m
-                JOIN usuario_mano um ON m.id_mano = um.id_mano
-                WHERE um.id_usuario = %s
-            """, (id_usuario,))
-            manos_jugadas = cur.fetchone()[0] or 0
-            
-            # Crear documento para MongoDB
-            usuario_doc = {
-                'id_usuario': id_usuario,
-                'nombre': row[1],
-                'email': row[2],
-                'pais': row[3],
-                'saldo_real': float(row[4]) if row[4] else 0.0,
-                'saldo_fichas': float(row[5]) if row[5] else 0.0,
-                'balance_neto': balance_neto,  # Balance de transacciones
-                'ganancias_mesas': ganancias_manos,  # Ganancias por manos ganadas
-                'balance_total': balance_neto + ganancias_manos,  # Balance total combinado
-                'manos_jugadas': manos_jugadas,
-                'manos_ganadas': manos_ganadas
-            }
-            
-            result = mongo_db.usuarios.update_one(
-                {'id_usuario': id_usuario},
-                {'$set': usuario_doc},
-                upsert=True
-            )
-            
-            if result.upserted_id:
-                insertados += 1
-            elif result.modified_count > 0:
-                actualizados += 1
+# Los agregados por usuario salen de usuario_resumen, que mantienen los triggers
+# de transaccion, mano y usuario_mano (ver migrar_esquema_postgres)
+SQL_USUARIOS = """
+    SELECT u.id_usuario, u.nombre, u.email, u.pais, u.saldo_real, u.saldo_fichas,
+           COALESCE(r.balance_neto, 0) as balance_neto,
+           COALESCE(r.ganancias_mesas, 0) as ganancias_mesas,
+           COALESCE(r.manos_ganadas, 0) as manos_ganadas,
+           COALESCE(r.manos_jugadas, 0) as manos_jugadas
+    FROM usuario u
+    LEFT JOIN usuario_resumen r ON r.id_usuario = u.id_usuario
+"""
+SQL_USUARIOS_POR_ID = SQL_USUARIOS + "    WHERE u.id_usuario = ANY(%s)\n"
+
+# Las consultas con watermark terminan en el xmin del snapshot de la lectura
+# (es lo que usa _cargar para avanzar la marca). Las comparten Mongo y Astra.
+_XMIN_LECTURA = "(SELECT pg_snapshot_xmin(pg_current_snapshot()))::text AS xmin_lectura"
+_SELECT_MANOS = """
+    SELECT m.id_mano, m.id_mesa, m.rake, m.bote_total, m.fecha_hora,
+           m.ganador_id, m.modalidad, ms.tipo as tipo_mesa,
+           """ + _XMIN_LECTURA + """
+    FROM mano m
+    JOIN mesa ms ON m.id_mesa = ms.id_mesa
+"""
+SQL_MANOS = _SELECT_MANOS + "    WHERE m.xid_escritura >= %s::xid8\n"
+SQL_MANOS_POR_ID = _SELECT_MANOS + "    WHERE m.id_mano = ANY(%s)\n"
+
+_SELECT_TRANSACCIONES = """
+    SELECT t.id_transaccion, t.id_usuario, u.nombre, mp.tipo as medio,
+           t.fecha, t.monto, t.estado, t.tipo,
+           """ + _XMIN_LECTURA + """
+    FROM transaccion t
+    JOIN usuario u ON t.id_usuario = u.id_usuario
+    JOIN metodo_pago mp ON t.id_metodo = mp.id_metodo
+"""
+SQL_TRANSACCIONES = _SELECT_TRANSACCIONES + "    WHERE t.xid_escritura >= %s::xid8\n"
+SQL_TRANSACCIONES_POR_ID = _SELECT_TRANSACCIONES + "    WHERE t.id_transaccion = ANY(%s)\n"
+
+def _params_watermark(marca):
+    return (str(marca),)
+
+def _cargar(filas, doc_fn, upsert_fn, marca=None, guardar_marca=None, destino='etl'):
+    """Transforma `filas` con `doc_fn` y las carga con `upsert_fn(docs)`.
+
+    Si se pasa `marca`, se avanza con cada fila y se guarda con
+    `guardar_marca(marca)` al terminar. Devuelve (insertados, actualizados, leidas).
+    Los tiempos por etapa quedan en METRICAS bajo la etiqueta `destino`.
+    """
+    medicion = _nueva_medicion()
+    
+    def docs():
+        nonlocal marca
+        for row, doc in _transformar_midiendo(filas, doc_fn, medicion):
+            if marca is not None:
+                marca = _avanzar_watermark(marca, row[-1])
+            yield doc
+    
+    inicio = time.perf_counter()
+    try:
+        insertados, actualizados = upsert_fn(docs())
+    finally:
+        _registrar_medicion(destino, medicion, time.perf_counter() - inicio)
+    if insertados or actualizados:
+        _datos_cambiaron(destino)
+    leidas = medicion['filas']
+    if marca is not None and leidas:
+        guardar_marca(marca)
+    return insertados, actualizados, leidas
+
+def _doc_usuario_mongo(row):
+    balance_neto = float(row[6])
+    ganancias_manos = float(row[7])
+    return {
+        'id_usuario': row[0],
+        'nombre': row[1],
+        'email': row[2],
+        'pais': row[3],
+        'saldo_real': float(row[4]) if row[4] else 0.0,
+        'saldo_fichas': float(row[5]) if row[5] else 0.0,
+        'balance_neto': balance_neto,  # Balance de transacciones
+        'ganancias_mesas': ganancias_manos,  # Ganancias por manos ganadas
+        'balance_total': balance_neto + ganancias_manos,  # Balance total combinado
+        'manos_jugadas': int(row[9]),
+        'manos_ganadas': int(row[8])
+    }
+
+def _cargar_usuarios_mongo(mongo_db, filas):
+    return _cargar(filas, _doc_usuario_mongo,
+                   lambda docs: _bulk_upsert_mongo(mongo_db.usuarios, docs, 'id_usuario'),
+                   destino='mongo:usuarios')
+
+@_instrumentar_sync('mongo:usuarios')
+def sync_all_usuarios_to_mongo(pg_con, mongo_db):
+    """Sincroniza TODOS los usuarios a MongoDB con balance_neto calculado"""
+    print("🔄 Sincronizando usuarios desde PostgreSQL a MongoDB...")
+    try:
+        # Sin índice único en id_usuario cada upsert recorre la colección entera
+        _asegurar_indices_una_vez(mongo_db)
         
-        cur.close()
+        filas = _stream_query(pg_con, SQL_USUARIOS)
+        insertados, actualizados, leidos = _cargar_usuarios_mongo(mongo_db, filas)
         print(f"✅ Usuarios sincronizados a MongoDB:")
         print(f"   📝 {insertados} nuevos insertados")
         print(f"   🔄 {actualizados} actualizados")
-        print(f"   📊 Total en PostgreSQL: {len(usuarios)}")
+        print(f"   📊 Total en PostgreSQL: {leidos}")
         return True
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
-def sync_manos_to_mongo(pg_con, mongo_db):
-    """Sincroniza manos con toda su info desnormalizada"""
+# Subir este número cuando cambie la forma de los documentos de 'manos':
+# el siguiente sync incremental hará una copia completa para rellenar los campos nuevos
+MANOS_DOC_VERSION = 2
+
+def _periodo_mano(fecha_hora):
+    """Campos de partición precalculados (caso3 filtra por periodo en vez de usar $month)"""
+    if fecha_hora is None:
+        return {'anio': None, 'mes': None, 'periodo': None}
+    return {
+        'anio': fecha_hora.year,
+        'mes': fecha_hora.month,
+        'periodo': fecha_hora.year * 100 + fecha_hora.month  # p.ej. 202509
+    }
+
+def _doc_mano_mongo(row):
+    return {
+        'id_mano': row[0],
+        'id_mesa': row[1],
+        'rake': float(row[2]) if row[2] else 0.0,
+        'bote_total': float(row[3]) if row[3] else 0.0,
+        'fecha_hora': row[4],
+        'ganador_id': row[5],
+        'modalidad': row[6],
+        'tipo_mesa': row[7],
+        **_periodo_mano(row[4])
+    }
+
+def _marca_manos_mongo(mongo_db, incremental=True):
+    if not incremental:
+        return WATERMARK_INICIAL
+    return _leer_watermark(mongo_db.sync_estado, 'manos', MANOS_DOC_VERSION)
+
+def _cargar_manos_mongo(mongo_db, filas, marca):
+    return _cargar(filas, _doc_mano_mongo,
+                   lambda docs: _bulk_upsert_mongo(mongo_db.manos, docs, 'id_mano'),
+                   marca,
+                   lambda m: _guardar_watermark(mongo_db.sync_estado, 'manos', m, version=MANOS_DOC_VERSION),
+                   destino='mongo:manos')
+
+@_instrumentar_sync('mongo:manos')
+def sync_manos_to_mongo(pg_con, mongo_db, incremental=True):
+    """Sincroniza manos con toda su info desnormalizada.
+
+    En modo incremental sólo se leen las manos nuevas o modificadas desde
+    la última sincronización (watermark guardado en `sync_estado`).
+    """
     print("🔄 Sincronizando manos desde PostgreSQL a MongoDB...")
     try:
-        cur = pg_con.cursor()
-        cur.execute("""
-            SELECT m.id_mano, m.id_mesa, m.rake, m.bote_total, m.fecha_hora,
-                   m.ganador_id, m.modalidad, ms.tipo as tipo_mesa
-            FROM mano m
-            JOIN mesa ms ON m.id_mesa = ms.id_mesa
-        """)
+        _asegurar_indices_una_vez(mongo_db)
+        marca = _marca_manos_mongo(mongo_db, incremental)
         
-        manos = cur.fetchall()
-        
-        insertadas = 0
-        actualizadas = 0
-        
-        for row in manos:
-            mano_doc = {
-                'id_mano': row[0],
-                'id_mesa': row[1],
-                'rake': float(row[2]) if row[2] else 0.0,
-                'bote_total': float(row[3]) if row[3] else 0.0,
-                'fecha_hora': row[4],
-                'ganador_id': row[5],
-                'modalidad': row[6],
-                'tipo_mesa': row[7]
-            }
-            
-            result = mongo_db.manos.update_one(
-                {'id_mano': row[0]},
-                {'$set': mano_doc},
-                upsert=True
-            )
-            
-            if result.upserted_id:
-                insertadas += 1
-            elif result.modified_count > 0:
-                actualizadas += 1
-        
-        cur.close()
+        filas = _stream_query(pg_con, SQL_MANOS, _params_watermark(marca))
+        insertadas, actualizadas, leidas = _cargar_manos_mongo(mongo_db, filas, marca)
         print(f"✅ Manos sincronizadas a MongoDB:")
         print(f"   📝 {insertadas} nuevas insertadas")
         print(f"   🔄 {actualizadas} actualizadas")
-        print(f"   📊 Total en PostgreSQL: {len(manos)}")
+        print(f"   📊 Leídas de PostgreSQL: {leidas}" + (f" (desde xid {marca})" if incremental else ""))
         return True
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
-def sync_transacciones_to_mongo(pg_con, mongo_db):
-    """Sincroniza transacciones con info desnormalizada"""
+def _doc_transaccion_mongo(row):
+    return {
+        'id_transaccion': row[0],
+        'id_usuario': row[1],
+        'usuario_nombre': row[2],
+        'medio': row[3],
+        'fecha': row[4],
+        'monto': float(row[5]) if row[5] else 0.0,
+        'estado': row[6],
+        'tipo': row[7]
+    }
+
+def _marca_transacciones_mongo(mongo_db, incremental=True):
+    if not incremental:
+        return WATERMARK_INICIAL
+    return _leer_watermark(mongo_db.sync_estado, 'transacciones')
+
+def _cargar_transacciones_mongo(mongo_db, filas, marca):
+    return _cargar(filas, _doc_transaccion_mongo,
+                   lambda docs: _bulk_upsert_mongo(mongo_db.transacciones, docs, 'id_transaccion'),
+                   marca,
+                   lambda m: _guardar_watermark(mongo_db.sync_estado, 'transacciones', m),
+                   destino='mongo:transacciones')
+
+@_instrumentar_sync('mongo:transacciones')
+def sync_transacciones_to_mongo(pg_con, mongo_db, incremental=True):
+    """Sincroniza transacciones con info desnormalizada (incremental por defecto)"""
     print("🔄 Sincronizando transacciones desde PostgreSQL a MongoDB...")
     try:
-        cur = pg_con.cursor()
-        cur.execute("""
-            SELECT t.id_transaccion, t.id_usuario, u.nombre, mp.tipo as medio,
-                   t.fecha, t.monto, t.estado, t.tipo
-            FROM transaccion t
-            JOIN usuario u ON t.id_usuario = u.id_usuario
-            JOIN metodo_pago mp ON t.id_metodo = mp.id_metodo
-        """)
-        
-        transacciones = cur.fetchall()
+        _asegurar_indices_una_vez(mongo_db)
+        marca = _marca_transacciones_mongo(mongo_db, incremental)
         
-        insertadas = 0
-        actualizadas = 0
-        
-        for row in transacciones:
-            trans_doc = {
-                'id_transaccion': row[0],
-                'id_usuario': row[1],
-                'usuario_nombre': row[2],
-                'medio': row[3],
-                'fecha': row[4],
-                'monto': float(row[5]) if row[5] else 0.0,
-                'estado': row[6],
-                'tipo': row[7]
-            }
-            
-            result = mongo_db.transacciones.update_one(
-                {'id_transaccion': row[0]},
-                {'$set': trans_doc},
-                upsert=True
-            )
-            
-            if result.upserted_id:
-                insertadas += 1
-            elif result.modified_count > 0:
-                actualizadas += 1
-        
-        cur.close()
+        filas = _stream_query(pg_con, SQL_TRANSACCIONES, _params_watermark(marca))
+        insertadas, actualizadas, leidas = _cargar_transacciones_mongo(mongo_db, filas, marca)
         print(f"✅ Transacciones sincronizadas a MongoDB:")
         print(f"   📝 {insertadas} nuevas insertadas")
         print(f"   🔄 {actualizadas} actualizadas")
-        print(f"   📊 Total en PostgreSQL: {len(transacciones)}")
+        print(f"   📊 Leídas de PostgreSQL: {leidas}" + (f" (desde xid {marca})" if incremental else ""))
         return True
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
+# Filas por transacción de escritura en Neo4j (cada lote viaja como un único parámetro $rows)
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "5000"))
+
+CYPHER_USUARIOS = """
+    UNWIND $rows AS row
+    MERGE (u:Usuario {id_usuario: row.id_usuario})
+    SET u.nombre = row.nombre
+"""
+
+CYPHER_MESAS = """
+    UNWIND $rows AS row
+    MERGE (m:Mesa {id_mesa: row.id_mesa})
+    SET m.modalidad = row.modalidad, m.tipo = row.tipo
+"""
+
+CYPHER_JUGO_EN = """
+    UNWIND $rows AS row
+    MATCH (u:Usuario {id_usuario: row.id_usuario})
+    MATCH (m:Mesa {id_mesa: row.id_mesa})
+    MERGE (u)-[r:JUGO_EN]->(m)
+"""
+
+def _lotes(iterable, tamano):
+    """Agrupa un iterable en listas de como mucho `tamano` elementos"""
+    lote = []
+    for item in iterable:
+        lote.append(item)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _escribir_lote_neo4j(tx, cypher, rows, intentos):
+    # execute_write vuelve a llamar a esta función en cada reintento por error transitorio
+    intentos[0] += 1
+    tx.run(cypher, rows=rows).consume()
+
+def _unwind_neo4j(neo4j_driver, cypher, filas, fila_fn=None, destino='neo4j', batch_size=NEO4J_BATCH_SIZE):
+    """Ejecuta `cypher` (UNWIND $rows ...) por lotes, cada uno en una transacción explícita.
+
+    `fila_fn` convierte cada fila en el dict que recibe $rows (por defecto las
+    filas ya vienen como dict). Devuelve cuántas filas se enviaron.
+    """
+    total = 0
+    medicion = _nueva_medicion()
+    docs = (doc for _row, doc in _transformar_midiendo(filas, fila_fn or (lambda fila: fila), medicion))
+    inicio = time.perf_counter()
+    try:
+        with neo4j_driver.session() as session:
+            for lote in _lotes(docs, batch_size):
+                intentos = [0]
+                METRICAS.observar('lote_filas', len(lote), destino=destino)
+                session.execute_write(_escribir_lote_neo4j, cypher, lote, intentos)
+                if intentos[0] > 1:
+                    METRICAS.sumar('reintentos_total', intentos[0] - 1, destino=destino, motivo='transitorio')
+                total += len(lote)
+    finally:
+        _registrar_medicion(destino, medicion, time.perf_counter() - inicio)
+    if total:
+        _datos_cambiaron(destino)
+    return total
+
+def _crear_constraints_neo4j(neo4j_driver):
+    # Garantizar unicidad por id para evitar duplicados por tipo distinto (string/int)
+    try:
+        with neo4j_driver.session() as session:
+            session.run("CREATE CONSTRAINT usuario_id IF NOT EXISTS FOR (u:Usuario) REQUIRE u.id_usuario IS UNIQUE")
+            session.run("CREATE CONSTRAINT mesa_id IF NOT EXISTS FOR (m:Mesa) REQUIRE m.id_mesa IS UNIQUE")
+    except Exception as ce:
+        print(f"⚠️ No se pudo crear constraints (puede haber duplicados existentes o falta de permisos): {ce}")
+
+# Los cargadores de Neo4j sólo usan las primeras columnas de cada fila, así que
+# los usuarios pueden venir tanto de "SELECT id_usuario, nombre" como de SQL_USUARIOS
+
+def _cargar_usuarios_neo4j(neo4j_driver, filas):
+    return _unwind_neo4j(neo4j_driver, CYPHER_USUARIOS, filas,
+                         lambda row: {'id_usuario': row[0], 'nombre': row[1]},
+                         destino='neo4j:usuarios')
+
+def _cargar_mesas_neo4j(neo4j_driver, filas):
+    return _unwind_neo4j(neo4j_driver, CYPHER_MESAS, filas,
+                         lambda row: {'id_mesa': row[0], 'modalidad': row[1], 'tipo': row[2]},
+                         destino='neo4j:mesas')
+
+def _cargar_relaciones_neo4j(neo4j_driver, filas):
+    # Los nodos tienen que existir antes: MATCH usa las constraints como índice
+    return _unwind_neo4j(neo4j_driver, CYPHER_JUGO_EN, filas,
+                         lambda row: {'id_usuario': row[0], 'id_mesa': row[1]},
+                         destino='neo4j:relaciones')
+
+@_instrumentar_sync('neo4j:usuarios_mesas')
 def sync_usuarios_mesas_to_neo4j(pg_con, neo4j_driver):
     """Sincroniza relaciones Usuario-Mesa a Neo4j"""
     print("🔄 Sincronizando relaciones Usuario-Mesa a Neo4j...")
     try:
-        cur = pg_con.cursor()
-        
-        # Garantizar unicidad por id para evitar duplicados por tipo distinto (string/int)
-        try:
-            with neo4j_driver.session() as session:
-                session.run("CREATE CONSTRAINT usuario_id IF NOT EXISTS FOR (u:Usuario) REQUIRE u.id_usuario IS UNIQUE")
-                session.run("CREATE CONSTRAINT mesa_id IF NOT EXISTS FOR (m:Mesa) REQUIRE m.id_mesa IS UNIQUE")
-        except Exception as ce:
-            print(f"⚠️ No se pudo crear constraints (puede haber duplicados existentes o falta de permisos): {ce}")
+        _crear_constraints_neo4j(neo4j_driver)
 
         # Sincronizar usuarios
-        cur.execute("SELECT id_usuario, nombre FROM usuario")
-        usuarios = cur.fetchall()
-        
-        with neo4j_driver.session() as session:
-            for id_usuario, nombre in usuarios:
-                session.run("""
-                    MERGE (u:Usuario {id_usuario: $id_usuario})
-                    SET u.nombre = $nombre
-                """, {'id_usuario': id_usuario, 'nombre': nombre})
+        _cargar_usuarios_neo4j(neo4j_driver, _stream_query(pg_con, "SELECT id_usuario, nombre FROM usuario"))
         
         # Sincronizar mesas
-        cur.execute("SELECT id_mesa, modalidad, tipo FROM mesa")
-        mesas = cur.fetchall()
-        
-        with neo4j_driver.session() as session:
-            for id_mesa, modalidad, tipo in mesas:
-                session.run("""
-                    MERGE (m:Mesa {id_mesa: $id_mesa})
-                    SET m.modalidad = $modalidad, m.tipo = $tipo
-                """, {'id_mesa': id_mesa, 'modalidad': modalidad, 'tipo': tipo})
+        _cargar_mesas_neo4j(neo4j_driver, _stream_query(pg_con, "SELECT id_mesa, modalidad, tipo FROM mesa"))
         
         # Sincronizar relaciones
-        cur.execute("SELECT id_usuario, id_mesa FROM usuario_mesa")
-        relaciones = cur.fetchall()
-        
-        with neo4j_driver.session() as session:
-            for id_usuario, id_mesa in relaciones:
-                session.run("""
-                    MATCH (u:Usuario {id_usuario: $id_usuario})
-                    MATCH (m:Mesa {id_mesa: $id_mesa})
-                    MERGE (u)-[r:JUGO_EN]->(m)
-                """, {'id_usuario': id_usuario, 'id_mesa': id_mesa})
+        total_relaciones = _cargar_relaciones_neo4j(
+            neo4j_driver, _stream_query(pg_con, "SELECT id_usuario, id_mesa FROM usuario_mesa")
+        )
         
-        cur.close()
-        print(f"✅ {len(relaciones)} relaciones sincronizadas a Neo4j")
+        print(f"✅ {total_relaciones} relaciones sincronizadas a Neo4j")
         return True
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
 # ====================================
-#    LÓGICA DE MONGODB (Casos 1-6)
+#    FRESCURA DE LOS MODELOS DE LECTURA
 # ====================================
 
-def caso1_volumen_modalidad(pg_con, db):
-    print("\n[MongoDB] 📊 1. Volumen jugado por modalidad (última semana)")
+# Segundos durante los que un modelo recién comprobado se da por bueno sin
+# preguntar nada a PostgreSQL (0 = comprobar la versión en cada lectura)
+ETL_STALENESS_SECONDS = float(os.getenv("ETL_STALENESS_SECONDS", "0"))
+
+# Expresión barata que cambia cuando cambia la tabla. El contador de cambios es
+# el último evento que la tabla dejó en etl_outbox (sus triggers registran INSERT,
+# UPDATE y DELETE) y se lee del índice (tabla, id_evento). La PK máxima detecta
+# además las cargas que no pasan por los triggers (generar_datos.py). Si la outbox
+# se vacía la versión puede bajar: eso sólo cuesta un sync de más, porque esos
+# eventos ya llegaron a los destinos (drenar_outbox o sync_todo). podar_outbox
+# conserva el último evento de cada tabla, así que no la baja.
+VERSION_FUENTES = {
+    'usuario': "SELECT concat_ws('|', (SELECT max(id_usuario) FROM usuario), "
+               "(SELECT coalesce(max(id_evento), 0) FROM etl_outbox WHERE tabla = 'usuario'))",
+    'mesa': "SELECT concat_ws('|', (SELECT max(id_mesa) FROM mesa), "
+            "(SELECT coalesce(max(id_evento), 0) FROM etl_outbox WHERE tabla = 'mesa'))",
+    'usuario_mesa': "SELECT coalesce(max(id_evento), 0)::text FROM etl_outbox WHERE tabla = 'usuario_mesa'",
+    'mano': "SELECT concat_ws('|', (SELECT max(id_mano) FROM mano), "
+            "(SELECT coalesce(max(id_evento), 0) FROM etl_outbox WHERE tabla = 'mano'))",
+    'transaccion': "SELECT concat_ws('|', (SELECT max(id_transaccion) FROM transaccion), "
+                   "(SELECT coalesce(max(id_evento), 0) FROM etl_outbox WHERE tabla = 'transaccion'))",
+}
+
+# Tablas de PostgreSQL de las que se alimenta cada modelo de lectura
+# (usuario_mano se escribe junto con su mano, así que la cubre 'mano')
+FUENTES_MODELOS = {
+    'mongo:usuarios': ('usuario', 'transaccion', 'mano'),
+    'mongo:manos': ('mano', 'mesa'),
+    'mongo:transacciones': ('transaccion', 'usuario'),
+    'astra:manos': ('mano',),
+    'astra:transacciones': ('transaccion',),
+    'neo4j:usuarios_mesas': ('usuario', 'mesa', 'usuario_mesa'),
+}
+
+# Versión de las fuentes en la última sincronización correcta de cada modelo.
+# Es la copia de este proceso; la de todos los procesos está en etl_frescura
+_estado_modelos = {}
+
+def _consulta_version_fuentes(tablas):
+    return "SELECT " + ", ".join(f"({VERSION_FUENTES[t]})" for t in tablas)
+
+def version_fuentes(pg_con, tablas):
+    """Devuelve una tupla que identifica el contenido actual de `tablas` (una sola consulta)"""
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute(_consulta_version_fuentes(tablas))
+        version = cur.fetchone()
+        cur.close()
+        conn.rollback()
+    return version
+
+def _frescura_guardada(pg_con, modelo):
+    """Versión de las fuentes del último sync correcto de `modelo` en cualquier proceso (o None)"""
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM etl_frescura WHERE modelo = %s", (modelo,))
+        fila = cur.fetchone()
+        cur.close()
+        conn.rollback()
+    return tuple(json.loads(fila[0])) if fila else None
+
+def _registrar_frescura(pg_con, versiones):
+    """Guarda {modelo: versión de sus fuentes} tras un sync correcto, en este proceso y en etl_frescura.
+
+    Así un `caso N` lanzado desde cron no repite el ETL que ya hizo otro proceso.
+    """
+    ahora = time.monotonic()
+    for modelo, version in versiones.items():
+        _estado_modelos[modelo] = {'version': version, 'comprobado': ahora}
+    if not versiones:
+        return
+    try:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            psycopg2_extras.execute_values(cur, """
+                INSERT INTO etl_frescura (modelo, version) VALUES %s
+                ON CONFLICT (modelo) DO UPDATE SET version = EXCLUDED.version, sincronizado_en = NOW()
+            """, [(modelo, json.dumps(list(version))) for modelo, version in sorted(versiones.items())])
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar la frescura de {', '.join(versiones)}: {e}")
+
+def sincronizar_si_necesario(pg_con, modelo, sync_fn, *args, **kwargs):
+    """Ejecuta `sync_fn(pg_con, *args, **kwargs)` sólo si el modelo de lectura está desactualizado.
+
+    Se omite el ETL si el modelo se comprobó hace menos de ETL_STALENESS_SECONDS
+    o si la versión de sus tablas fuente no cambió desde el último sync correcto.
+    """
+    estado = _estado_modelos.get(modelo)
+    ahora = time.monotonic()
     
-    # 1. ETL bajo demanda
-    print("🔄 Cargando datos desde PostgreSQL...")
-    sync_manos_to_mongo(pg_con, db)
+    if estado and ahora - estado['comprobado'] < ETL_STALENESS_SECONDS:
+        print(f"✔️  {modelo} comprobado hace {ahora - estado['comprobado']:.0f}s; se omite el ETL.")
+        return True
     
-    # 2. Ejecutar consulta en MongoDB
-    hace_7_dias = datetime.datetime.now() - datetime.timedelta(days=7)
-    pipeline = [
-        { "$match": { "fecha_hora": { "$gte": hace_7_dias } } },
+    try:
+        version = version_fuentes(pg_con, FUENTES_MODELOS[modelo])
+        # Primera vez en este proceso: vale el último sync de cualquier proceso
+        sincronizada = estado['version'] if estado else _frescura_guardada(pg_con, modelo)
+    except Exception as e:
+        # Sin versión no se puede decidir: se sincroniza siempre
+        print(f"⚠️ No se pudo leer la versión de las fuentes de {modelo}: {e}")
+        version = sincronizada = None
+    
+    if version is not None and version == sincronizada:
+        _estado_modelos[modelo] = {'version': version, 'comprobado': ahora}
+        print(f"✔️  {modelo} al día (sin cambios en PostgreSQL); se omite el ETL.")
+        return True
+    
+    # La versión se lee ANTES del sync: si algo cambia mientras tanto, el próximo chequeo lo verá
+    ok = sync_fn(pg_con, *args, **kwargs)
+    if ok and version is not None:
+        _registrar_frescura(pg_con, {modelo: version})
+    return ok
+
+# ====================================
+#    CACHÉ DE RESULTADOS (Casos 1-6, 9-10)
+# ====================================
+
+# Cada entrada vence sola; con maxmemory-policy volatile-lru (o allkeys-lru) en el
+# servidor, Redis además desaloja primero las menos usadas cuando falta memoria
+CACHE_RESULTADOS_TTL = int(os.getenv("CACHE_RESULTADOS_TTL", "3600"))
+# Resultados más grandes que esto se recalculan siempre en vez de ocupar la caché
+CACHE_RESULTADOS_MAX_BYTES = int(os.getenv("CACHE_RESULTADOS_MAX_BYTES", str(1024 * 1024)))
+
+# Modelos de lectura de los que depende cada caso (los de FUENTES_MODELOS)
+MODELOS_CASOS = {
+    'caso1': ('mongo:manos',),
+    'caso2': ('mongo:usuarios',),
+    'caso3': ('mongo:manos',),
+    'caso4': ('mongo:transacciones',),
+    'caso5': ('astra:manos',),
+    'caso6': ('astra:transacciones',),
+    'caso9': ('neo4j:usuarios_mesas',),
+    'caso10': ('neo4j:usuarios_mesas',),
+}
+
+def _a_json(obj):
+    # Las fechas se marcan para volver como datetime; ObjectId y el resto, como texto
+    if isinstance(obj, datetime.datetime):
+        return {'$fecha': obj.isoformat()}
+    return str(obj)
+
+def _de_json(obj):
+    if len(obj) == 1 and '$fecha' in obj:
+        return datetime.datetime.fromisoformat(obj['$fecha'])
+    return obj
+
+class CacheResultados:
+    """Resultados de los casos en Redis, por caso + parámetros + versión de los datos.
+
+    Cada modelo de lectura tiene un contador (cache_version:<modelo>) que los
+    cargadores del ETL suben cada vez que escriben algo. Como la versión forma
+    parte de la clave, las entradas viejas dejan de leerse solas y vencen por TTL.
+    """
+
+    def __init__(self, r, ttl=CACHE_RESULTADOS_TTL, max_bytes=CACHE_RESULTADOS_MAX_BYTES):
+        self.r = r
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def _clave_version(modelo):
+        return f"cache_version:{modelo}"
+
+    def invalidar(self, modelos):
+        with self.r.pipeline(transaction=False) as pipe:
+            for modelo in modelos:
+                pipe.incr(self._clave_version(modelo))
+            pipe.execute()
+
+    def _clave(self, caso, params):
+        versiones = self.r.mget([self._clave_version(m) for m in MODELOS_CASOS[caso]])
+        huella = hashlib.sha1(
+            json.dumps(params, default=_a_json, separators=(',', ':'), sort_keys=True).encode()
+        ).hexdigest()[:16]
+        return f"cache:{caso}:{'.'.join(v or '0' for v in versiones)}:{huella}"
+
+    def obtener(self, caso, params, calcular):
+        """Devuelve el resultado guardado o lo calcula con `calcular()` y lo guarda.
+
+        Si Redis falla se calcula sin caché: la caché nunca rompe un caso.
+        """
+        try:
+            # La versión se lee antes de calcular: si el ETL escribe mientras tanto,
+            # el resultado queda guardado bajo la versión vieja y nadie lo vuelve a leer
+            clave = self._clave(caso, params)
+            guardado = self.r.get(clave)
+        except Exception as e:
+            print(f"⚠️ Caché de resultados no disponible: {e}")
+            METRICAS.sumar('cache_consultas_total', caso=caso, resultado='error')
+            return calcular()
+        
+        if guardado is not None:
+            METRICAS.sumar('cache_consultas_total', caso=caso, resultado='hit')
+            return json.loads(guardado, object_hook=_de_json)
+        
+        METRICAS.sumar('cache_consultas_total', caso=caso, resultado='miss')
+        resultado = calcular()
+        try:
+            texto = json.dumps(resultado, default=_a_json, separators=(',', ':'), ensure_ascii=False)
+            if len(texto.encode()) <= self.max_bytes:
+                self.r.set(clave, texto, ex=self.ttl)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el resultado de {caso} en caché: {e}")
+        return resultado
+
+_cache_resultados = None
+
+def activar_cache_resultados(r):
+    """Usa `r` para la caché de resultados de los casos y para las versiones que sube el ETL"""
+    global _cache_resultados
+    _cache_resultados = CacheResultados(r)
+    return _cache_resultados
+
+def _consultar(caso, params, calcular):
+    if _cache_resultados is None:
+        return calcular()
+    return _cache_resultados.obtener(caso, params, calcular)
+
+def _modelo_de_destino(destino):
+    """Modelo de lectura (clave de MODELOS_CASOS) al que escribe `destino`"""
+    return 'neo4j:usuarios_mesas' if destino.startswith('neo4j:') else destino
+
+def _datos_cambiaron(destino):
+    """Sube la versión del modelo de lectura de `destino` (etiqueta de METRICAS).
+
+    Sólo funciona con la caché activada en este proceso: por eso el menú y la
+    línea de comandos conectan Redis antes de cualquier ETL.
+    """
+    if _cache_resultados is None:
+        return
+    modelo = _modelo_de_destino(destino)
+    try:
+        _cache_resultados.invalidar([modelo])
+    except Exception as e:
+        print(f"⚠️ No se pudo invalidar la caché de resultados de {modelo}: {e}")
+
+# ====================================
+#    LÓGICA DE MONGODB (Casos 1-6)
+# ====================================
+
+# Consultas de los casos, compartidas con el reporte de índices
+
+def _pipeline_caso1(desde):
+    return [
+        { "$match": { "fecha_hora": { "$gte": desde } } },
         { "$group": {
             "_id": "$modalidad",
             "volumen_total": { "$sum": "$bote_total" }
         }}
     ]
-    resultados = list(db.manos.aggregate(pipeline))
+
+def _filtro_caso3(mes, anio, bote_minimo=1000):
+    return {
+        "periodo": anio * 100 + mes,
+        "bote_total": { "$gt": bote_minimo }
+    }
+
+def _filtro_caso4(id_usuario):
+    return {
+        "id_usuario": id_usuario,
+        "tipo": "deposito",
+        "medio": "paypal"
+    }
+
+# Consultas puras de los casos (sin ETL ni entrada por teclado), usadas
+# por el menú y por benchmark_etl.py
+
+def consulta_caso1(db, desde):
+    return list(db.manos.aggregate(_pipeline_caso1(desde)))
+
+def consulta_caso2(db, limite=10):
+    return list(db.usuarios.find().sort("balance_total", -1).limit(limite))
+
+def consulta_caso3(db, mes, anio):
+    return list(db.manos.find(_filtro_caso3(mes, anio)))
+
+def consulta_caso4(db, id_usuario):
+    return list(db.transacciones.find(_filtro_caso4(id_usuario)))
+
+def caso1_volumen_modalidad(pg_con, db):
+    print("\n[MongoDB] 📊 1. Volumen jugado por modalidad (última semana)")
+    
+    # ETL bajo demanda + consulta en MongoDB
+    print("🔄 Cargando datos desde PostgreSQL...")
+    resultados = ejecutar_caso(pg_con, db, 'caso1', {'desde': _desde_caso1(7)})
     
     if resultados:
         print("\nResultados:")
@@ -777,12 +2388,9 @@ def caso1_volumen_modalidad(pg_con, db):
 def caso2_top10_balance(pg_con, db):
     print("\n[MongoDB] 💰 2. Top 10 jugadores con mayor balance neto")
     
-    # 1. ETL bajo demanda
+    # ETL bajo demanda + consulta en MongoDB (ordenar por balance_total)
     print("🔄 Cargando datos desde PostgreSQL...")
-    sync_all_usuarios_to_mongo(pg_con, db)
-    
-    # 2. Ejecutar consulta en MongoDB (ordenar por balance_total)
-    resultados = list(db.usuarios.find().sort("balance_total", -1).limit(10))
+    resultados = ejecutar_caso(pg_con, db, 'caso2')
     
     if resultados:
         print("\nTop 10 por Balance Total (Transacciones + Ganancias Mesas):")
@@ -803,21 +2411,23 @@ def caso2_top10_balance(pg_con, db):
     else:
         print("  (Sin datos)")
 
-def caso3_manos_1000_septiembre(pg_con, db):
-    print("\n[MongoDB] 🔥 3. Manos con bote > 1000 USD en septiembre")
+def caso3_manos_1000_septiembre(pg_con, db, mes=None, anio=None):
+    """Manos con bote > 1000 USD en un mes concreto (por defecto septiembre del año actual)"""
+    if mes is None:
+        mes_input = ask("Mes (1-12, vacío para septiembre)")
+        mes = int(mes_input) if mes_input else 9
+    if anio is None:
+        anio_input = ask("Año (vacío para el año actual)")
+        anio = int(anio_input) if anio_input else datetime.date.today().year
     
-    # 1. ETL bajo demanda
-    print("🔄 Cargando datos desde PostgreSQL...")
-    sync_manos_to_mongo(pg_con, db)
+    print(f"\n[MongoDB] 🔥 3. Manos con bote > 1000 USD en {mes:02d}/{anio}")
     
-    # 2. Ejecutar consulta
-    resultados = list(db.manos.find({
-        "bote_total": { "$gt": 1000 },
-        "$expr": { "$eq": [{ "$month": "$fecha_hora" }, 9] }
-    }))
+    # ETL bajo demanda + consulta (recorrido de rango sobre el índice periodo + bote_total)
+    print("🔄 Cargando datos desde PostgreSQL...")
+    resultados = ejecutar_caso(pg_con, db, 'caso3', {'mes': mes, 'anio': anio})
     
     if resultados:
-        print(f"\nManos con bote > $1000 en septiembre:")
+        print(f"\nManos con bote > $1000 en {mes:02d}/{anio}:")
         for m in resultados:
             print(f"  Mano {m['id_mano']}: ${m['bote_total']:.2f} - {m['fecha_hora']}")
     else:
@@ -826,19 +2436,12 @@ def caso3_manos_1000_septiembre(pg_con, db):
 def caso4_depositos_paypal(pg_con, db):
     print("\n[MongoDB] 💳 4. Depósitos de un usuario por paypal")
     
-    # 1. ETL bajo demanda
-    print("🔄 Cargando transacciones desde PostgreSQL...")
-    sync_transacciones_to_mongo(pg_con, db)
-    
-    # 2. Pedir datos
+    # 1. Pedir datos
     user_id = int(ask("ID Usuario"))
     
-    # 3. Ejecutar consulta
-    resultados = list(db.transacciones.find({
-        "id_usuario": user_id,
-        "tipo": "deposito",
-        "medio": "paypal"
-    }))
+    # 2. ETL bajo demanda + consulta
+    print("🔄 Cargando transacciones desde PostgreSQL...")
+    resultados = ejecutar_caso(pg_con, db, 'caso4', {'id_usuario': user_id})
     
     if resultados:
         print(f"\nDepósitos de usuario {user_id} por paypal:")
@@ -850,6 +2453,189 @@ def caso4_depositos_paypal(pg_con, db):
     else:
         print("  (Sin depósitos por paypal)")
 
+# ====================================
+#   ÍNDICES DE MONGODB (Casos 1-4)
+# ====================================
+
+# Mismos valores que pymongo.ASCENDING/DESCENDING, sin importar pymongo al cargar el módulo
+ASCENDING, DESCENDING = 1, -1
+
+# Índices por colección (claves, opciones de IndexModel): claves únicas de los
+# upserts del ETL + los que usa cada caso
+INDICES_MONGO = {
+    'manos': [
+        ([('id_mano', ASCENDING)], dict(unique=True, name='id_mano_unico')),
+        # caso1: rango por fecha y agrupación por modalidad sin leer el documento
+        ([('fecha_hora', ASCENDING), ('modalidad', ASCENDING), ('bote_total', ASCENDING)],
+         dict(name='caso1_fecha_modalidad_bote')),
+        # caso3: igualdad por mes (periodo) y rango por bote
+        ([('periodo', ASCENDING), ('bote_total', ASCENDING)], dict(name='caso3_periodo_bote')),
+    ],
+    'usuarios': [
+        ([('id_usuario', ASCENDING)], dict(unique=True, name='id_usuario_unico')),
+        # caso2: top 10 por balance sin ordenar en memoria
+        ([('balance_total', DESCENDING)], dict(name='caso2_balance_total')),
+    ],
+    'transacciones': [
+        ([('id_transaccion', ASCENDING)], dict(unique=True, name='id_transaccion_unico')),
+        # caso4: igualdad sobre los tres campos
+        ([('id_usuario', ASCENDING), ('tipo', ASCENDING), ('medio', ASCENDING)],
+         dict(name='caso4_usuario_tipo_medio')),
+    ],
+}
+
+# Bases en las que ya se comprobaron los índices durante este proceso
+_indices_mongo_listos = set()
+
+def asegurar_indices_mongo(mongo_db):
+    """Crea los índices de INDICES_MONGO que falten (create_indexes es idempotente)"""
+    todo_ok = True
+    for nombre_coleccion, indices in INDICES_MONGO.items():
+        try:
+            mongo_db[nombre_coleccion].create_indexes(
+                [pymongo.IndexModel(claves, **opciones) for claves, opciones in indices])
+        except Exception as e:
+            # Por ejemplo: datos duplicados que impiden un índice único
+            print(f"⚠️ No se pudieron crear los índices de '{nombre_coleccion}': {e}")
+            todo_ok = False
+    if todo_ok:
+        _indices_mongo_listos.add(mongo_db.name)
+    return todo_ok
+
+def _asegurar_indices_una_vez(mongo_db):
+    if mongo_db.name not in _indices_mongo_listos:
+        asegurar_indices_mongo(mongo_db)
+
+def _etapas_plan(plan):
+    """Recorre la salida de explain y devuelve las etapas del plan ganador (IXSCAN, COLLSCAN, ...)"""
+    etapas = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            etapas.append(plan['stage'])
+        for clave, valor in plan.items():
+            if clave != 'rejectedPlans':
+                etapas.extend(_etapas_plan(valor))
+    elif isinstance(plan, list):
+        for valor in plan:
+            etapas.extend(_etapas_plan(valor))
+    return etapas
+
+def reporte_indices_mongo(mongo_db):
+    """Muestra el uso de cada índice ($indexStats) y el plan de las consultas de los casos 1-4"""
+    print("\n[MongoDB] 🔎 Reporte de índices")
+    asegurar_indices_mongo(mongo_db)
+    
+    for nombre_coleccion in INDICES_MONGO:
+        print(f"\n  Colección '{nombre_coleccion}':")
+        for stats in mongo_db[nombre_coleccion].aggregate([{"$indexStats": {}}]):
+            accesos = stats.get('accesses', {})
+            print(f"    {stats['name']}: {accesos.get('ops', 0)} usos desde {accesos.get('since')}")
+    
+    hace_7_dias = datetime.datetime.now() - datetime.timedelta(days=7)
+    consultas = {
+        'caso1': mongo_db.command('explain', {
+            'aggregate': 'manos', 'pipeline': _pipeline_caso1(hace_7_dias), 'cursor': {}
+        }),
+        'caso2': mongo_db.usuarios.find().sort("balance_total", -1).limit(10).explain(),
+        'caso3': mongo_db.manos.find(_filtro_caso3(9, datetime.date.today().year)).explain(),
+        'caso4': mongo_db.transacciones.find(_filtro_caso4(1)).explain(),
+    }
+    
+    print("\n  Planes de las consultas:")
+    for caso, explain in consultas.items():
+        etapas = _etapas_plan(explain)
+        cubierta = 'COLLSCAN' not in etapas and 'IXSCAN' in etapas
+        estado = "✔️ usa índice" if cubierta else "❌ recorre la colección"
+        print(f"    {caso}: {estado} ({' > '.join(etapas)})")
+
+# ====================================
+#   ÍNDICES DE POSTGRESQL
+# ====================================
+
+# Consultas calientes del archivo: (sql, parámetros de ejemplo, {tabla: índices que debe usar}).
+# Los índices se crean en migrar_esquema_postgres (INDICES_POSTGRES); las PK son <tabla>_pkey.
+CONSULTAS_CALIENTES_PG = {
+    'crear_mano (jugadores de la mesa)': (
+        "SELECT id_usuario FROM usuario_mesa WHERE id_mesa = %s", (1,),
+        {'usuario_mesa': ('idx_usuario_mesa_id_mesa',)}),
+    'crear_transaccion (saldo)': (
+        "UPDATE usuario SET saldo_real = saldo_real + %s WHERE id_usuario = %s", (0, 1),
+        {'usuario': ('usuario_pkey',)}),
+    'caso8 (saldo)': (
+        "SELECT saldo_real FROM usuario WHERE id_usuario = %s", (1,),
+        {'usuario': ('usuario_pkey',)}),
+    'CDC usuarios por id': (
+        SQL_USUARIOS_POR_ID, ([1],),
+        {'usuario': ('usuario_pkey',), 'usuario_resumen': ('usuario_resumen_pkey',)}),
+    'CDC manos por id': (
+        SQL_MANOS_POR_ID, ([1],),
+        {'mano': ('mano_pkey',), 'mesa': ('mesa_pkey',)}),
+    'CDC transacciones por id': (
+        SQL_TRANSACCIONES_POR_ID, ([1],),
+        {'transaccion': ('transaccion_pkey',), 'usuario': ('usuario_pkey',), 'metodo_pago': ('metodo_pago_pkey',)}),
+    # Marca al día: el caso normal de un sync incremental
+    'ETL manos incremental': (
+        SQL_MANOS, (str(2**63 - 1),),
+        {'mano': ('idx_mano_xid_escritura',)}),
+    'ETL transacciones incremental': (
+        SQL_TRANSACCIONES, (str(2**63 - 1),),
+        {'transaccion': ('idx_transaccion_xid_escritura',)}),
+    'frescura (versión de mano)': (
+        VERSION_FUENTES['mano'], None,
+        {'mano': ('mano_pkey',), 'etl_outbox': ('idx_etl_outbox_tabla_evento',)}),
+    'frescura (versión de transaccion)': (
+        VERSION_FUENTES['transaccion'], None,
+        {'transaccion': ('transaccion_pkey',), 'etl_outbox': ('idx_etl_outbox_tabla_evento',)}),
+    'frescura (versión de usuario_mesa)': (
+        VERSION_FUENTES['usuario_mesa'], None,
+        {'etl_outbox': ('idx_etl_outbox_tabla_evento',)}),
+}
+
+def _escaneos_plan(nodo):
+    """Recorre un plan de EXPLAIN (FORMAT JSON) y devuelve (tabla, tipo de nodo, índice) de cada lectura"""
+    escaneos = []
+    if nodo['Node Type'] != 'ModifyTable' and ('Relation Name' in nodo or 'Index Name' in nodo):
+        escaneos.append((nodo.get('Relation Name'), nodo['Node Type'], nodo.get('Index Name')))
+    for hijo in nodo.get('Plans', []):
+        escaneos.extend(_escaneos_plan(hijo))
+    return escaneos
+
+def verificar_indices_postgres(pg_con):
+    """Hace EXPLAIN de cada consulta caliente y comprueba que use los índices que declara.
+
+    enable_seqscan se apaga sólo dentro de esta transacción: así el plan muestra
+    si el índice esperado sirve aunque las tablas sean tan chicas que a
+    Postgres le convenga recorrerlas enteras. Como sin Seq Scan cualquier índice
+    pasaría, se exige que aparezcan justo los de CONSULTAS_CALIENTES_PG.
+    Devuelve True si todas las consultas los usan.
+    """
+    print("\n[PostgreSQL] 🔎 Verificación de índices (EXPLAIN)")
+    migrar_esquema_postgres(pg_con)
+    
+    todas_ok = True
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for nombre, (sql, params, esperados) in CONSULTAS_CALIENTES_PG.items():
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            escaneos = _escaneos_plan(cur.fetchone()[0][0]['Plan'])
+            secuenciales = sorted({tabla for tabla, tipo, _ in escaneos if tipo == 'Seq Scan' and tabla in esperados})
+            indices = sorted({indice for *_, indice in escaneos if indice})
+            faltantes = sorted({indice for tabla in esperados for indice in esperados[tabla]} - set(indices))
+            if secuenciales or faltantes:
+                todas_ok = False
+                problemas = []
+                if secuenciales:
+                    problemas.append(f"Seq Scan en {', '.join(secuenciales)}")
+                if faltantes:
+                    problemas.append(f"no usa {', '.join(faltantes)}")
+                print(f"    ❌ {nombre}: {'; '.join(problemas)} (usa: {', '.join(indices) or 'ningún índice'})")
+            else:
+                print(f"    ✔️ {nombre}: {', '.join(indices)}")
+        cur.close()
+        conn.rollback()
+    return todas_ok
+
 # ====================================
 #   LÓGICA DE CASSANDRA (Casos 5-6)
 #   Usando Astra DB REST API
@@ -872,141 +2658,194 @@ def crear_tablas_cassandra(astra_db):
         except Exception:
             print("ℹ️  Colección 'transacciones_por_usuario_fecha' ya existe.")
         
+        # Watermarks de la sincronización incremental
+        try:
+            astra_db.create_collection("sync_estado")
+            print("✅ Colección 'sync_estado' creada.")
+        except Exception:
+            print("ℹ️  Colección 'sync_estado' ya existe.")
+        
         return True
     except Exception as e:
         print(f"❌ Error al crear colecciones en Cassandra: {e}")
         return False
 
-def sync_manos_to_cassandra(pg_con, astra_db):
-    """Sincroniza manos desde PostgreSQL a Cassandra usando astrapy"""
+# Documentos por petición insertMany (el Data API admite hasta 100) y peticiones en vuelo a la vez
+ASTRA_BATCH_SIZE = int(os.getenv("ASTRA_BATCH_SIZE", "50"))
+ASTRA_WORKERS = int(os.getenv("ASTRA_WORKERS", "8"))
+# replace_one en vuelo a la vez por lote para los documentos cuyo _id ya existía
+ASTRA_REEMPLAZOS = int(os.getenv("ASTRA_REEMPLAZOS", "8"))
+
+def _upsert_lote_astra(collection, lote, destino='astra'):
+    """Inserta un lote de documentos con _id determinista; los que ya existían se reemplazan"""
+    METRICAS.observar('lote_filas', len(lote), destino=destino)
+    try:
+        collection.insert_many(lote, ordered=False, chunk_size=len(lote), concurrency=1)
+        return len(lote), 0
+    except astrapy_exceptions.CollectionInsertManyException as e:
+        insertados = set(e.inserted_ids)
+    
+    # Sólo los documentos que chocaron con un _id existente pagan una segunda
+    # petición, y esas viajan a la vez (como en etl_async._escribir_astra)
+    chocados = [doc for doc in lote if doc["_id"] not in insertados]
+    if chocados:
+        METRICAS.sumar('reintentos_total', len(chocados), destino=destino, motivo='colision_id')
+    with ThreadPoolExecutor(max_workers=max(min(len(chocados), ASTRA_REEMPLAZOS), 1)) as pool:
+        resultados = list(pool.map(lambda doc: collection.replace_one({"_id": doc["_id"]}, doc, upsert=True), chocados))
+    nuevos = len(insertados) + sum(1 for r in resultados if r.update_info.get("upserted") is not None)
+    actualizados = sum(1 for r in resultados
+                       if r.update_info.get("upserted") is None and r.update_info.get("nModified"))
+    return nuevos, actualizados
+
+def _bulk_upsert_astra(collection, docs, batch_size=ASTRA_BATCH_SIZE, workers=ASTRA_WORKERS, destino='astra'):
+    """Upsert ciego por _id en lotes, repartidos entre un pool acotado de hilos.
+
+    Como mucho hay 2 * `workers` lotes pendientes, así que el generador de
+    entrada no se adelanta más de eso a la escritura. Devuelve (insertados, actualizados).
+    """
+    insertados = 0
+    actualizados = 0
+    pendientes = set()
+    
+    def _recoger(terminados):
+        nonlocal insertados, actualizados
+        for futuro in terminados:
+            nuevos, cambiados = futuro.result()
+            insertados += nuevos
+            actualizados += cambiados
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        lote = []
+        for doc in docs:
+            lote.append(doc)
+            if len(lote) >= batch_size:
+                pendientes.add(pool.submit(_upsert_lote_astra, collection, lote, destino))
+                lote = []
+                if len(pendientes) >= workers * 2:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    _recoger(terminados)
+        if lote:
+            pendientes.add(pool.submit(_upsert_lote_astra, collection, lote, destino))
+        _recoger(wait(pendientes).done)
+    
+    return insertados, actualizados
+
+def _fecha_astra(fecha_hora):
+    """Normaliza a UTC y devuelve (fecha 'YYYY-MM-DD', fecha_hora ISO)"""
+    if not fecha_hora:
+        fecha_hora = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    if fecha_hora.tzinfo is None:
+        fecha_hora = fecha_hora.replace(tzinfo=datetime.timezone.utc)
+    fecha_str = fecha_hora.strftime("%Y-%m-%d")
+    fecha_iso = fecha_hora.astimezone(datetime.timezone.utc).isoformat()
+    return fecha_str, fecha_iso
+
+def _doc_mano_astra(row):
+    # Fila de SQL_MANOS
+    id_mano, id_mesa, rake, bote_total, fecha_hora, ganador_id, modalidad = row[:7]
+    fecha_str, fecha_iso = _fecha_astra(fecha_hora)
+    return {
+        "_id": f"{id_mesa}_{fecha_str}_{id_mano}",
+        "id_mesa": id_mesa,
+        "fecha": fecha_str,
+        "id_mano": id_mano,
+        "fecha_hora": fecha_iso,
+        "bote_total": float(bote_total) if bote_total else 0.0,
+        "rake": float(rake) if rake else 0.0,
+        "ganador_id": int(ganador_id) if ganador_id else 0,
+        "modalidad": modalidad if modalidad else "Unknown"
+    }
+
+def _doc_transaccion_astra(row):
+    # Fila de SQL_TRANSACCIONES
+    id_trans, id_usuario, _nombre, medio, fecha_hora, monto, estado, tipo = row[:8]
+    fecha_str, fecha_iso = _fecha_astra(fecha_hora)
+    return {
+        "_id": f"{id_usuario}_{fecha_str}_{id_trans}",
+        "id_usuario": id_usuario,
+        "fecha": fecha_str,
+        "id_transaccion": id_trans,
+        "fecha_hora": fecha_iso,
+        "monto": float(monto) if monto else 0.0,
+        "tipo": tipo if tipo else "Unknown",
+        "medio": medio if medio else "Unknown",
+        "estado": estado if estado else "Unknown"
+    }
+
+def _marca_astra(astra_db, nombre_coleccion, incremental=True):
+    if not incremental:
+        return WATERMARK_INICIAL
+    return _leer_watermark(astra_db.get_collection("sync_estado"), nombre_coleccion)
+
+def _cargar_astra(astra_db, nombre_coleccion, doc_fn, filas, marca, destino):
+    collection = astra_db.get_collection(nombre_coleccion)
+    estado = astra_db.get_collection("sync_estado")
+    return _cargar(filas, doc_fn,
+                   lambda docs: _bulk_upsert_astra(collection, docs, destino=destino),
+                   marca,
+                   lambda m: _guardar_watermark(estado, nombre_coleccion, m),
+                   destino=destino)
+
+def _cargar_manos_astra(astra_db, filas, marca):
+    return _cargar_astra(astra_db, "manos_por_fecha_mesa", _doc_mano_astra, filas, marca, 'astra:manos')
+
+def _cargar_transacciones_astra(astra_db, filas, marca):
+    return _cargar_astra(astra_db, "transacciones_por_usuario_fecha", _doc_transaccion_astra, filas, marca,
+                         'astra:transacciones')
+
+@_instrumentar_sync('astra:manos')
+def sync_manos_to_cassandra(pg_con, astra_db, incremental=True):
+    """Sincroniza manos desde PostgreSQL a Cassandra usando astrapy (incremental por defecto)"""
     print("🔄 Sincronizando manos a Cassandra...")
     try:
         # Crear colecciones si no existen
         crear_tablas_cassandra(astra_db)
+        marca = _marca_astra(astra_db, "manos_por_fecha_mesa", incremental)
         
-        cur = pg_con.cursor()
-        cur.execute("""
-            SELECT m.id_mano, m.id_mesa, m.fecha_hora, m.bote_total, 
-                   m.rake, m.ganador_id, m.modalidad
-            FROM mano m
-            ORDER BY m.fecha_hora DESC
-        """)
-        
-        manos = cur.fetchall()
-        cur.close()
-        
-        collection = astra_db.get_collection("manos_por_fecha_mesa")
-        
-        inserted = 0
-        updated = 0
-        for row in manos:
-            id_mano, id_mesa, fecha_hora, bote_total, rake, ganador_id, modalidad = row
-            if not fecha_hora:
-                fecha_hora = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
-            if fecha_hora.tzinfo is None:
-                fecha_hora = fecha_hora.replace(tzinfo=datetime.timezone.utc)
-            fecha_str = fecha_hora.strftime("%Y-%m-%d")
-            fecha_iso = fecha_hora.astimezone(datetime.timezone.utc).isoformat()
-            doc_id = f"{id_mesa}_{fecha_str}_{id_mano}"
-            documento_base = {
-                "id_mesa": id_mesa,
-                "fecha": fecha_str,
-                "id_mano": id_mano,
-                "fecha_hora": fecha_iso,
-                "bote_total": float(bote_total) if bote_total else 0.0,
-                "rake": float(rake) if rake else 0.0,
-                "ganador_id": int(ganador_id) if ganador_id else 0,
-                "modalidad": modalidad if modalidad else "Unknown"
-            }
-            # Ver si existe
-            existing = collection.find_one({"_id": doc_id})
-            if existing:
-                # Actualizar sin tocar _id
-                result = collection.update_one({"_id": doc_id}, {"$set": documento_base})
-                if result.modified_count:
-                    updated += 1
-            else:
-                documento_full = {"_id": doc_id, **documento_base}
-                collection.insert_one(documento_full)
-                inserted += 1
-        print(f"✅ Manos Cassandra: {inserted} nuevas, {updated} actualizadas, total leídas {len(manos)}")
+        manos = _stream_query(pg_con, SQL_MANOS, _params_watermark(marca))
+        inserted, updated, leidas = _cargar_manos_astra(astra_db, manos, marca)
+        print(f"✅ Manos Cassandra: {inserted} nuevas, {updated} actualizadas, total leídas {leidas}")
         return True
     except Exception as e:
         print(f"❌ Error sincronizando manos: {e}")
         return False
 
-def sync_transacciones_to_cassandra(pg_con, astra_db):
-    """Sincroniza transacciones desde PostgreSQL a Cassandra usando astrapy"""
+@_instrumentar_sync('astra:transacciones')
+def sync_transacciones_to_cassandra(pg_con, astra_db, incremental=True):
+    """Sincroniza transacciones desde PostgreSQL a Cassandra usando astrapy (incremental por defecto)"""
     print("🔄 Sincronizando transacciones a Cassandra...")
     try:
         # Crear colecciones si no existen
         crear_tablas_cassandra(astra_db)
+        marca = _marca_astra(astra_db, "transacciones_por_usuario_fecha", incremental)
         
-        cur = pg_con.cursor()
-        cur.execute("""
-            SELECT t.id_transaccion, t.id_usuario, t.fecha, t.monto, 
-                   t.tipo, t.estado, mp.tipo as medio
-            FROM transaccion t
-            JOIN metodo_pago mp ON t.id_metodo = mp.id_metodo
-            ORDER BY t.fecha DESC
-        """)
-        
-        transacciones = cur.fetchall()
-        cur.close()
-        
-        collection = astra_db.get_collection("transacciones_por_usuario_fecha")
-        
-        inserted = 0
-        updated = 0
-        for row in transacciones:
-            id_trans, id_usuario, fecha_hora, monto, tipo, estado, medio = row
-            if not fecha_hora:
-                fecha_hora = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
-            if fecha_hora.tzinfo is None:
-                fecha_hora = fecha_hora.replace(tzinfo=datetime.timezone.utc)
-            fecha_str = fecha_hora.strftime("%Y-%m-%d")
-            fecha_iso = fecha_hora.astimezone(datetime.timezone.utc).isoformat()
-            doc_id = f"{id_usuario}_{fecha_str}_{id_trans}"
-            documento_base = {
-                "id_usuario": id_usuario,
-                "fecha": fecha_str,
-                "id_transaccion": id_trans,
-                "fecha_hora": fecha_iso,
-                "monto": float(monto) if monto else 0.0,
-                "tipo": tipo if tipo else "Unknown",
-                "medio": medio if medio else "Unknown",
-                "estado": estado if estado else "Unknown"
-            }
-            existing = collection.find_one({"_id": doc_id})
-            if existing:
-                result = collection.update_one({"_id": doc_id}, {"$set": documento_base})
-                if result.modified_count:
-                    updated += 1
-            else:
-                documento_full = {"_id": doc_id, **documento_base}
-                collection.insert_one(documento_full)
-                inserted += 1
-        print(f"✅ Transacciones Cassandra: {inserted} nuevas, {updated} actualizadas, total leídas {len(transacciones)}")
+        transacciones = _stream_query(pg_con, SQL_TRANSACCIONES, _params_watermark(marca))
+        inserted, updated, leidas = _cargar_transacciones_astra(astra_db, transacciones, marca)
+        print(f"✅ Transacciones Cassandra: {inserted} nuevas, {updated} actualizadas, total leídas {leidas}")
         return True
     except Exception as e:
         print(f"❌ Error sincronizando transacciones: {e}")
         return False
 
+def consulta_caso5(astra_db, id_mesa, fecha_str):
+    collection = astra_db.get_collection("manos_por_fecha_mesa")
+    return list(collection.find({"id_mesa": id_mesa, "fecha": fecha_str}))
+
+def consulta_caso6(astra_db, id_usuario, fecha_str):
+    collection = astra_db.get_collection("transacciones_por_usuario_fecha")
+    return list(collection.find({"id_usuario": id_usuario, "fecha": fecha_str}))
+
 def caso5_manos_por_fecha_mesa(pg_con, astra_db):
     print("\n[Cassandra] 🃏 5. Manos por fecha y mesa")
     
-    # 1. ETL bajo demanda
-    print("🔄 Cargando datos desde PostgreSQL...")
-    sync_manos_to_cassandra(pg_con, astra_db)
-    
-    # 2. Pedir datos
+    # 1. Pedir datos
     id_mesa = int(ask("ID Mesa"))
     fecha_str = ask("Fecha (YYYY-MM-DD)")
     
-    # 3. Ejecutar consulta en Cassandra usando astrapy
+    # 2. ETL bajo demanda + consulta en Cassandra usando astrapy
+    print("🔄 Cargando datos desde PostgreSQL...")
     try:
-        collection = astra_db.get_collection("manos_por_fecha_mesa")
-        resultados = list(collection.find({"id_mesa": id_mesa, "fecha": fecha_str}))
+        resultados = ejecutar_caso(pg_con, astra_db, 'caso5', {'id_mesa': id_mesa, 'fecha': fecha_str})
         
         if resultados:
             print(f"\nManos en mesa {id_mesa} el {fecha_str}:")
@@ -1024,18 +2863,14 @@ def caso5_manos_por_fecha_mesa(pg_con, astra_db):
 def caso6_transacciones_por_usuario_fecha(pg_con, astra_db):
     print("\n[Cassandra] 💳 6. Transacciones por usuario y fecha")
     
-    # 1. ETL bajo demanda
-    print("🔄 Cargando datos desde PostgreSQL...")
-    sync_transacciones_to_cassandra(pg_con, astra_db)
-    
-    # 2. Pedir datos
+    # 1. Pedir datos
     id_usuario = int(ask("ID Usuario"))
     fecha_str = ask("Fecha (YYYY-MM-DD)")
     
-    # 3. Ejecutar consulta en Cassandra usando astrapy
+    # 2. ETL bajo demanda + consulta en Cassandra usando astrapy
+    print("🔄 Cargando datos desde PostgreSQL...")
     try:
-        collection = astra_db.get_collection("transacciones_por_usuario_fecha")
-        resultados = list(collection.find({"id_usuario": id_usuario, "fecha": fecha_str}))
+        resultados = ejecutar_caso(pg_con, astra_db, 'caso6', {'id_usuario': id_usuario, 'fecha': fecha_str})
         
         if resultados:
             print(f"\nTransacciones de usuario {id_usuario} el {fecha_str}:")
@@ -1065,113 +2900,1004 @@ def caso6_transacciones_por_usuario_fecha(pg_con, astra_db):
     except Exception as e:
         print(f"❌ Error en consulta: {e}")
 
+# ====================================
+#   ETL COMPLETO (una extracción, todos los destinos)
+# ====================================
+
+# Lotes de PG_FETCH_SIZE filas que pueden esperar en la cola de cada destino
+ORQUESTADOR_COLA_LOTES = int(os.getenv("ORQUESTADOR_COLA_LOTES", "4"))
+
+# Tareas del orquestador que componen cada modelo de lectura de FUENTES_MODELOS
+TAREAS_MODELOS = {
+    'mongo:usuarios': ('mongo:usuarios',),
+    'mongo:manos': ('mongo:manos',),
+    'mongo:transacciones': ('mongo:transacciones',),
+    'astra:manos': ('astra:manos',),
+    'astra:transacciones': ('astra:transacciones',),
+    'neo4j:usuarios_mesas': ('neo4j:usuarios', 'neo4j:mesas', 'neo4j:relaciones'),
+}
+
+_FIN_FLUJO = object()
+_ERROR_FLUJO = object()
+
+def _filas_de_cola(cola, estado):
+    while True:
+        lote = cola.get()
+        if lote is _FIN_FLUJO or lote is _ERROR_FLUJO:
+            estado['cerrada'] = True
+            if lote is _ERROR_FLUJO:
+                raise RuntimeError("La extracción desde PostgreSQL se interrumpió")
+            return
+        yield from lote
+
+def _consumir_cola(cola, cargar_fn, dependencias):
+    """Tarea de un destino: espera a sus dependencias y carga las filas que llegan por `cola`"""
+    estado = {'cerrada': False}
+    try:
+        for dependencia in dependencias:
+            dependencia.result()  # Propaga el error si la dependencia falló
+        inicio = time.perf_counter()
+        resultado = cargar_fn(_filas_de_cola(cola, estado))
+        return resultado, time.perf_counter() - inicio
+    finally:
+        # Si el destino falló a medias, seguir vaciando la cola para no bloquear la extracción
+        while not estado['cerrada']:
+            lote = cola.get()
+            estado['cerrada'] = lote is _FIN_FLUJO or lote is _ERROR_FLUJO
+
+def _difundir(filas, colas):
+    """Reparte las filas de una extracción entre las colas de todos sus destinos"""
+    try:
+        for lote in _lotes(filas, PG_FETCH_SIZE):
+            for cola in colas:
+                cola.put(lote)
+    except Exception:
+        for cola in colas:
+            cola.put(_ERROR_FLUJO)
+        raise
+    for cola in colas:
+        cola.put(_FIN_FLUJO)
+
+def _cargador_con_marca(cargar, destino, marca):
+    return lambda filas: cargar(destino, filas, marca)
+
+def _marca_minima(marcas):
+    return min(marcas)
+
+def _modelos_de_destinos(mongo, astra, neo4j):
+    """Modelos de lectura de FUENTES_MODELOS que actualiza un sync con esos destinos"""
+    modelos = []
+    if mongo:
+        modelos += ['mongo:usuarios', 'mongo:manos', 'mongo:transacciones']
+    if astra:
+        modelos += ['astra:manos', 'astra:transacciones']
+    if neo4j:
+        modelos.append('neo4j:usuarios_mesas')
+    return modelos
+
+@_instrumentar_sync('sync_todo')
+def sync_todo(pg_con, mongo_db=None, astra_db=None, neo4j_driver=None, incremental=True):
+    """Sincroniza todos los modelos de lectura leyendo cada tabla de PostgreSQL una sola vez.
+
+    Las filas de cada extracción se reparten por colas acotadas entre los
+    cargadores de Mongo, Astra y Neo4j, que corren en paralelo: el tiempo total
+    lo marca el destino más lento y no la suma de todos. Si `pg_con` es un
+    PoolPostgres, además las tablas se extraen en paralelo.
+    """
+    print("🔄 Sincronizando todos los destinos (una extracción por tabla)...")
+    inicio = time.perf_counter()
+    
+    # Preparar destinos
+    if mongo_db is not None:
+        _asegurar_indices_una_vez(mongo_db)
+    if astra_db is not None:
+        crear_tablas_cassandra(astra_db)
+    if neo4j_driver is not None:
+        _crear_constraints_neo4j(neo4j_driver)
+    
+    # Modelos de lectura involucrados (para registrar su frescura al terminar)
+    versiones = {}
+    for modelo in _modelos_de_destinos(mongo_db is not None, astra_db is not None, neo4j_driver is not None):
+        try:
+            versiones[modelo] = version_fuentes(pg_con, FUENTES_MODELOS[modelo])
+        except Exception as e:
+            print(f"⚠️ No se pudo leer la versión de las fuentes de {modelo}: {e}")
+    
+    # Una copia completa a los tres destinos cubre los eventos de la outbox ya
+    # confirmados: se borran al terminar (si no, la outbox sólo se vacía con drenar_outbox)
+    purga = None
+    if not incremental and mongo_db is not None and astra_db is not None and neo4j_driver is not None:
+        purga = _inicio_purga_outbox(pg_con)
+    
+    # Flujos: (tabla, consulta, parámetros, [(tarea, cargador, tareas de las que depende)])
+    flujos = []
+    
+    usuarios = []
+    if mongo_db is not None:
+        usuarios.append(('mongo:usuarios', lambda filas: _cargar_usuarios_mongo(mongo_db, filas), []))
+    if neo4j_driver is not None:
+        usuarios.append(('neo4j:usuarios', lambda filas: _cargar_usuarios_neo4j(neo4j_driver, filas), []))
+    if usuarios:
+        # SQL_USUARIOS también trae id_usuario y nombre, que es todo lo que necesita Neo4j
+        sql = SQL_USUARIOS if mongo_db is not None else "SELECT id_usuario, nombre FROM usuario"
+        flujos.append(('usuario', sql, None, usuarios))
+    
+    if neo4j_driver is not None:
+        flujos.append(('mesa', "SELECT id_mesa, modalidad, tipo FROM mesa", None, [
+            ('neo4j:mesas', lambda filas: _cargar_mesas_neo4j(neo4j_driver, filas), []),
+        ]))
+    
+    for tabla, sql, destinos in (
+        ('mano', SQL_MANOS, [
+            (mongo_db, 'mongo:manos', lambda: _marca_manos_mongo(mongo_db, incremental), _cargar_manos_mongo),
+            (astra_db, 'astra:manos', lambda: _marca_astra(astra_db, "manos_por_fecha_mesa", incremental), _cargar_manos_astra),
+        ]),
+        ('transaccion', SQL_TRANSACCIONES, [
+            (mongo_db, 'mongo:transacciones', lambda: _marca_transacciones_mongo(mongo_db, incremental), _cargar_transacciones_mongo),
+            (astra_db, 'astra:transacciones', lambda: _marca_astra(astra_db, "transacciones_por_usuario_fecha", incremental), _cargar_transacciones_astra),
+        ]),
+    ):
+        consumidores = []
+        marcas = []
+        for destino, tarea, leer_marca, cargar in destinos:
+            if destino is None:
+                continue
+            marca = leer_marca()
+            marcas.append(marca)
+            consumidores.append((tarea, _cargador_con_marca(cargar, destino, marca), []))
+        if consumidores:
+            # Se extrae desde la marca más atrasada; el upsert hace inocuo releer filas
+            flujos.append((tabla, sql, _params_watermark(_marca_minima(marcas)), consumidores))
+    
+    if neo4j_driver is not None:
+        # Va al final: sus aristas esperan a que existan los nodos de usuarios y mesas
+        flujos.append(('usuario_mesa', "SELECT id_usuario, id_mesa FROM usuario_mesa", None, [
+            ('neo4j:relaciones', lambda filas: _cargar_relaciones_neo4j(neo4j_driver, filas),
+             ['neo4j:usuarios', 'neo4j:mesas']),
+        ]))
+    
+    def _extraer(tabla, sql, params, colas):
+        try:
+            _difundir(_stream_query(pg_con, sql, params), colas)
+        except Exception as e:
+            print(f"❌ Error extrayendo '{tabla}' de PostgreSQL: {e}")
+    
+    # Con un PoolPostgres cada tabla se extrae por su propia conexión y en paralelo;
+    # con una conexión suelta las extracciones van una detrás de otra
+    paralelo = isinstance(pg_con, PoolPostgres)
+    extractores = min(len(flujos), pg_con.maximo) if paralelo else 1
+    
+    tareas = {}
+    total_tareas = sum(len(consumidores) for *_, consumidores in flujos)
+    with ThreadPoolExecutor(max_workers=max(total_tareas, 1)) as pool, \
+            ThreadPoolExecutor(max_workers=max(extractores, 1)) as pool_extraccion:
+        for tabla, sql, params, consumidores in flujos:
+            colas = []
+            for tarea, cargar_fn, dependencias in consumidores:
+                cola = queue.Queue(maxsize=ORQUESTADOR_COLA_LOTES)
+                colas.append(cola)
+                tareas[tarea] = pool.submit(_consumir_cola, cola, cargar_fn, [tareas[d] for d in dependencias])
+            if paralelo:
+                pool_extraccion.submit(_extraer, tabla, sql, params, colas)
+            else:
+                _extraer(tabla, sql, params, colas)
+        wait(tareas.values())
+    
+    fallidas = set()
+    for tarea, futuro in tareas.items():
+        try:
+            resultado, segundos = futuro.result()
+        except Exception as e:
+            fallidas.add(tarea)
+            print(f"❌ {tarea}: {e}")
+            continue
+        if isinstance(resultado, tuple):
+            insertados, actualizados, leidas = resultado
+            print(f"✅ {tarea}: {insertados} nuevos, {actualizados} actualizados, {leidas} leídos ({segundos:.2f}s)")
+        else:
+            print(f"✅ {tarea}: {resultado} filas ({segundos:.2f}s)")
+    
+    _registrar_frescura(pg_con, {modelo: version for modelo, version in versiones.items()
+                                 if not fallidas.intersection(TAREAS_MODELOS[modelo])})
+    if purga is not None and not fallidas:
+        _purgar_outbox(pg_con, purga)
+    if not fallidas:
+        podar_outbox(pg_con)
+    
+    print(f"⏱️  Sincronización completa en {time.perf_counter() - inicio:.2f}s")
+    return not fallidas
+
+# ====================================
+#   CDC: OUTBOX + LISTEN/NOTIFY
+# ====================================
+
+# Eventos de etl_outbox que se aplican por transacción
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "500"))
+# Segundos máximos sin NOTIFY antes de revisar la outbox igualmente
+OUTBOX_ESPERA = float(os.getenv("OUTBOX_ESPERA", "5"))
+# Días que se guardan los eventos que nadie consumió (0 = no podar). Sin consumidor
+# CDC los triggers siguen escribiendo en la outbox y, si no, crecería sin límite
+OUTBOX_RETENCION_DIAS = int(os.getenv("OUTBOX_RETENCION_DIAS", "7"))
+
+CYPHER_BORRAR_USUARIOS = """
+    UNWIND $rows AS row
+    MATCH (u:Usuario {id_usuario: row.id_usuario})
+    DETACH DELETE u
+"""
+
+CYPHER_BORRAR_MESAS = """
+    UNWIND $rows AS row
+    MATCH (m:Mesa {id_mesa: row.id_mesa})
+    DETACH DELETE m
+"""
+
+CYPHER_BORRAR_JUGO_EN = """
+    UNWIND $rows AS row
+    MATCH (:Usuario {id_usuario: row.id_usuario})-[r:JUGO_EN]->(:Mesa {id_mesa: row.id_mesa})
+    DELETE r
+"""
+
+SQL_RELACIONES_POR_ID = """
+    SELECT um.id_usuario, um.id_mesa
+    FROM usuario_mesa um
+    JOIN unnest(%s::int[], %s::int[]) AS p(id_usuario, id_mesa)
+      ON um.id_usuario = p.id_usuario AND um.id_mesa = p.id_mesa
+"""
+
+def _afectados_outbox(eventos):
+    """Traduce los eventos (tabla, clave) a los ids de cada modelo de lectura que hay que refrescar"""
+    afectados = {'usuarios': set(), 'mesas': set(), 'manos': set(), 'transacciones': set(), 'relaciones': set()}
+    for tabla, clave in eventos:
+        if tabla == 'usuario':
+            afectados['usuarios'].add(clave['id_usuario'])
+        elif tabla == 'mesa':
+            afectados['mesas'].add(clave['id_mesa'])
+        elif tabla == 'transaccion':
+            afectados['transacciones'].add(clave['id_transaccion'])
+            afectados['usuarios'].add(clave['id_usuario'])  # balance_neto
+        elif tabla == 'mano':
+            afectados['manos'].add(clave['id_mano'])
+            if clave['ganador_id'] is not None:
+                afectados['usuarios'].add(clave['ganador_id'])  # ganancias y manos ganadas
+        elif tabla == 'usuario_mano':
+            afectados['usuarios'].add(clave['id_usuario'])  # manos jugadas
+        elif tabla == 'usuario_mesa':
+            afectados['relaciones'].add((clave['id_usuario'], clave['id_mesa']))
+    return afectados
+
+def _aplicar_outbox(conn, eventos, mongo_db=None, astra_db=None, neo4j_driver=None):
+    """Relee de PostgreSQL las filas afectadas por `eventos` y las lleva a los destinos.
+
+    Usa los mismos documentos y cargadores que el ETL; una fila que ya no
+    existe en PostgreSQL se borra del destino. Devuelve {modelo: filas refrescadas}.
+    """
+    afectados = _afectados_outbox(eventos)
+    aplicados = {}
+    cur = conn.cursor()
+    
+    # (modelo, consulta por id, [(destino, cargar(destino, filas), borrar(destino, ids))])
+    # Usuarios y mesas van antes que las relaciones de Neo4j, que necesitan sus nodos
+    refrescos = [
+        ('usuarios', SQL_USUARIOS_POR_ID, [
+            (mongo_db, _cargar_usuarios_mongo,
+             lambda db, ids: db.usuarios.delete_many({'id_usuario': {'$in': ids}})),
+            (neo4j_driver, _cargar_usuarios_neo4j,
+             lambda drv, ids: _unwind_neo4j(drv, CYPHER_BORRAR_USUARIOS, ({'id_usuario': i} for i in ids),
+                                            destino='neo4j:borrados')),
+        ]),
+        ('mesas', "SELECT id_mesa, modalidad, tipo FROM mesa WHERE id_mesa = ANY(%s)", [
+            (neo4j_driver, _cargar_mesas_neo4j,
+             lambda drv, ids: _unwind_neo4j(drv, CYPHER_BORRAR_MESAS, ({'id_mesa': i} for i in ids),
+                                            destino='neo4j:borrados')),
+        ]),
+        ('manos', SQL_MANOS_POR_ID, [
+            (mongo_db, lambda db, filas: _cargar_manos_mongo(db, filas, None),
+             lambda db, ids: db.manos.delete_many({'id_mano': {'$in': ids}})),
+            (astra_db, lambda db, filas: _cargar_manos_astra(db, filas, None),
+             lambda db, ids: db.get_collection("manos_por_fecha_mesa").delete_many({'id_mano': {'$in': ids}})),
+        ]),
+        ('transacciones', SQL_TRANSACCIONES_POR_ID, [
+            (mongo_db, lambda db, filas: _cargar_transacciones_mongo(db, filas, None),
+             lambda db, ids: db.transacciones.delete_many({'id_transaccion': {'$in': ids}})),
+            (astra_db, lambda db, filas: _cargar_transacciones_astra(db, filas, None),
+             lambda db, ids: db.get_collection("transacciones_por_usuario_fecha").delete_many({'id_transaccion': {'$in': ids}})),
+        ]),
+    ]
+    for modelo, sql, destinos in refrescos:
+        ids = afectados[modelo]
+        destinos = [d for d in destinos if d[0] is not None]
+        if not ids or not destinos:
+            continue
+        cur.execute(sql, (sorted(ids),))
+        filas = cur.fetchall()
+        borrados = sorted(ids - {row[0] for row in filas})
+        for destino, cargar, borrar in destinos:
+            cargar(destino, filas)
+            if borrados:
+                borrar(destino, borrados)
+                if destino is mongo_db:
+                    _datos_cambiaron(f"mongo:{modelo}")
+                elif destino is astra_db:
+                    _datos_cambiaron(f"astra:{modelo}")
+        aplicados[modelo] = len(ids)
+    
+    if afectados['relaciones'] and neo4j_driver is not None:
+        pares = sorted(afectados['relaciones'])
+        cur.execute(SQL_RELACIONES_POR_ID, ([u for u, _ in pares], [m for _, m in pares]))
+        existentes = cur.fetchall()
+        _cargar_relaciones_neo4j(neo4j_driver, existentes)
+        borradas = afectados['relaciones'] - set(existentes)
+        if borradas:
+            _unwind_neo4j(neo4j_driver, CYPHER_BORRAR_JUGO_EN, (
+                {'id_usuario': u, 'id_mesa': m} for u, m in borradas
+            ), destino='neo4j:borrados')
+        aplicados['relaciones'] = len(pares)
+    
+    cur.close()
+    return aplicados
+
+@_instrumentar_sync('outbox')
+def drenar_outbox(pg_con, mongo_db=None, astra_db=None, neo4j_driver=None, lote=OUTBOX_LOTE, redis_con=None):
+    """Aplica todos los eventos pendientes de etl_outbox, de a `lote` por transacción.
+
+    Los eventos se borran en la misma transacción en que se leen (con SKIP
+    LOCKED, así varios consumidores no se pisan) y sólo se confirma después de
+    escribir en los destinos: si un destino falla, los eventos vuelven a la
+    outbox y se reintentan. Con `redis_con` además se invalida el balance en
+    caché de cada usuario modificado, aunque el cambio no haya pasado por esta
+    aplicación. Devuelve la cantidad de eventos aplicados. La otra forma en que
+    la outbox se vacía es sync_todo completo con los tres destinos (ver _purgar_outbox).
+    """
+    total = 0
+    while True:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM etl_outbox
+                WHERE id_evento IN (
+                    SELECT id_evento FROM etl_outbox
+                    ORDER BY id_evento
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING tabla, clave
+            """, (lote,))
+            eventos = cur.fetchall()
+            cur.close()
+            aplicados = _aplicar_outbox(conn, eventos, mongo_db, astra_db, neo4j_driver) if eventos else {}
+            if redis_con is not None:
+                invalidar_balances(redis_con, {clave['id_usuario'] for tabla, clave in eventos if tabla == 'usuario'})
+            conn.commit()
+        
+        if not eventos:
+            return total
+        total += len(eventos)
+        print(f"🔁 CDC: {len(eventos)} eventos → " + ", ".join(f"{n} {modelo}" for modelo, n in aplicados.items()))
+        if len(eventos) < lote:
+            return total
+
+def _escuchar_outbox():
+    """Conexión dedicada (autocommit) suscrita al canal 'etl_outbox'"""
+    escucha = get_postgres(avisar=False)
+    if escucha is None:
+        return None
+    escucha.autocommit = True
+    cur = escucha.cursor()
+    cur.execute("LISTEN etl_outbox")
+    cur.close()
+    return escucha
+
+def consumir_outbox(pg_con, mongo_db=None, astra_db=None, neo4j_driver=None, redis_con=None):
+    """Consumidor CDC de larga duración: drena la outbox cada vez que llega un NOTIFY.
+
+    Si no llega ningún aviso en OUTBOX_ESPERA segundos revisa la outbox igual
+    (eventos anteriores al arranque o de un drenaje que falló). Se detiene con Ctrl+C.
+    """
+    escucha = _escuchar_outbox()
+    if escucha is None:
+        return False
+    print("👂 Escuchando cambios de PostgreSQL (Ctrl+C para volver al menú)...")
+    try:
+        while True:
+            try:
+                drenar_outbox(pg_con, mongo_db, astra_db, neo4j_driver, redis_con=redis_con)
+            except Exception as e:
+                METRICAS.sumar('reintentos_total', destino='outbox', motivo='error')
+                print(f"❌ Error aplicando la outbox (se reintenta): {e}")
+            
+            try:
+                if select.select([escucha], [], [], OUTBOX_ESPERA) != ([], [], []):
+                    escucha.poll()
+                    escucha.notifies.clear()  # Basta con saber que hay algo: se drena todo
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                print(f"⚠️ Se perdió la conexión de LISTEN ({e}); se reconecta.")
+                escucha.close()
+                escucha = _escuchar_outbox()
+                if escucha is None:
+                    return False
+    except KeyboardInterrupt:
+        print("\n⏹️  Consumidor CDC detenido.")
+        return True
+    finally:
+        if escucha is not None:
+            escucha.close()
+
+# Hasta dónde cubre la outbox una sincronización completa que empieza: el último
+# evento y el xmin de su snapshot. Los eventos con xid menor ya estaban confirmados
+# y las extracciones, que empiezan después, ven sus cambios; los de transacciones
+# todavía abiertas (aunque tengan un id_evento menor) se conservan.
+SQL_INICIO_PURGA_OUTBOX = """
+    SELECT (SELECT coalesce(max(id_evento), 0) FROM etl_outbox),
+           pg_snapshot_xmin(pg_current_snapshot())::text
+"""
+# Los eventos DELETE se conservan: el ETL completo no borra nada en los destinos
+SQL_PURGA_OUTBOX = """
+    DELETE FROM etl_outbox
+    WHERE id_evento <= %s AND xid_escritura < %s::xid8 AND operacion <> 'DELETE'
+"""
+
+def _inicio_purga_outbox(pg_con):
+    """Devuelve (último id_evento, xmin) de SQL_INICIO_PURGA_OUTBOX, o None si no se pudo leer"""
+    try:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_INICIO_PURGA_OUTBOX)
+            purga = cur.fetchone()
+            cur.close()
+            conn.rollback()
+        return purga
+    except Exception as e:
+        print(f"⚠️ No se pudo preparar la purga de la outbox: {e}")
+        return None
+
+def _purgar_outbox(pg_con, purga):
+    """Borra los eventos que cubrió la sincronización completa que terminó bien.
+
+    Corre en una transacción corta al final: durante la sincronización no
+    queda ningún DELETE abierto que frene el vacuum o bloquee a drenar_outbox.
+    """
+    try:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_PURGA_OUTBOX, purga)
+            eventos = cur.rowcount
+            conn.commit()
+            cur.close()
+        if eventos:
+            print(f"🧹 Outbox: {eventos} eventos ya cubiertos por la sincronización completa.")
+    except Exception as e:
+        print(f"⚠️ No se pudo purgar la outbox: {e}")
+
+# Se conserva el último evento de cada tabla: es el contador de VERSION_FUENTES
+SQL_PODA_OUTBOX = """
+    DELETE FROM etl_outbox o
+    WHERE o.creado_en < NOW() - make_interval(days => %s)
+      AND o.id_evento < (SELECT max(id_evento) FROM etl_outbox WHERE tabla = o.tabla)
+"""
+
+def podar_outbox(pg_con, dias=OUTBOX_RETENCION_DIAS):
+    """Borra los eventos de etl_outbox con más de `dias` días que ningún consumidor aplicó.
+
+    sync_todo la llama al terminar bien, así la outbox queda acotada aunque no
+    corra ningún consumidor CDC. Un consumidor detenido más tiempo que eso
+    pierde los eventos viejos: las altas y cambios los repone un sync completo,
+    los borrados no. Devuelve la cantidad de eventos borrados.
+    """
+    if dias <= 0:
+        return 0
+    try:
+        with _usar_conexion(pg_con) as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_PODA_OUTBOX, (dias,))
+            eventos = cur.rowcount
+            conn.commit()
+            cur.close()
+        if eventos:
+            print(f"🧹 Outbox: {eventos} eventos con más de {dias} días descartados.")
+        return eventos
+    except Exception as e:
+        print(f"⚠️ No se pudo podar la outbox: {e}")
+        return 0
+
 # ====================================
 #   3. LÓGICA DE REDIS (Casos 7-8)
 # ====================================
 
+# Un sorted set por día (ranking_activos:YYYY-MM-DD) con las manos jugadas por
+# usuario. Los días vencen solos; las ventanas se arman uniendo días
+RANKING_RETENCION_DIAS = int(os.getenv("RANKING_RETENCION_DIAS", "30"))
+RANKING_VENTANA_TTL = int(os.getenv("RANKING_VENTANA_TTL", "60"))
+RANKING_VENTANAS = (1, 7, 30)
+
+def _clave_ranking_dia(fecha):
+    return f"ranking_activos:{fecha.isoformat()}"
+
+def registrar_actividad(r, eventos):
+    """Suma manos jugadas a los rankings diarios. `eventos`: (fecha, id_usuario, manos).
+
+    Cada día vence RANKING_RETENCION_DIAS días después de terminar; los
+    eventos de días que ya vencieron se descartan.
+    """
+    conteos = {}
+    for fecha, id_usuario, manos in eventos:
+        clave = (fecha, str(id_usuario))
+        conteos[clave] = conteos.get(clave, 0) + manos
+    
+    hoy = datetime.date.today()
+    vencimientos = {}
+    with r.pipeline(transaction=False) as pipe:
+        for (fecha, id_usuario), manos in conteos.items():
+            if (hoy - fecha).days >= RANKING_RETENCION_DIAS:
+                continue
+            # ZINCRBY: Incrementa el score del 'id_usuario' en el ranking del día
+            pipe.zincrby(_clave_ranking_dia(fecha), manos, id_usuario)
+            vencimientos[fecha] = datetime.datetime.combine(
+                fecha + datetime.timedelta(days=RANKING_RETENCION_DIAS + 1), datetime.time())
+        for fecha, vence in vencimientos.items():
+            pipe.expireat(_clave_ranking_dia(fecha), vence)
+        pipe.execute()
+
+def _claves_ventana(dias, hoy=None):
+    """(clave de la ventana, claves diarias que la forman); sin claves diarias si es un solo día"""
+    if not 1 <= dias <= RANKING_RETENCION_DIAS:
+        raise ValueError(f"La ventana debe ser de 1 a {RANKING_RETENCION_DIAS} días")
+    hoy = hoy or datetime.date.today()
+    if dias == 1:
+        return _clave_ranking_dia(hoy), []
+    return (f"ranking_activos:ultimos_{dias}d:{hoy.isoformat()}",
+            [_clave_ranking_dia(hoy - datetime.timedelta(days=i)) for i in range(dias)])
+
+def ranking_ventana(r, dias, hoy=None):
+    """Clave del ranking de los últimos `dias` días (hoy incluido).
+
+    La unión (ZUNIONSTORE de los días) se guarda RANKING_VENTANA_TTL segundos,
+    así las lecturas siguientes son un ZREVRANGE sobre un set ya armado.
+    """
+    clave, dias_ventana = _claves_ventana(dias, hoy)
+    if dias_ventana and not r.exists(clave):
+        with r.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(clave, dias_ventana)
+            pipe.expire(clave, RANKING_VENTANA_TTL)
+            pipe.execute()
+    return clave
+
 # Asume que 'simular_juego' se llama cada vez que un jugador juega una mano
+# (las manos creadas con crear_mano/ingestar_manos ya se registran solas)
 def simular_juego(redis_con):
     print("===================================")
     id_usuario = ask("ID Usuario que jugó una mano")
-    # ZINCRBY: Incrementa el score del 'id_usuario' en el set 'ranking_activos' en 1
-    redis_con.zincrby("ranking_activos", 1, id_usuario)
+    registrar_actividad(redis_con, [(datetime.date.today(), id_usuario, 1)])
     print(f"✔️ Actividad de {id_usuario} registrada en Redis.")
     print("===================================")
 
-def caso7_ranking(r):
-    print("\n[Redis] 🏆 7. Ranking de jugadores activos (Top 5)")
+# Los saldos se invalidan al confirmar cada escritura (crear_transaccion y la
+# outbox CDC), así que la caché puede vivir mucho más que los 5 minutos originales
+BALANCE_TTL = int(os.getenv("BALANCE_TTL", "86400"))
+# Las generaciones tienen que sobrevivir a cualquier lectura en curso
+BALANCE_GEN_TTL = BALANCE_TTL + 3600
+
+def _clave_balance(id_usuario):
+    return f"user_balance:{id_usuario}"
+
+def _clave_generacion_balance(id_usuario):
+    return f"user_balance_gen:{id_usuario}"
+
+# Guarda el saldo leído de PostgreSQL sólo si nadie invalidó la clave desde que se
+# leyó su generación: evita que una lectura lenta pise con un saldo viejo la
+# invalidación de una escritura que confirmó en el medio
+LUA_GUARDAR_BALANCE = """
+local generacion = redis.call('GET', KEYS[2]) or ''
+if generacion ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+def invalidar_balances(r, ids_usuario):
+    """Borra los saldos en caché y sube su generación, todo en un MULTI/EXEC"""
+    ids_usuario = list(ids_usuario)
+    if not ids_usuario:
+        return
+    with r.pipeline(transaction=True) as pipe:
+        for id_usuario in ids_usuario:
+            pipe.incr(_clave_generacion_balance(id_usuario))
+            pipe.expire(_clave_generacion_balance(id_usuario), BALANCE_GEN_TTL)
+            pipe.delete(_clave_balance(id_usuario))
+        pipe.execute()
+
+def _leer_balances(r, pg_con, ids_usuario):
+    """Devuelve ({id_usuario: saldo}, ids servidos desde la caché).
+
+    Una ida y vuelta a Redis (MGET de saldos y generaciones), una sola consulta
+    a PostgreSQL para todos los que faltan y otra ida y vuelta para guardarlos.
+    Los usuarios inexistentes no aparecen en el resultado.
+    """
+    ids_usuario = list(dict.fromkeys(ids_usuario))
+    if not ids_usuario:
+        return {}, set()
+    
+    with r.pipeline(transaction=False) as pipe:
+        pipe.mget([_clave_balance(i) for i in ids_usuario])
+        pipe.mget([_clave_generacion_balance(i) for i in ids_usuario])
+        valores, generaciones = pipe.execute()
+    
+    balances = {}
+    faltantes = {}
+    for id_usuario, valor, generacion in zip(ids_usuario, valores, generaciones):
+        if valor is not None:
+            balances[id_usuario] = float(valor)
+        else:
+            faltantes[id_usuario] = generacion or ''
+    desde_cache = set(balances)
+    if not faltantes:
+        return balances, desde_cache
+    
+    with _usar_conexion(pg_con) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id_usuario, saldo_real FROM usuario WHERE id_usuario = ANY(%s)", (list(faltantes),))
+        filas = cur.fetchall()
+        cur.close()
+        conn.rollback()
+    
+    guardar = r.register_script(LUA_GUARDAR_BALANCE)
+    with r.pipeline(transaction=False) as pipe:
+        for id_usuario, saldo in filas:
+            balances[id_usuario] = float(saldo)
+            guardar(keys=[_clave_balance(id_usuario), _clave_generacion_balance(id_usuario)],
+                    args=[faltantes[id_usuario], balances[id_usuario], BALANCE_TTL], client=pipe)
+        pipe.execute()
+    return balances, desde_cache
+
+def obtener_balances(r, pg_con, ids_usuario):
+    """Saldo real de varios usuarios a la vez: {id_usuario: saldo}"""
+    balances, _desde_cache = _leer_balances(r, pg_con, ids_usuario)
+    return balances
+
+def consulta_caso7(r, top=5, dias=7, hoy=None):
     # ZREVRANGE: Obtener el ranking en orden descendente
-    resultados = r.zrevrange("ranking_activos", 0, 4, withscores=True)
+    return r.zrevrange(ranking_ventana(r, dias, hoy), 0, top - 1, withscores=True)
+
+def consulta_caso8(r, pg_con, id_usuario):
+    """Devuelve (balance, origen) con origen 'cache' o 'postgres'; (None, None) si el usuario no existe"""
+    # Redis primero; si falla, PostgreSQL (Master) y se guarda para la próxima vez
+    balances, desde_cache = _leer_balances(r, pg_con, [id_usuario])
+    if id_usuario not in balances:
+        return None, None
+    return balances[id_usuario], 'cache' if id_usuario in desde_cache else 'postgres'
+
+def caso7_ranking(r, dias=None):
+    if dias is None:
+        dias_input = ask(f"Ventana en días ({'/'.join(map(str, RANKING_VENTANAS))}, vacío para 7)")
+        dias = int(dias_input) if dias_input else 7
+    print(f"\n[Redis] 🏆 7. Ranking de jugadores activos (Top 5, últimos {dias} días)")
+    resultados = ejecutar_caso(None, r, 'caso7', {'top': 5, 'dias': dias})
     print(resultados)
 
 def caso8_balance_cache(r, pg_con):
-    print("\n[Redis] 🧠 8. Balance en cache (TTL 5 min)")
+    print(f"\n[Redis] 🧠 8. Balance en cache (TTL {BALANCE_TTL // 3600} h, invalidado en cada transacción)")
     id_usuario = int(ask("ID Usuario a consultar balance"))
-    user_key = f"user_balance:{id_usuario}"
     
-    # 1. Intentar leer de Redis
-    cached_balance = r.get(user_key)
+    try:
+        balance, origen = ejecutar_caso(pg_con, r, 'caso8', {'id_usuario': id_usuario})
+    except Exception as e:
+        print(f"❌ Error al consultar PostgreSQL: {e}")
+        return
     
-    if cached_balance:
-        print(f"✔️ Balance obtenido DESDE CACHÉ: {cached_balance}")
+    if origen == 'cache':
+        print(f"✔️ Balance obtenido DESDE CACHÉ: {balance}")
+    elif origen == 'postgres':
+        print("... Cache miss. Consultando PostgreSQL ...")
+        print(f"✔️ Balance obtenido DESDE POSTGRES: {balance} (y guardado en caché)")
     else:
-        # 2. Si falla, leer de PostgreSQL (Master)
         print("... Cache miss. Consultando PostgreSQL ...")
-        try:
-            cur = pg_con.cursor()
-            cur.execute("SELECT saldo_real FROM usuario WHERE id_usuario = %s", (id_usuario,))
-            resultado = cur.fetchone()
-            cur.close()
-            
-            if resultado:
-                balance_pg = float(resultado[0])
-                # 3. Guardar en Redis para la próxima vez
-                r.set(user_key, balance_pg, ex=300) # ex=300 -> 5 minutos TTL
-                print(f"✔️ Balance obtenido DESDE POSTGRES: {balance_pg} (y guardado en caché)")
-            else:
-                print(f"❌ Usuario {id_usuario} no encontrado en PostgreSQL.")
-        except Exception as e:
-            print(f"❌ Error al consultar PostgreSQL: {e}")
+        print(f"❌ Usuario {id_usuario} no encontrado en PostgreSQL.")
 
 # ============================================================
 #   4. LÓGICA DE NEO4J (Casos 9-10)
 # ============================================================
 # Asume que 'registrar_jugador_en_mesa' se ha usado varias veces
 
+CYPHER_CASO9 = """
+    MATCH (u:Usuario)-[:JUGO_EN]->(m:Mesa)
+    WITH u, count(DISTINCT m) as mesas_jugadas
+    WHERE mesas_jugadas >= 2
+    RETURN u.id_usuario, u.nombre, mesas_jugadas
+    ORDER BY mesas_jugadas DESC
+"""
+
+CYPHER_CASO10 = """
+    MATCH (u1:Usuario)-[:JUGO_EN]->(m:Mesa)<-[:JUGO_EN]-(u2:Usuario)
+    // Usar propiedad propia para evitar warning de id() deprecado
+    WHERE u1.id_usuario < u2.id_usuario
+    WITH u1, u2, count(m) as mesas_compartidas
+    WHERE mesas_compartidas > 2
+    RETURN u1.id_usuario, u1.nombre, u2.id_usuario, u2.nombre, mesas_compartidas
+    ORDER BY mesas_compartidas DESC
+    LIMIT 5
+"""
+
+def consulta_caso9(driver):
+    with driver.session() as session:
+        return session.run(CYPHER_CASO9).data()
+
+def consulta_caso10(driver):
+    with driver.session() as session:
+        return session.run(CYPHER_CASO10).data()
+
 def caso9_usuarios_dos_mesas(pg_con, driver):
     print("\n[Neo4j] 🎯 9. Usuarios que jugaron en ≥2 mesas distintas")
     
-    # 1. ETL bajo demanda
+    # ETL bajo demanda + consulta
     print("🔄 Cargando relaciones desde PostgreSQL...")
-    sync_usuarios_mesas_to_neo4j(pg_con, driver)
-    
-    # 2. Ejecutar consulta
-    query = """
-        MATCH (u:Usuario)-[:JUGO_EN]->(m:Mesa)
-        WITH u, count(DISTINCT m) as mesas_jugadas
-        WHERE mesas_jugadas >= 2
-        RETURN u.id_usuario, u.nombre, mesas_jugadas
-        ORDER BY mesas_jugadas DESC
-    """
+    resultados = ejecutar_caso(pg_con, driver, 'caso9')
     
-    with driver.session() as session:
-        resultados = session.run(query).data()
-        
-        if resultados:
-            print("\nUsuarios en múltiples mesas:")
-            for r in resultados:
-                print(f"  Usuario {r['u.id_usuario']} ({r['u.nombre']}): {r['mesas_jugadas']} mesas")
-        else:
-            print("  (Sin datos)")
+    if resultados:
+        print("\nUsuarios en múltiples mesas:")
+        for r in resultados:
+            print(f"  Usuario {r['u.id_usuario']} ({r['u.nombre']}): {r['mesas_jugadas']} mesas")
+    else:
+        print("  (Sin datos)")
 
 def caso10_colusion(pg_con, driver):
     print("\n[Neo4j] 🚨 10. Detección de clusters de colusión (Top 5 pares)")
     
-    # 1. ETL bajo demanda
+    # ETL bajo demanda + consulta
     print("🔄 Cargando relaciones desde PostgreSQL...")
-    sync_usuarios_mesas_to_neo4j(pg_con, driver)
+    resultados = ejecutar_caso(pg_con, driver, 'caso10')
     
-    # 2. Ejecutar consulta
-    query = """
-        MATCH (u1:Usuario)-[:JUGO_EN]->(m:Mesa)<-[:JUGO_EN]-(u2:Usuario)
-        // Usar propiedad propia para evitar warning de id() deprecado
-        WHERE u1.id_usuario < u2.id_usuario
-        WITH u1, u2, count(m) as mesas_compartidas
-        WHERE mesas_compartidas > 2
-        RETURN u1.id_usuario, u1.nombre, u2.id_usuario, u2.nombre, mesas_compartidas
-        ORDER BY mesas_compartidas DESC
-        LIMIT 5
+    if resultados:
+        print("\nPosible colusión (pares que juegan juntos frecuentemente):")
+        for r in resultados:
+            print(f"  {r['u1.nombre']} <-> {r['u2.nombre']}: {r['mesas_compartidas']} mesas compartidas")
+    else:
+        print("  (Sin datos)")
+
+# ====================================
+#   CASOS, SYNCS E INGESTA SIN MENÚ (línea de comandos)
+# ====================================
+
+# caso: (backend, modelo que refresca el ETL bajo demanda, su sync_*,
+#        parámetros en el orden de la clave de caché, consulta(handle, pg_con, *parámetros))
+CASOS = {
+    'caso1': ('mongo', 'mongo:manos', sync_manos_to_mongo, ('desde',),
+              lambda db, pg_con, desde: consulta_caso1(db, desde)),
+    'caso2': ('mongo', 'mongo:usuarios', sync_all_usuarios_to_mongo, (),
+              lambda db, pg_con: consulta_caso2(db)),
+    'caso3': ('mongo', 'mongo:manos', sync_manos_to_mongo, ('mes', 'anio'),
+              lambda db, pg_con, mes, anio: consulta_caso3(db, mes, anio)),
+    'caso4': ('mongo', 'mongo:transacciones', sync_transacciones_to_mongo, ('id_usuario',),
+              lambda db, pg_con, id_usuario: consulta_caso4(db, id_usuario)),
+    'caso5': ('astra', 'astra:manos', sync_manos_to_cassandra, ('id_mesa', 'fecha'),
+              lambda astra_db, pg_con, id_mesa, fecha: consulta_caso5(astra_db, id_mesa, fecha)),
+    'caso6': ('astra', 'astra:transacciones', sync_transacciones_to_cassandra, ('id_usuario', 'fecha'),
+              lambda astra_db, pg_con, id_usuario, fecha: consulta_caso6(astra_db, id_usuario, fecha)),
+    'caso7': ('redis', None, None, ('top', 'dias'),
+              lambda r, pg_con, top, dias: consulta_caso7(r, top, dias)),
+    'caso8': ('redis', None, None, ('id_usuario',),
+              lambda r, pg_con, id_usuario: consulta_caso8(r, pg_con, id_usuario)),
+    'caso9': ('neo4j', 'neo4j:usuarios_mesas', sync_usuarios_mesas_to_neo4j, (),
+              lambda driver, pg_con: consulta_caso9(driver)),
+    'caso10': ('neo4j', 'neo4j:usuarios_mesas', sync_usuarios_mesas_to_neo4j, (),
+               lambda driver, pg_con: consulta_caso10(driver)),
+}
+
+# nombre en la línea de comandos: (backend destino, sync_*, admite incremental=)
+SYNCS = {
+    'usuarios-mongo': ('mongo', sync_all_usuarios_to_mongo, False),
+    'manos-mongo': ('mongo', sync_manos_to_mongo, True),
+    'transacciones-mongo': ('mongo', sync_transacciones_to_mongo, True),
+    'manos-astra': ('astra', sync_manos_to_cassandra, True),
+    'transacciones-astra': ('astra', sync_transacciones_to_cassandra, True),
+    'neo4j': ('neo4j', sync_usuarios_mesas_to_neo4j, False),
+}
+
+# Campos que acepta cada ingesta y cómo se convierten (en CSV todo llega como texto)
+CAMPOS_INGESTA = {
+    'manos': {
+        'id_mesa': int, 'bote_total': float, 'ganador_id': int, 'rake': float, 'modalidad': str,
+        'fecha_hora': lambda v: v if isinstance(v, datetime.datetime) else datetime.datetime.fromisoformat(v),
+        # En CSV los participantes van separados por ';'
+        'participantes': lambda v: [int(x) for x in (v.split(';') if isinstance(v, str) else v)],
+    },
+    'transacciones': {'id_usuario': int, 'id_metodo': int, 'monto': float, 'tipo': str},
+}
+
+def _desde_caso1(dias):
+    # Al minuto: los refrescos dentro del mismo minuto comparten el resultado en caché
+    return (datetime.datetime.now() - datetime.timedelta(days=dias)).replace(second=0, microsecond=0)
+
+def ejecutar_caso(pg_con, handle, caso, params=None, etl=True):
+    """Resultado de `caso` con `params` (dict): ETL bajo demanda y consulta a través de la caché.
+
+    `handle` es la conexión del backend del caso (ver CASOS). Lo usan tanto el
+    menú como el subcomando 'caso' de la línea de comandos.
     """
-    
-    with driver.session() as session:
-        resultados = session.run(query).data()
-        
-        if resultados:
-            print("\nPosible colusión (pares que juegan juntos frecuentemente):")
-            for r in resultados:
-                print(f"  {r['u1.nombre']} <-> {r['u2.nombre']}: {r['mesas_compartidas']} mesas compartidas")
+    _backend, modelo, sync_fn, claves, consulta = CASOS[caso]
+    params = params or {}
+    faltantes = [clave for clave in claves if params.get(clave) is None]
+    if faltantes:
+        raise ValueError(f"{caso} necesita: {', '.join(faltantes)}")
+    if etl and modelo is not None:
+        sincronizar_si_necesario(pg_con, modelo, sync_fn, handle)
+    valores = [params[clave] for clave in claves]
+    calcular = lambda: consulta(handle, pg_con, *valores)
+    if caso in MODELOS_CASOS:
+        return _consultar(caso, valores, calcular)
+    return calcular()
+
+def _imprimir_json(obj):
+    print(json.dumps(obj, default=str, ensure_ascii=False, indent=2))
+
+def _leer_registros(ruta):
+    """Dicts de un CSV con encabezado (.csv) o de un archivo JSON Lines ('-' lee JSON Lines de stdin)"""
+    archivo = sys.stdin if ruta == '-' else open(ruta, encoding='utf-8', newline='')
+    try:
+        if ruta.lower().endswith('.csv'):
+            yield from csv.DictReader(archivo)
         else:
-            print("  (Sin datos)")
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+    finally:
+        if archivo is not sys.stdin:
+            archivo.close()
+
+def _registro_ingesta(tabla, crudo):
+    return {campo: convertir(crudo[campo]) for campo, convertir in CAMPOS_INGESTA[tabla].items()
+            if crudo.get(campo) not in (None, '')}
+
+def comando_sync(conexiones, args):
+    pg_con = conexiones.postgres
+    if pg_con is None:
+        print("❌ PostgreSQL no disponible")
+        return 1
+    ok = True
+    # Redis va siempre: al conectarse activa la caché de resultados y así lo que
+    # escriba el ETL sube cache_version:* (ver _datos_cambiaron). Sin Redis se sincroniza igual.
+    for nombre in args.syncs:
+        if nombre == 'todo':
+            # Se conectan a la vez los destinos que haya; los caídos se omiten
+            conexiones.calentar(('mongo', 'astra', 'neo4j', 'redis'))
+            ok = sync_todo(pg_con, conexiones.mongo, conexiones.astra, conexiones.neo4j,
+                           incremental=not args.completo) and ok
+        elif nombre == 'outbox':
+            conexiones.calentar(('mongo', 'astra', 'neo4j', 'redis'))
+            try:
+                aplicados = drenar_outbox(pg_con, conexiones.mongo, conexiones.astra, conexiones.neo4j,
+                                          redis_con=conexiones.redis)
+                print(f"✅ Outbox: {aplicados} eventos aplicados")
+            except Exception as e:
+                print(f"❌ Error aplicando la outbox: {e}")
+                ok = False
+        else:
+            backend, sync_fn, incremental = SYNCS[nombre]
+            conexiones.calentar((backend, 'redis'))
+            handle = conexiones.obtener(backend)
+            if handle is None:
+                print(f"❌ {nombre}: {backend} no disponible")
+                ok = False
+                continue
+            kwargs = {'incremental': not args.completo} if incremental else {}
+            ok = sync_fn(pg_con, handle, **kwargs) is not False and ok
+    if args.metricas:
+        _imprimir_json(METRICAS.a_dict())
+    return 0 if ok else 1
+
+def comando_caso(conexiones, args):
+    caso = f"caso{args.numero}"
+    backend, modelo, *_ = CASOS[caso]
+    params = {
+        'desde': _desde_caso1(args.desde_dias), 'mes': args.mes, 'anio': args.anio,
+        'id_usuario': args.id_usuario, 'id_mesa': args.id_mesa, 'fecha': args.fecha,
+        'top': args.top, 'dias': args.dias,
+    }
+    # Con --json por stdout sólo sale el resultado; los avisos del ETL van a stderr
+    with redirect_stdout(sys.stderr) if args.json else nullcontext():
+        necesita_pg = caso == 'caso8' or (modelo is not None and not args.sin_etl)
+        # Redis activa la caché de resultados (y sube sus versiones si corre el ETL)
+        conexiones.calentar((backend, 'redis', 'postgres') if necesita_pg else (backend, 'redis'))
+        pg_con = conexiones.postgres if necesita_pg else None
+        handle = conexiones.obtener(backend)
+        if handle is None or (necesita_pg and pg_con is None):
+            print(f"❌ {caso}: {backend if handle is None else 'postgres'} no disponible")
+            return 1
+        try:
+            resultado = ejecutar_caso(pg_con, handle, caso, params, etl=not args.sin_etl)
+        except Exception as e:
+            print(f"❌ {caso}: {e}")
+            return 1
+    
+    if args.json:
+        _imprimir_json(resultado)
+    elif isinstance(resultado, list):
+        print(f"✅ {caso}: {len(resultado)} filas")
+        for fila in resultado:
+            print("  " + json.dumps(fila, default=str, ensure_ascii=False))
+    else:
+        print(f"✅ {caso}: {json.dumps(resultado, default=str, ensure_ascii=False)}")
+    return 0
+
+def comando_ingest(conexiones, args):
+    with redirect_stdout(sys.stderr) if args.json else nullcontext():
+        pg_con = conexiones.postgres
+        if pg_con is None:
+            print("❌ PostgreSQL no disponible")
+            return 1
+        ingestar = ingestar_manos if args.tabla == 'manos' else ingestar_transacciones
+        registros = (_registro_ingesta(args.tabla, crudo) for crudo in _leer_registros(args.archivo))
+        inicio = time.perf_counter()
+        try:
+            ids = ingestar(pg_con, registros, args.lote, redis_con=None if args.sin_redis else conexiones.redis)
+        except Exception as e:
+            # Los lotes anteriores al que falló ya quedaron confirmados
+            print(f"❌ Error en la ingesta de {args.tabla}: {e}")
+            return 1
+        segundos = time.perf_counter() - inicio
+    
+    if args.json:
+        _imprimir_json({'tabla': args.tabla, 'filas': len(ids), 'segundos': round(segundos, 3), 'ids': ids})
+    else:
+        print(f"✅ {len(ids)} {args.tabla} ingestadas en {segundos:.2f}s"
+              + (f" ({len(ids) / segundos:.0f} filas/s)" if segundos > 0 else ""))
+    return 0
+
+COMANDOS = {'sync': comando_sync, 'caso': comando_caso, 'ingest': comando_ingest}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="PokerStars Data Manager. Sin subcomando abre el menú interactivo.")
+    parser.add_argument('--tiempos-arranque', action='store_true',
+                        help="Medir el tiempo de import con y sin carga diferida de drivers")
+    comandos = parser.add_subparsers(dest='comando', metavar='{sync,caso,ingest}')
+    
+    sync = comandos.add_parser('sync', help="Sincronizar modelos de lectura desde PostgreSQL")
+    sync.add_argument('syncs', nargs='+', choices=[*SYNCS, 'todo', 'outbox'], metavar='SYNC',
+                      help=f"Uno o más de: {', '.join([*SYNCS, 'todo', 'outbox'])}")
+    sync.add_argument('--completo', action='store_true', help="Ignorar los watermarks (copia completa)")
+    sync.add_argument('--metricas', action='store_true', help="Imprimir METRICAS en JSON al terminar")
+    
+    caso = comandos.add_parser('caso', help="Ejecutar un caso de uso (1-10)")
+    caso.add_argument('numero', type=int, choices=range(1, 11), metavar='N', help="Número de caso (1-10)")
+    caso.add_argument('--desde-dias', type=int, default=7, help="caso1: últimos N días")
+    caso.add_argument('--mes', type=int, default=9, help="caso3 (por defecto septiembre)")
+    caso.add_argument('--anio', type=int, default=datetime.date.today().year, help="caso3 (por defecto el actual)")
+    caso.add_argument('--id-usuario', type=int, help="casos 4, 6 y 8")
+    caso.add_argument('--id-mesa', type=int, help="caso5")
+    caso.add_argument('--fecha', help="casos 5 y 6 (YYYY-MM-DD)")
+    caso.add_argument('--dias', type=int, default=7, help="caso7: ventana del ranking en días")
+    caso.add_argument('--top', type=int, default=5, help="caso7: cantidad de jugadores")
+    caso.add_argument('--sin-etl', action='store_true', help="No refrescar el modelo de lectura antes de consultar")
+    caso.add_argument('--json', action='store_true', help="Imprimir el resultado en JSON")
+    
+    ingest = comandos.add_parser('ingest', help="Ingesta masiva desde un archivo CSV o JSON Lines")
+    ingest.add_argument('tabla', choices=list(CAMPOS_INGESTA))
+    ingest.add_argument('archivo', help="Ruta .csv o .jsonl ('-' lee JSON Lines de stdin)")
+    ingest.add_argument('--lote', type=int, default=INGESTA_LOTE, help="Filas por transacción")
+    ingest.add_argument('--sin-redis', action='store_true', help="No actualizar rankings ni balances en caché")
+    ingest.add_argument('--json', action='store_true', help="Imprimir el resumen en JSON")
+    return parser.parse_args(argv)
+
+def cli(argv=None):
+    """Punto de entrada: sin subcomando abre el menú; con subcomando ejecuta ese comando y termina.
+
+    Devuelve el código de salida (0 si todo terminó bien). Las conexiones se abren
+    sólo si el comando las usa.
+    """
+    args = parse_args(argv)
+    if args.tiempos_arranque:
+        medir_arranque()
+        return 0
+    if args.comando is None:
+        main()
+        return 0
+    
+    load_dotenv()
+    conexiones = Conexiones()
+    try:
+        return COMANDOS[args.comando](conexiones, args)
+    finally:
+        conexiones.cerrar()
 
 # ================================
 #   MENÚ PRINCIPAL (ORQUESTADOR)
@@ -1180,24 +3906,36 @@ def main():
     # 1. Cargar .env
     load_dotenv()
     
-    # 2. Iniciar todas las conexiones
-    pg_con = get_postgres()
-    mongo_db = get_mongo_client()
-    redis_con = get_redis()
-    neo4j_driver = get_neo4j_driver()
-    astra_db = get_cassandra_session()
+    # 2. Conexiones: todas en paralelo, cada una con su timeout; las que fallen se
+    #    reintentan al usarlas. Sólo PostgreSQL (pool, una conexión por operación) es obligatorio
+    conexiones = Conexiones()
+    if CONEXIONES_CALENTAR:
+        inicio = time.perf_counter()
+        estado = conexiones.calentar()
+        marcas = {True: "✔️", False: "❌", None: "⏳"}
+        print(f"⏱️  Conexiones en {time.perf_counter() - inicio:.2f}s: "
+              + ", ".join(f"{nombre} {marcas[ok]}" for nombre, ok in estado.items()))
     
-    # Validar conexiones (mongo_db no puede usarse con bool directamente)
-    if pg_con is None or mongo_db is None or redis_con is None or neo4j_driver is None or astra_db is None:
-        print("Faltan conexiones de base de datos. Saliendo.")
+    pg_con = conexiones.postgres
+    if pg_con is None:
+        print("PostgreSQL no disponible. Saliendo.")
+        conexiones.cerrar()
         return
 
+    if METRICAS_PUERTO:
+        servir_metricas()
+
     while True:
         print("\n===================================")
         print("       POKERSTARS DATA MANAGER")
         print("===================================")
         print("--- Admin (PostgreSQL) ---")
         print("1. Crear Tablas en PostgreSQL")
+        print("i. Reporte de índices (MongoDB)")
+        print("p. Verificar índices (PostgreSQL, EXPLAIN)")
+        print("e. Sincronizar todos los destinos (ETL completo)")
+        print("l. Escuchar cambios en vivo (CDC outbox)")
+        print("t. Métricas del ETL (por destino y etapa)")
         print("")
         print("--- Escritura (PostgreSQL) ---")
         print("2. Crear Nuevo Usuario")
@@ -1224,12 +3962,27 @@ def main():
         try:
             if op == '1':
                 crear_tablas_postgres(pg_con)
+            elif op == 'i':
+                mongo_db = conexiones.mongo
+                if mongo_db is not None:
+                    reporte_indices_mongo(mongo_db)
+                else:
+                    print("❌ MongoDB no disponible")
+            elif op == 'p':
+                verificar_indices_postgres(pg_con)
+            elif op == 'e':
+                conexiones.calentar(('mongo', 'astra', 'neo4j', 'redis'))
+                sync_todo(pg_con, conexiones.mongo, conexiones.astra, conexiones.neo4j)
+            elif op == 'l':
+                consumir_outbox(pg_con, conexiones.mongo, conexiones.astra, conexiones.neo4j, conexiones.redis)
+            elif op == 't':
+                mostrar_metricas()
             elif op == '2':
                 crear_usuario(pg_con)
             elif op == '3':
                 crear_metodo_pago(pg_con)
             elif op == '4':
-                crear_transaccion(pg_con)
+                crear_transaccion(pg_con, conexiones.redis)
             elif op == '5':
                 crear_torneo(pg_con)
             elif op == '6':
@@ -1237,11 +3990,17 @@ def main():
             elif op == '7':
                 registrar_jugador_en_mesa(pg_con)
             elif op == '8':
-                crear_mano(pg_con)
+                crear_mano(pg_con, conexiones.redis)
             elif op == '9':
-                simular_juego(redis_con)
+                redis_con = conexiones.redis
+                if redis_con is not None:
+                    simular_juego(redis_con)
+                else:
+                    print("❌ Redis no disponible")
             
             elif op == 'm':
+                conexiones.calentar(('mongo', 'redis'))
+                mongo_db = conexiones.mongo
                 if mongo_db is not None:
                     print("\n--- Casos de Uso MongoDB (1-4) ---")
                     caso1_volumen_modalidad(pg_con, mongo_db)
@@ -1252,6 +4011,8 @@ def main():
                     print("❌ MongoDB no disponible")
             
             elif op == 'c':
+                conexiones.calentar(('astra', 'redis'))
+                astra_db = conexiones.astra
                 if astra_db is not None:
                     print("\n--- Casos de Uso Cassandra (5-6) ---")
                     caso5_manos_por_fecha_mesa(pg_con, astra_db)
@@ -1260,11 +4021,17 @@ def main():
                     print("❌ Cassandra no disponible")
             
             elif op == 'r':
-                print("\n--- Casos de Uso Redis ---") # GET user_balance:1 para chequear en consola
-                caso7_ranking(redis_con)
-                caso8_balance_cache(redis_con, pg_con)
+                redis_con = conexiones.redis
+                if redis_con is not None:
+                    print("\n--- Casos de Uso Redis ---") # GET user_balance:1 para chequear en consola
+                    caso7_ranking(redis_con)
+                    caso8_balance_cache(redis_con, pg_con)
+                else:
+                    print("❌ Redis no disponible")
 
             elif op == 'n':
+                conexiones.calentar(('neo4j', 'redis'))
+                neo4j_driver = conexiones.neo4j
                 if neo4j_driver is not None:
                     print("\n--- Casos de Uso Neo4j ---")
                     caso9_usuarios_dos_mesas(pg_con, neo4j_driver)
@@ -1274,18 +4041,14 @@ def main():
 
             elif op == 's':
                 print("Cerrando todas las conexiones...")
-                pg_con.close()
-                neo4j_driver.close()
-                # Cassandra REST API no requiere cierre explícito
-                # Mongo y Redis no requieren cierre explícito de la misma forma
+                conexiones.cerrar()
                 break
             else:
                 print("Opción no válida.")
                 
         except Exception as e:
+            # La conexión prestada ya se devolvió al pool con rollback
             print(f"❌ ERROR INESPERADO: {e}")
-            print("... revirtiendo cambios en PostgreSQL ...")
-            pg_con.rollback()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(cli())
\ No newline at end of file